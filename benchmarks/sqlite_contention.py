@@ -0,0 +1,101 @@
+"""Нагрузочное сравнение профилей SQLite
+
+Много одновременных пользователей выполняют смесь чтений истории и
+записей запросов. Профиль default - журнал DELETE и запись из пула
+потоков, профиль production - WAL и единственный поток-писатель.
+
+Запуск:
+    BOT_TOKEN=x OPENWEATHER_API_KEY=x python -m benchmarks.sqlite_contention --users 200 --ops 50
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from config import settings  # noqa: E402
+from database.crud import UserCRUD, WeatherRequestCRUD  # noqa: E402
+from database.engine import Database  # noqa: E402
+
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Сочи', 'London', 'Paris']
+
+
+async def simulate_user(db: Database, user_id: int, ops: int, write_ratio: float,
+                        latencies: list, errors: list):
+    """Один пользователь: последовательность чтений и записей"""
+    for _ in range(ops):
+        started = time.perf_counter()
+        try:
+            if random.random() < write_ratio:
+                await db.write(WeatherRequestCRUD.bulk_create, [{
+                    'user_id': user_id,
+                    'city_name': random.choice(CITIES),
+                    'request_type': 'current',
+                    'success': True,
+                    'created_at': datetime.utcnow()
+                }])
+            else:
+                await db.read(WeatherRequestCRUD.get_user_history, user_id, limit=10)
+        except OperationalError as e:
+            errors.append(str(e.orig))
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_profile(profile: str, users: int, ops: int, write_ratio: float) -> dict:
+    """Прогон одного профиля на чистой БД"""
+    settings.SQLITE_PROFILE = profile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        db.start()
+
+        user_ids = [await db.write(UserCRUD.upsert, 10_000 + i) for i in range(users)]
+
+        latencies, errors = [], []
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            simulate_user(db, user_id, ops, write_ratio, latencies, errors)
+            for user_id in user_ids
+        ))
+        elapsed = time.perf_counter() - started
+
+        await db.close()
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        'profile': profile,
+        'ops': len(latencies),
+        'throughput': len(latencies) / elapsed,
+        'p50': quantiles[49] * 1000,
+        'p95': quantiles[94] * 1000,
+        'p99': quantiles[98] * 1000,
+        'errors': len(errors)
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200, help='одновременных пользователей')
+    parser.add_argument('--ops', type=int, default=50, help='операций на пользователя')
+    parser.add_argument('--write-ratio', type=float, default=0.3, help='доля записей')
+    args = parser.parse_args()
+
+    print(f"{'профиль':<12}{'оп/с':>10}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'locked':>8}")
+    for profile in ('default', 'production'):
+        r = await run_profile(profile, args.users, args.ops, args.write_ratio)
+        print(f"{r['profile']:<12}{r['throughput']:>10.0f}{r['p50']:>10.1f}"
+              f"{r['p95']:>10.1f}{r['p99']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+"""Время запуска бота: от старта процесса до первого обработанного апдейта
+
+Запускает bot.py отдельным процессом (polling) против локального
+поддельного Bot API (TELEGRAM_API_URL). Апдейт /start уже ждет в
+getUpdates; время до первого апдейта - момент ответа sendMessage.
+Прогоны "холодный" (новая БД: создание схемы) и "теплый" (схема
+актуальна). С --target код возврата 1, если медиана теплого запуска
+больше цели - проверка не зависит от CI и сети.
+
+Запуск:
+    BOT_TOKEN=x OPENWEATHER_API_KEY=x python -m benchmarks.startup --runs 5 --target 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+ROOT = Path(__file__).resolve().parent.parent
+TOKEN = '42:bench'
+API_PORT = 18083
+
+
+class FakeBotAPI:
+    """Поддельный Bot API: один апдейт /start, фиксация первого ответа"""
+
+    def __init__(self):
+        self.getupdates_at = None
+        self.replied = asyncio.Event()
+        self.replied_at = None
+        self._delivered = False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        data = await request.post()
+
+        if method == 'getMe':
+            result = {'id': 42, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'getUpdates':
+            result = await self._get_updates(float(data.get('timeout', 0)))
+        elif method == 'sendMessage':
+            if not self.replied.is_set():
+                self.replied_at = time.monotonic()
+                self.replied.set()
+            result = {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': int(data['chat_id']), 'type': 'private'},
+                'text': data.get('text', '')
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_updates(self, timeout: float) -> list:
+        if self.getupdates_at is None:
+            self.getupdates_at = time.monotonic()
+        if self._delivered:
+            await asyncio.sleep(min(timeout, 1))
+            return []
+        self._delivered = True
+        return [{
+            'update_id': 1,
+            'message': {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': 1000, 'type': 'private'},
+                'from': {'id': 1000, 'is_bot': False, 'first_name': 'User'},
+                'text': '/start',
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+            }
+        }]
+
+
+async def run_once(workdir: Path, database: Path) -> tuple:
+    """Один запуск: (до первого getUpdates, до первого ответа, остановка) в секундах"""
+    api = FakeBotAPI()
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', API_PORT).start()
+
+    env = {
+        **os.environ,
+        'BOT_TOKEN': TOKEN,
+        'BOT_MODE': 'polling',
+        'TELEGRAM_API_URL': f"http://127.0.0.1:{API_PORT}",
+        'DATABASE_URL': f"sqlite:///{database}",
+        # Недоступный Redis: бот работает без него (как при сбое Redis)
+        'REDIS_PORT': '1',
+        'METRICS_ENABLED': 'false',
+        'ENABLE_NOTIFICATIONS': 'false',
+        'LOG_FILE': str(workdir / 'bot.log'),
+        'TRACING_SLOW_FILE': str(workdir / 'slow.jsonl')
+    }
+    started = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, str(ROOT / 'bot.py'), env=env, cwd=workdir,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        await asyncio.wait_for(api.replied.wait(), timeout=60)
+        intake = api.getupdates_at - started
+        first_update = api.replied_at - started
+
+        stopping = time.monotonic()
+        process.terminate()
+        await asyncio.wait_for(process.wait(), timeout=60)
+        shutdown = time.monotonic() - stopping
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        await runner.cleanup()
+    return intake, first_update, shutdown
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='прогонов каждого вида')
+    parser.add_argument('--target', type=float, default=None,
+                        help='цель: медиана времени до первого апдейта (теплый запуск), секунды')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for kind in ('cold', 'warm'):
+            runs = []
+            for i in range(args.runs):
+                database = workdir / (f"cold{i}.db" if kind == 'cold' else 'warm.db')
+                runs.append(await run_once(workdir, database))
+            results[kind] = [statistics.median(column) for column in zip(*runs)]
+
+    print(f"{'запуск':<8}{'getUpdates, с':>16}{'1-й апдейт, с':>16}{'остановка, с':>16}")
+    for kind, (intake, first_update, shutdown) in results.items():
+        print(f"{kind:<8}{intake:>16.2f}{first_update:>16.2f}{shutdown:>16.2f}")
+
+    if args.target is not None and results['warm'][1] > args.target:
+        print(f"❌ Время до первого апдейта {results['warm'][1]:.2f} с больше цели {args.target:.2f} с")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,195 @@
+"""Нагрузочное сравнение получения апдейтов: long polling и вебхук
+
+Локальный поддельный Bot API отдает N апдейтов (getUpdates или POST
+на вебхук) и считает ответы sendMessage. Хендлер имитирует работу
+задержкой --work, сеть - задержкой --latency на каждый вызов API.
+Результат - устойчивая пропускная способность (апдейтов в секунду).
+
+Запуск:
+    BOT_TOKEN=x OPENWEATHER_API_KEY=x python -m benchmarks.webhook_vs_polling --updates 5000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiohttp  # noqa: E402
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import Message  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from middlewares.scheduler import FairScheduler, FairSchedulerMiddleware  # noqa: E402
+from services.webhook import SECRET_HEADER, WebhookServer  # noqa: E402
+
+TOKEN = '42:bench'
+API_PORT = 18081
+WEBHOOK_PORT = 18082
+SECRET = 'bench-secret'
+
+
+def make_update(update_id: int, chats: int) -> dict:
+    chat_id = 1000 + update_id % chats
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'},
+            'text': 'ping'
+        }
+    }
+
+
+class FakeBotAPI:
+    """Поддельный Bot API: getMe, getUpdates, sendMessage"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.updates: list = []
+        self.replies = 0
+        self.expected = 0
+        self.done = asyncio.Event()
+        self._new_updates = asyncio.Event()
+
+    def load(self, updates: list):
+        self.updates = list(updates)
+        self.replies = 0
+        self.expected = len(updates)
+        self.done.clear()
+        self._new_updates.set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        data = await request.post()
+        await asyncio.sleep(self.latency)
+
+        if method == 'getMe':
+            result = {'id': 42, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'getUpdates':
+            result = await self._get_updates(int(data.get('offset', 0)), int(data.get('limit', 100)),
+                                             float(data.get('timeout', 0)))
+        elif method == 'sendMessage':
+            self.replies += 1
+            if self.replies >= self.expected:
+                self.done.set()
+            result = {
+                'message_id': self.replies,
+                'date': int(time.time()),
+                'chat': {'id': int(data['chat_id']), 'type': 'private'},
+                'text': data.get('text', '')
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_updates(self, offset: int, limit: int, timeout: float) -> list:
+        self.updates = [u for u in self.updates if u['update_id'] >= offset]
+        if not self.updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=min(timeout, 1))
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+
+def make_dispatcher(work: float) -> Dispatcher:
+    """Диспетчер как в боте: FairScheduler и хендлер с ответом"""
+    dp = Dispatcher()
+    dp.update.outer_middleware(FairSchedulerMiddleware(FairScheduler()))
+
+    @dp.message()
+    async def echo(message: Message):
+        await asyncio.sleep(work)
+        await message.answer('pong')
+
+    return dp
+
+
+async def run_polling(api: FakeBotAPI, bot: Bot, updates: list, work: float) -> float:
+    dp = make_dispatcher(work)
+    api.load(updates)
+    started = time.perf_counter()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    await api.done.wait()
+    elapsed = time.perf_counter() - started
+    await dp.stop_polling()
+    await polling
+    return elapsed
+
+
+async def run_webhook(api: FakeBotAPI, bot: Bot, updates: list, work: float,
+                      connections: int, latency: float) -> float:
+    dp = make_dispatcher(work)
+    server = WebhookServer(dp, bot, url='http://127.0.0.1', host='127.0.0.1', port=WEBHOOK_PORT,
+                           secret=SECRET, max_connections=connections)
+    await server.start(register=False)
+    api.load([])
+    api.expected = len(updates)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    async def deliver(session: aiohttp.ClientSession):
+        """Одно соединение Telegram: доставка апдейтов по очереди"""
+        url = f"http://127.0.0.1:{WEBHOOK_PORT}{server.path}"
+        while not queue.empty():
+            update = queue.get_nowait()
+            await asyncio.sleep(latency)
+            while True:
+                async with session.post(url, json=update, headers={SECRET_HEADER: SECRET}) as response:
+                    if response.status != 429:
+                        break
+                await asyncio.sleep(0.1)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(deliver(session) for _ in range(connections)))
+    await api.done.wait()
+    elapsed = time.perf_counter() - started
+    await server.close()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=5000, help='апдейтов на прогон')
+    parser.add_argument('--chats', type=int, default=500, help='различных чатов')
+    parser.add_argument('--work', type=float, default=0.01, help='работа хендлера (секунды)')
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка вызова API (секунды)')
+    parser.add_argument('--connections', type=int, default=40, help='соединений вебхука (max_connections)')
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.latency)
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', API_PORT).start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{API_PORT}"))
+    bot = Bot(TOKEN, session=session)
+    updates = [make_update(i + 1, args.chats) for i in range(args.updates)]
+
+    try:
+        print(f"{'режим':<10}{'апдейтов':>10}{'секунд':>10}{'апд/с':>10}")
+        for mode in ('polling', 'webhook'):
+            if mode == 'polling':
+                elapsed = await run_polling(api, bot, updates, args.work)
+            else:
+                elapsed = await run_webhook(api, bot, updates, args.work, args.connections, args.latency)
+            print(f"{mode:<10}{len(updates):>10}{elapsed:>10.2f}{len(updates) / elapsed:>10.0f}")
+    finally:
+        await bot.session.close()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
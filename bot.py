@@ -1,108 +1,290 @@
-import asyncio
-import logging
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
-
-from config import settings
-from handlers import weather, location, forecast, favorites, errors
-from middlewares.throttling import ThrottlingMiddleware
-from middlewares.logging import LoggingMiddleware, StatisticsMiddleware, UserActivityMiddleware
-from services.cache import RedisCache
-from database.models import init_db
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
+import time
+
+# Отсчет времени запуска - до импорта aiogram и модулей бота
+STARTED = time.monotonic()
+
+import asyncio  # noqa: E402
+import logging  # noqa: E402
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.client.default import DefaultBotProperties  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.enums import ParseMode  # noqa: E402
+
+from config import settings  # noqa: E402
+from handlers import (  # noqa: E402
+    weather, location, forecast, favorites, export, broadcast, notifications, inline, errors
 )
+from middlewares.throttling import ThrottlingMiddleware  # noqa: E402
+from middlewares.logging import LoggingMiddleware, StatisticsMiddleware, UserActivityMiddleware  # noqa: E402
+from middlewares.scheduler import (  # noqa: E402
+    FairScheduler, FairSchedulerMiddleware, IntakeBackpressure, RouterLimiter, RouterLimitMiddleware
+)
+from services.cache import RedisCache  # noqa: E402
+from services.cache_snapshot import CacheSnapshotter  # noqa: E402
+from services.request_log import RequestLogQueue  # noqa: E402
+from services.user_activity import UserActivityTracker  # noqa: E402
+from services.favorites_cache import FavoritesCache  # noqa: E402
+from services.history_ring import HistoryRing  # noqa: E402
+from services.rate_limiter import DistributedRateLimiter  # noqa: E402
+from services.send_governor import SendGovernor  # noqa: E402
+from services.broadcast import Broadcaster  # noqa: E402
+from services.gazetteer import Gazetteer  # noqa: E402
+from services.inline_weather import InlineWeather  # noqa: E402
+from services.metrics import MetricsServer  # noqa: E402
+from services.weather_api import WeatherAPI  # noqa: E402
+from services.last_known_good import LastKnownGood  # noqa: E402
+from database.engine import Database  # noqa: E402
+from utils.log_config import setup_logging  # noqa: E402
+from utils.startup import StartupTimer  # noqa: E402
+
+# Настройка логирования: запись на диск - в отдельном потоке, с ротацией
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
-async def on_startup():
-    """Действия при запуске бота"""
-    logger.info("=" * 50)
-    logger.info("🚀 Запуск WeatherPro Bot v2.0")
-    logger.info("=" * 50)
-    
-    # Инициализация БД
-    logger.info("📦 Инициализация базы данных...")
-    SessionLocal = init_db()
-    session = SessionLocal()
-    session.close()
-    logger.info("✅ База данных готова")
+async def on_startup(startup: StartupTimer):
+    """Действия при запуске бота (перед приемом апдейтов)"""
+    logger.info(f"✅ Бот запущен и готов к работе! Запуск: {startup.ready()}")
 
 
-async def on_shutdown(bot: Bot):
+async def on_shutdown():
     """Действия при остановке бота"""
     logger.info("=" * 50)
     logger.info("🛑 Остановка WeatherPro Bot")
     logger.info("=" * 50)
-    
-    await bot.session.close()
+
+
+async def open_database() -> Database:
+    """БД: миграция схемы (в потоке), запуск писателя и прогрев пулов"""
+    db = await asyncio.to_thread(Database, settings.DATABASE_URL)
+    db.start()
+    await db.warmup()
+    return db
+
+
+async def close_before(deadline: float, coro, name: str):
+    """Выполнить остановку компонента, не выходя за общий срок"""
+    try:
+        await asyncio.wait_for(coro, timeout=max(0.1, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ {name}: не успели завершить до срока остановки")
 
 
 async def main():
     """Инициализация и запуск бота"""
+    startup = StartupTimer(STARTED)
+    startup.record('import', STARTED)
+    
+    logger.info("=" * 50)
+    logger.info("🚀 Запуск WeatherPro Bot v2.0")
+    logger.info("=" * 50)
     
     # Инициализация бота
     bot = Bot(
         token=settings.BOT_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL)),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
     dp = Dispatcher()
+    # Время до первого обработанного апдейта
+    dp.update.outer_middleware(startup.middleware)
     
-    # Инициализация кеша
     cache = RedisCache()
-    await cache.connect()
+    # Горячие ключи прошлого запуска: промахи кеша добираются из снимка
+    cache_snapshotter = CacheSnapshotter(cache)
+    if settings.WARM_CACHE_ENABLED:
+        cache_snapshotter.load()
+    
+    # Независимые подключения - параллельно: БД (пул читателей + единственный
+    # писатель), Redis и getMe (результат кешируется в bot.me() для polling)
+    with startup.phase('connect'):
+        db, _, me = await asyncio.gather(open_database(), cache.connect(), bot.me())
+    
+    setup_started = time.monotonic()
+    
+    if settings.WARM_CACHE_ENABLED:
+        cache_snapshotter.start()
+    
+    # Отложенная запись истории запросов
+    request_log = RequestLogQueue(db)
+    request_log.start()
+    
+    # Последние успешные ответы API: показываются, когда OpenWeather недоступен
+    last_known_good = LastKnownGood(db)
+    last_known_good.start()
+    WeatherAPI.use_fallback(last_known_good)
+    
+    # Кеш пользователей и отложенное обновление активности
+    user_activity = UserActivityTracker(db)
+    user_activity.start()
+    
+    # Read-through кеш избранного
+    favorites_cache = FavoritesCache(db, cache)
+    
+    # Кольцо последних запросов для /history
+    history_ring = HistoryRing(db, cache)
+    request_log.add_flush_hook(history_ring.record_requests)
+    
+    # Плановая архивация старой истории запросов (только основной экземпляр)
+    retention = None
+    if settings.RETENTION_ENABLED and settings.is_primary_instance():
+        from services.retention import RetentionJob
+        
+        retention = RetentionJob(db, cache)
+        retention.start()
+    
+    # Inline-режим: префиксный индекс городов и локальный LRU готовых ответов
+    gazetteer = Gazetteer(db)
+    gazetteer.start()
+    inline_weather = InlineWeather(cache, gazetteer)
+    
+    # Рассылки: общий лимит массовых отправок, прогресс в Redis
+    governor = SendGovernor()
+    broadcaster = Broadcaster(bot, db, cache, governor)
+    
+    # Ежедневные уведомления: куча слотов (часовой пояс, время), отправка через тот же governor
+    notifier = None
+    if settings.ENABLE_NOTIFICATIONS:
+        from services.notifications import NotificationScheduler
+        
+        notifier = NotificationScheduler(bot, db, cache, governor)
     
     # Инициализация middleware
-    stats_middleware = StatisticsMiddleware()
+    stats_middleware = StatisticsMiddleware(cache)
+    stats_middleware.start()
+    request_log.add_flush_hook(stats_middleware.record_requests)
+    
+    # Rate limit, общий для всех реплик (GCRA в Redis)
+    throttling = ThrottlingMiddleware(DistributedRateLimiter(cache))
+    
+    # Справедливая очередь: слоты обработки по кругу между чатами
+    scheduler = FairScheduler()
+    dp.update.outer_middleware(FairSchedulerMiddleware(scheduler))
+    # При переполненной очереди getUpdates ждет (вебхук отвечает 429)
+    bot.session.middleware(IntakeBackpressure(scheduler))
+    
+    # Лимиты одновременных хендлеров по роутерам
+    router_limit = RouterLimitMiddleware(RouterLimiter(), scheduler)
+    
+    # Метрики Prometheus
+    metrics = MetricsServer()
+    metrics.watch_scheduler(scheduler)
+    if settings.METRICS_ENABLED:
+        await metrics.start()
+    
+    # Трассировка апдейтов (спаны Telegram API - через middleware сессии бота)
+    tracer = None
+    if settings.TRACING_ENABLED:
+        from services.tracing import TelegramSpanMiddleware, Tracer
+        
+        tracer = Tracer()
+        tracer.start()
+        bot.session.middleware(TelegramSpanMiddleware())
     
     # Регистрация middleware (порядок важен!)
-    dp.message.middleware(LoggingMiddleware())
-    dp.message.middleware(UserActivityMiddleware())
-    dp.message.middleware(ThrottlingMiddleware(rate_limit=1))
+    # Throttling - до обращения к БД, чтобы флуд не создавал нагрузку
+    dp.message.middleware(LoggingMiddleware(tracer))
+    dp.message.middleware(throttling)
+    dp.message.middleware(router_limit)
+    dp.message.middleware(UserActivityMiddleware(user_activity))
     dp.message.middleware(stats_middleware)
     
-    dp.callback_query.middleware(LoggingMiddleware())
-    dp.callback_query.middleware(UserActivityMiddleware())
+    dp.callback_query.middleware(LoggingMiddleware(tracer))
+    dp.callback_query.middleware(throttling)
+    dp.callback_query.middleware(router_limit)
+    dp.callback_query.middleware(UserActivityMiddleware(user_activity))
+    dp.callback_query.middleware(stats_middleware)
     
     # Регистрация роутеров
     dp.include_router(weather.router)
     dp.include_router(location.router)
     dp.include_router(forecast.router)
     dp.include_router(favorites.router)
+    dp.include_router(export.router)
+    dp.include_router(broadcast.router)
+    dp.include_router(notifications.router)
+    dp.include_router(inline.router)
     dp.include_router(errors.router)
     
     # Передача зависимостей
     dp.workflow_data.update({
         'cache': cache,
-        'stats': stats_middleware
+        'db': db,
+        'stats': stats_middleware,
+        'scheduler': scheduler,
+        'request_log': request_log,
+        'favorites_cache': favorites_cache,
+        'history_ring': history_ring,
+        'broadcaster': broadcaster,
+        'notifier': notifier,
+        'inline': inline_weather,
+        'startup': startup
     })
     
     # События запуска/остановки
     dp.startup.register(on_startup)
-    dp.shutdown.register(lambda: on_shutdown(bot))
+    dp.shutdown.register(on_shutdown)
+    startup.record('setup', setup_started)
     
     try:
-        await on_startup()
-        logger.info("✅ Бот запущен и готов к работе!")
-        logger.info(f"🔗 Bot username: @{(await bot.get_me()).username}")
+        logger.info(f"🔗 Bot username: @{me.username}")
+        
+        # Воркеры supervisor.py (кроме нулевого) не запускают одиночные задачи:
+        # без Redis блокировки не защищают от повторной отправки
+        if settings.is_primary_instance():
+            with startup.phase('resume'):
+                # Незавершенная рассылка продолжается с контрольной точки
+                await broadcaster.resume()
+                
+                if notifier:
+                    await notifier.start()
         
-        # Запуск polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if settings.BOT_MODE in ('webhook', 'worker'):
+            # aiohttp.web и серверная часть aiogram нужны только здесь
+            from services.webhook import WebhookServer
+            
+            # Вебхук: HTTP-сервер, ответ сразу, обработка в фоне.
+            # Воркер supervisor.py: апдейты своего шарда чатов по локальному HTTP
+            await WebhookServer(dp, bot, scheduler=scheduler).serve(register=settings.BOT_MODE == 'webhook')
+        else:
+            # getUpdates не работает, пока установлен вебхук
+            await bot.delete_webhook()
+            await dp.start_polling(
+                bot, allowed_updates=dp.resolve_used_update_types(), close_bot_session=False
+            )
     
     except Exception as e:
         logger.error(f"❌ Критическая ошибка: {e}", exc_info=True)
     
     finally:
+        # Плавная остановка под общим сроком: сначала апдейты в обработке,
+        # затем фоновые очереди, и только потом Redis, БД и HTTP-пулы
+        deadline = time.monotonic() + settings.SHUTDOWN_TIMEOUT
+        if not await scheduler.drain(settings.SHUTDOWN_TIMEOUT):
+            logger.warning(f"⚠️ Не дождались апдейтов в обработке: {scheduler.running + scheduler.waiting}")
+        
+        await close_before(deadline, broadcaster.close(), "Рассылка")
+        if notifier:
+            await close_before(deadline, notifier.close(), "Уведомления")
+        if retention:
+            await close_before(deadline, retention.close(), "Архивация")
+        await close_before(deadline, gazetteer.close(), "Справочник городов")
+        await close_before(deadline, request_log.close(), "Журнал запросов")
+        await close_before(deadline, user_activity.close(), "Активность пользователей")
+        await close_before(deadline, last_known_good.close(), "Снимки погоды")
+        await close_before(deadline, stats_middleware.close(), "Статистика")
+        if tracer:
+            await close_before(deadline, tracer.close(), "Трассировка")
+        if settings.WARM_CACHE_ENABLED:
+            await close_before(deadline, cache_snapshotter.close(), "Снимок кеша")
+        
+        await db.close()
         await cache.close()
+        await WeatherAPI.close()
+        await metrics.close()
+        await bot.session.close()
         logger.info("👋 Бот остановлен")
 
 
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, validator
 
@@ -11,6 +11,31 @@ class Settings(BaseSettings):
     )
     # ===== Telegram =====
     BOT_TOKEN: str = Field(..., description="Токен Telegram бота")
+    TELEGRAM_API_URL: str = Field(
+        default="https://api.telegram.org",
+        description="Сервер Bot API (свой local Bot API server или тестовый стенд)"
+    )
+    
+    # ===== Bot Mode =====
+    BOT_MODE: str = Field(
+        default="polling",
+        description="Получение апдейтов: polling, webhook или worker (апдейты от supervisor.py)"
+    )
+    WEBHOOK_URL: str | None = Field(default=None, description="Публичный HTTPS-адрес бота, например https://bot.example.com")
+    WEBHOOK_PATH: str = Field(default="/webhook", description="Путь приема апдейтов")
+    WEBHOOK_HOST: str = Field(default="0.0.0.0", description="Адрес HTTP-сервера вебхука")
+    WEBHOOK_PORT: int = Field(default=8080, description="Порт HTTP-сервера вебхука")
+    WEBHOOK_SECRET: str | None = Field(default=None, description="Секрет заголовка X-Telegram-Bot-Api-Secret-Token")
+    WEBHOOK_MAX_CONNECTIONS: int = Field(default=40, description="Одновременных соединений от Telegram (1-100)")
+    WEBHOOK_MAX_INFLIGHT: int = Field(default=1000, description="Максимум апдейтов в фоновой обработке (сверх - 429)")
+    
+    # ===== Supervisor (multi-process) =====
+    SUPERVISOR_WORKERS: int = Field(default=4, description="Число процессов-воркеров")
+    SUPERVISOR_WORKER_PORT: int = Field(default=8100, description="Порт первого воркера (далее +1)")
+    SUPERVISOR_HEALTH_INTERVAL: float = Field(default=5.0, description="Интервал проверки здоровья воркеров (секунды)")
+    SUPERVISOR_HEALTH_FAILURES: int = Field(default=3, description="Неудачных проверок подряд до перезапуска")
+    SUPERVISOR_MAX_BACKOFF: float = Field(default=30.0, description="Максимальная пауза перед перезапуском (секунды)")
+    WORKER_ID: int | None = Field(default=None, description="Номер воркера (задает супервизор)")
     
     # ===== OpenWeather API =====
     OPENWEATHER_API_KEY: str = Field(..., description="API ключ OpenWeather")
@@ -28,10 +53,23 @@ class Settings(BaseSettings):
     # ===== Cache Settings =====
     CACHE_TTL: int = Field(default=3600, description="TTL кеша текущей погоды (секунды)")
     FORECAST_CACHE_TTL: int = Field(default=7200, description="TTL кеша прогноза (секунды)")
+    WARM_CACHE_ENABLED: bool = Field(default=True, description="Снимок горячих ключей кеша для теплого перезапуска")
+    WARM_CACHE_FILE: str = Field(default="data/cache_snapshot.bin", description="Файл снимка горячих ключей кеша")
+    WARM_CACHE_INTERVAL: int = Field(default=300, description="Интервал записи снимка кеша (секунды)")
+    WARM_CACHE_SIZE: int = Field(default=5000, description="Размер рабочего набора ключей в снимке")
+    WARM_CACHE_PREFIXES: List[str] = Field(
+        default=["weather", "weather_coords", "forecast"],
+        description="Префиксы ключей, попадающих в снимок"
+    )
     
     # ===== API Settings =====
     API_TIMEOUT: int = Field(default=10, description="Таймаут API запросов (секунды)")
     MAX_RETRIES: int = Field(default=3, description="Максимум попыток повтора")
+    API_MAX_CONNECTIONS: int = Field(default=100, description="Максимум соединений к OpenWeather (общий пул процесса)")
+    CIRCUIT_FAILURE_THRESHOLD: int = Field(default=5, description="Ошибок API подряд, после которых запросы приостанавливаются")
+    CIRCUIT_RESET_TIMEOUT: float = Field(default=30.0, description="Пауза перед пробным запросом к недоступному API (секунды)")
+    LKG_FLUSH_INTERVAL: int = Field(default=5, description="Интервал записи last-known-good снимков погоды в БД (секунды)")
+    LKG_MAX_AGE: int = Field(default=86400, description="Максимальный возраст снимка, который показывается при недоступности API (секунды)")
     
     # ===== Database =====
     DATABASE_URL: str = Field(
@@ -40,10 +78,60 @@ class Settings(BaseSettings):
     )
     DB_POOL_SIZE: int = Field(default=5, description="Размер пула соединений")
     DB_TIMEOUT: int = Field(default=30, description="Таймаут операций с БД")
+    SQLITE_PROFILE: str = Field(
+        default="production",
+        description="Профиль SQLite: production (WAL + единственный писатель) или default"
+    )
+    SQLITE_SYNCHRONOUS: str = Field(default="NORMAL", description="PRAGMA synchronous для SQLite")
+    SQLITE_MMAP_SIZE: int = Field(default=256, description="PRAGMA mmap_size для SQLite (MB)")
+    SQLITE_CACHE_SIZE: int = Field(default=64, description="PRAGMA cache_size для SQLite (MB)")
+    DB_WRITE_QUEUE_SIZE: int = Field(default=10000, description="Макс операций в очереди писателя БД")
+    
+    # ===== Request Log (write-behind) =====
+    REQUEST_LOG_BATCH_SIZE: int = Field(default=200, description="Макс записей истории в одной пачке")
+    REQUEST_LOG_FLUSH_INTERVAL: int = Field(default=500, description="Интервал сброса истории (мс)")
+    REQUEST_LOG_QUEUE_SIZE: int = Field(default=10000, description="Макс записей истории в очереди")
+    REQUEST_LOG_OVERFLOW: str = Field(
+        default="drop",
+        description="Политика переполнения очереди истории: drop или block"
+    )
+    REQUEST_LOG_DRAIN_TIMEOUT: int = Field(default=10, description="Таймаут сброса истории при остановке (секунды)")
+    
+    # ===== Retention =====
+    RETENTION_ENABLED: bool = Field(default=True, description="Включить архивацию старой истории запросов")
+    RETENTION_DAYS: int = Field(default=90, description="Срок хранения истории запросов в БД (дни)")
+    RETENTION_INTERVAL: int = Field(default=24, description="Интервал запуска архивации (часы)")
+    RETENTION_BATCH_SIZE: int = Field(default=5000, description="Записей в одной транзакции удаления")
+    ARCHIVE_DIR: str = Field(default="archive", description="Каталог архивов истории запросов")
+    ARCHIVE_CHUNK_ROWS: int = Field(default=100000, description="Макс записей в одном файле архива")
+    
+    # ===== User Activity =====
+    USER_CACHE_SIZE: int = Field(default=10000, description="Размер LRU кеша telegram_id -> id пользователя")
+    ACTIVITY_FLUSH_INTERVAL: int = Field(default=30, description="Интервал сброса last_activity (секунды)")
+    
+    # ===== History =====
+    HISTORY_PAGE_SIZE: int = Field(default=10, description="Записей на странице /history (и размер кольца в Redis)")
+    HISTORY_RING_TTL: int = Field(default=86400, description="TTL кольца последних запросов в Redis (секунды)")
+    
+    # ===== Export =====
+    EXPORT_BATCH_SIZE: int = Field(default=1000, description="Строк истории в одной пачке выгрузки")
+    EXPORT_BUFFER_CHUNKS: int = Field(default=8, description="Максимум готовых пачек в буфере выгрузки")
+    EXPORT_MAX_CONCURRENT: int = Field(default=2, description="Максимум одновременных выгрузок истории")
+    
+    # ===== Statistics Sketches =====
+    STATS_HLL_PRECISION: int = Field(default=14, description="Точность HyperLogLog: 2^p регистров, ошибка ~1.04/sqrt(2^p)")
+    STATS_CMS_WIDTH: int = Field(default=2048, description="Ширина Count-Min sketch (ошибка ~e/width от числа событий)")
+    STATS_CMS_DEPTH: int = Field(default=4, description="Глубина Count-Min sketch (вероятность ошибки ~e^-depth)")
+    STATS_TOP_K: int = Field(default=20, description="Сколько самых частых команд и городов отслеживать")
+    STATS_SYNC_INTERVAL: int = Field(default=10, description="Интервал слияния статистики в Redis (секунды)")
     
     # ===== Application Settings =====
     LOG_LEVEL: str = Field(default="INFO", description="Уровень логирования")
     MAX_FAVORITE_CITIES: int = Field(default=10, description="Максимум избранных городов")
+    FAVORITES_CACHE_SIZE: int = Field(default=10000, description="Макс пользователей в локальном кеше избранного")
+    FAVORITES_CACHE_TTL: int = Field(default=86400, description="TTL кеша избранного в Redis (секунды)")
+    FAVORITES_LOCAL_TTL: int = Field(default=60, description="TTL локального кеша избранного (секунды)")
+    STATUS_MESSAGE_DELAY: float = Field(default=1.0, description="Через сколько секунд ожидания API показать статусное сообщение")
     
     # ===== Admin Settings =====
     ADMIN_IDS: List[int] = Field(default_factory=list, description="ID администраторов")
@@ -61,6 +149,17 @@ class Settings(BaseSettings):
     RATE_LIMIT: float = Field(default=1.0, description="Минимум секунд между запросами")
     MAX_REQUESTS_PER_WINDOW: int = Field(default=10, description="Макс запросов в окне")
     RATE_LIMIT_WINDOW: int = Field(default=60, description="Окно для rate limit (секунды)")
+    RATE_LIMIT_CACHE_SIZE: int = Field(default=10000, description="Максимум пользователей в локальном кеше rate limit")
+    
+    # ===== Fair Scheduling =====
+    SCHEDULER_WORKERS: int = Field(default=32, description="Максимум одновременно обрабатываемых апдейтов")
+    SCHEDULER_CHAT_QUEUE_SIZE: int = Field(default=20, description="Максимум ожидающих апдейтов одного чата")
+    SCHEDULER_PAUSE_THRESHOLD: int = Field(default=500, description="Ожидающих апдейтов, при котором прием приостанавливается")
+    ROUTER_LIMITS: Dict[str, int] = Field(
+        default_factory=lambda: {'weather': 16, 'location': 8, 'forecast': 8, 'favorites': 8, 'export': 2},
+        description='Одновременных хендлеров на роутер (JSON), например {"weather": 16, "export": 2}'
+    )
+    SHUTDOWN_TIMEOUT: float = Field(default=30.0, description="Срок завершения обработки при остановке (секунды)")
     
     # ===== Feature Flags =====
     ENABLE_FAVORITES: bool = Field(default=True, description="Включить избранное")
@@ -71,6 +170,19 @@ class Settings(BaseSettings):
     LOG_FILE: str = Field(default="logs/bot.log", description="Путь к файлу логов")
     LOG_MAX_SIZE: int = Field(default=10, description="Макс размер лога (MB)")
     LOG_BACKUP_COUNT: int = Field(default=5, description="Количество файлов логов")
+    LOG_FORMAT: str = Field(default="json", description="Формат файла логов: json или text")
+    LOG_SAMPLE_RATE: float = Field(default=0.1, description="Доля логируемых высокочастотных событий (per-update)")
+    LOG_RATE_LIMIT: int = Field(default=20, description="Макс записей в секунду на один шаблон сообщения")
+    
+    # ===== Tracing =====
+    TRACING_ENABLED: bool = Field(default=True, description="Включить трассировку апдейтов")
+    TRACING_SAMPLE_RATE: float = Field(default=0.01, description="Доля трасс, отправляемых в OTLP (head sampling)")
+    TRACING_SLOW_THRESHOLD: int = Field(default=2000, description="Порог медленного апдейта (мс)")
+    TRACING_SLOW_FILE: str = Field(default="logs/slow_updates.jsonl", description="Файл деревьев спанов медленных апдейтов")
+    TRACING_OTLP_ENDPOINT: str | None = Field(
+        default=None,
+        description="OTLP/HTTP коллектор, например http://localhost:4318/v1/traces"
+    )
     
     # ===== Development =====
     DEBUG: bool = Field(default=False, description="Режим отладки")
@@ -90,12 +202,29 @@ class Settings(BaseSettings):
             return [lang.strip() for lang in v.split(',') if lang.strip()]
         return v
     
+    # ===== Inline Mode =====
+    INLINE_RESULTS: int = Field(default=5, description="Максимум городов в ответе на inline-запрос")
+    INLINE_CACHE_TIME: int = Field(default=300, description="cache_time ответа на inline-запрос (кеш на стороне Telegram, секунды)")
+    INLINE_DEBOUNCE: float = Field(default=0.4, description="Пауза перед запросом к API для inline-запроса, которого нет в кеше (секунды)")
+    INLINE_CACHE_SIZE: int = Field(default=5000, description="Размер локального LRU готовых inline-результатов")
+    INLINE_LOCAL_TTL: int = Field(default=120, description="TTL локального LRU готовых inline-результатов (секунды)")
+    INLINE_GAZETTEER_SIZE: int = Field(default=1000, description="Популярных городов из статистики в справочнике inline-подсказок")
+    INLINE_GAZETTEER_REFRESH: int = Field(default=3600, description="Интервал обновления справочника городов (секунды)")
+    
+    # ===== Broadcast =====
+    BROADCAST_RATE: float = Field(default=25.0, description="Массовых отправок в секунду (лимит Telegram ~30)")
+    BROADCAST_BATCH_SIZE: int = Field(default=100, description="Пользователей в пачке (шаг контрольной точки)")
+    BROADCAST_CONCURRENCY: int = Field(default=10, description="Одновременных отправок рассылки")
+    BROADCAST_PROGRESS_INTERVAL: int = Field(default=5, description="Интервал обновления прогресса (секунды)")
+    
     # ===== Notifications =====
     NOTIFICATION_TIME: str = Field(default="08:00", description="Время уведомлений")
     NOTIFICATION_TIMEZONE: str = Field(default="Europe/Moscow", description="Часовой пояс")
+    NOTIFICATION_REFRESH_INTERVAL: int = Field(default=300, description="Интервал обновления слотов уведомлений из БД (секунды)")
+    NOTIFICATION_BATCH_SIZE: int = Field(default=1000, description="Подписчиков в пачке при отправке слота")
     
     # ===== External Services =====
-
+    
     SENTRY_DSN: str | None = Field(default=None, description="Sentry DSN для мониторинга")
     METRICS_ENABLED: bool = Field(default=False, description="Включить Prometheus метрики")
     METRICS_PORT: int = Field(default=9090, description="Порт для метрик")
@@ -146,11 +275,73 @@ class Settings(BaseSettings):
             raise ValueError("RATE_LIMIT должен быть от 0.1 до 60 секунд")
         return v
     
+    @validator('SQLITE_PROFILE')
+    def validate_sqlite_profile(cls, v):
+        """Проверка профиля SQLite"""
+        if v not in ('production', 'default'):
+            raise ValueError("SQLITE_PROFILE должен быть production или default")
+        return v
+    
+    @validator('SQLITE_SYNCHRONOUS')
+    def validate_sqlite_synchronous(cls, v):
+        """Проверка режима synchronous"""
+        v = v.upper()
+        if v not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            raise ValueError("SQLITE_SYNCHRONOUS должен быть OFF, NORMAL, FULL или EXTRA")
+        return v
+    
+    @validator('REQUEST_LOG_OVERFLOW')
+    def validate_overflow(cls, v):
+        """Проверка политики переполнения очереди"""
+        if v not in ('drop', 'block'):
+            raise ValueError("REQUEST_LOG_OVERFLOW должен быть drop или block")
+        return v
+    
+    @validator('LOG_FORMAT')
+    def validate_log_format(cls, v):
+        """Проверка формата логов"""
+        if v not in ('json', 'text'):
+            raise ValueError("LOG_FORMAT должен быть json или text")
+        return v
+    
+    @validator('BOT_MODE')
+    def validate_bot_mode(cls, v):
+        """Проверка режима получения апдейтов"""
+        if v not in ('polling', 'webhook', 'worker'):
+            raise ValueError("BOT_MODE должен быть polling, webhook или worker")
+        return v
+    
+    @validator('WEBHOOK_URL', always=True)
+    def validate_webhook_url(cls, v, values):
+        """Для режима webhook нужен публичный адрес"""
+        if values.get('BOT_MODE') == 'webhook' and not v:
+            raise ValueError("WEBHOOK_URL обязателен при BOT_MODE=webhook")
+        return v.rstrip('/') if v else v
+    
+    @validator('WEBHOOK_MAX_CONNECTIONS')
+    def validate_webhook_connections(cls, v):
+        """Проверка лимита соединений Telegram"""
+        if v < 1 or v > 100:
+            raise ValueError("WEBHOOK_MAX_CONNECTIONS должен быть от 1 до 100")
+        return v
+    
+    @validator('STATS_HLL_PRECISION')
+    def validate_hll_precision(cls, v):
+        """Проверка точности HyperLogLog"""
+        if v < 4 or v > 18:
+            raise ValueError("STATS_HLL_PRECISION должен быть от 4 до 18")
+        return v
+    
     # ===== Helper Methods =====
     def is_admin(self, user_id: int) -> bool:
         """Проверить, является ли пользователь админом"""
         return user_id in self.ADMIN_IDS
     
+    def is_primary_instance(self) -> bool:
+        """Одиночные фоновые задачи (архивация, уведомления, продолжение рассылки)
+        выполняет только отдельный процесс или воркер 0 супервизора"""
+        return self.WORKER_ID in (None, 0)
+    
     def get_redis_url(self) -> str:
         """Получить URL для подключения к Redis"""
         auth = f":{self.REDIS_PASSWORD}@" if self.REDIS_PASSWORD else ""
@@ -1,8 +1,25 @@
 
-from typing import List, Optional
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import String, and_, bindparam, func, insert, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from .models import User, FavoriteCity, WeatherRequest, UserSettings
+from datetime import date, datetime, timedelta
+from .models import (
+    User, FavoriteCity, WeatherRequest, UserSettings,
+    RequestStatsHourly, ActiveUserDaily, WeatherSnapshot
+)
+
+
+def _dialect_insert(session: Session, model):
+    """INSERT с поддержкой ON CONFLICT для текущего диалекта (или None)"""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(model)
+    if dialect == 'postgresql':
+        return postgresql.insert(model)
+    return None
 
 
 class UserCRUD:
@@ -25,13 +42,85 @@ class UserCRUD:
         
         return user
     
+    @staticmethod
+    def upsert(session: Session, telegram_id: int, **kwargs) -> int:
+        """Создать или обновить пользователя одним запросом, вернуть его id"""
+        profile = {key: value for key, value in kwargs.items() if value is not None}
+        now = datetime.utcnow()
+        
+        stmt = _dialect_insert(session, User)
+        if stmt is None:
+            return UserCRUD.get_or_create(session, telegram_id, **profile).id
+        
+        stmt = stmt.values(telegram_id=telegram_id, last_activity=now, **profile)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            # Пишет боту - значит, снова доступен для рассылок
+            set_={**profile, 'last_activity': now, 'is_active': True}
+        ).returning(User.id)
+        
+        user_id = session.execute(stmt).scalar_one()
+        StatsRollupCRUD.mark_active(session, [(now.date(), user_id)])
+        session.commit()
+        return user_id
+    
+    @staticmethod
+    def touch_many(session: Session, activity: Dict[int, datetime]) -> int:
+        """Обновить last_activity пачки пользователей одним UPDATE"""
+        if not activity:
+            return 0
+        
+        stmt = update(User.__table__).where(
+            User.__table__.c.id == bindparam('user_id')
+        ).values(last_activity=bindparam('ts'), is_active=True)
+        session.execute(
+            stmt,
+            [{'user_id': user_id, 'ts': ts} for user_id, ts in activity.items()]
+        )
+        StatsRollupCRUD.mark_active(
+            session,
+            [(ts.date(), user_id) for user_id, ts in activity.items()]
+        )
+        session.commit()
+        return len(activity)
+    
     @staticmethod
     def get_active_users_count(session: Session, days: int = 7) -> int:
-        """Количество активных пользователей за период"""
-        threshold = datetime.utcnow() - timedelta(days=days)
-        return session.query(User).filter(
-            User.last_activity >= threshold
-        ).count()
+        """Количество активных пользователей за период (по дневным агрегатам)"""
+        return StatsRollupCRUD.get_active_users_count(session, days)
+    
+    @staticmethod
+    def get_id(session: Session, telegram_id: int) -> Optional[int]:
+        """id пользователя в БД по telegram_id"""
+        return session.query(User.id).filter_by(telegram_id=telegram_id).scalar()
+    
+    @staticmethod
+    def get_active_batch(session: Session, after_id: int, limit: int) -> List[Tuple[int, int]]:
+        """Пачка активных пользователей (id, telegram_id) после after_id (keyset по id)"""
+        return session.query(User.id, User.telegram_id).filter(
+            User.id > after_id,
+            User.is_active.is_(True)
+        ).order_by(User.id).limit(limit).all()
+    
+    @staticmethod
+    def count_active(session: Session, after_id: int = 0) -> int:
+        """Количество активных пользователей после after_id"""
+        return session.query(func.count(User.id)).filter(
+            User.id > after_id,
+            User.is_active.is_(True)
+        ).scalar()
+    
+    @staticmethod
+    def deactivate_many(session: Session, user_ids: Iterable[int]) -> int:
+        """Пометить пользователей, заблокировавших бота, как неактивных"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        updated = session.query(User).filter(User.id.in_(user_ids)).update(
+            {'is_active': False}, synchronize_session=False
+        )
+        session.commit()
+        return updated
     
     @staticmethod
     def update(session: Session, telegram_id: int, **kwargs) -> Optional[User]:
@@ -49,8 +138,9 @@ class FavoriteCityCRUD:
     """CRUD операции для избранных городов"""
     
     @staticmethod
-    def add(session: Session, user_id: int, city_name: str, country_code: str = None) -> FavoriteCity:
-        """Добавить город в избранное"""
+    def add(session: Session, user_id: int, city_name: str, country_code: str = None,
+            limit: Optional[int] = None) -> Optional[FavoriteCity]:
+        """Добавить город в избранное (None - достигнут лимит limit)"""
         # Проверяем, нет ли уже такого города
         existing = session.query(FavoriteCity).filter_by(
             user_id=user_id,
@@ -60,15 +150,33 @@ class FavoriteCityCRUD:
         if existing:
             return existing
         
-        favorite = FavoriteCity(
-            user_id=user_id,
-            city_name=city_name,
-            country_code=country_code
+        values = select(
+            literal(user_id), literal(city_name), literal(country_code, String)
         )
-        session.add(favorite)
-        session.commit()
-        session.refresh(favorite)
-        return favorite
+        if limit is not None:
+            # Проверка лимита и вставка - один INSERT ... SELECT ... WHERE:
+            # не зависит от того, что записи идут через единственный писатель
+            count = select(func.count()).select_from(FavoriteCity).where(
+                FavoriteCity.user_id == user_id
+            ).scalar_subquery()
+            values = values.where(count < limit)
+        
+        try:
+            result = session.execute(insert(FavoriteCity).from_select(
+                ['user_id', 'city_name', 'country_code'], values
+            ))
+            session.commit()
+        except IntegrityError:
+            # Параллельное добавление того же города (уникальный индекс)
+            session.rollback()
+        else:
+            if result.rowcount == 0:
+                return None
+        
+        return session.query(FavoriteCity).filter_by(
+            user_id=user_id,
+            city_name=city_name
+        ).one()
     
     @staticmethod
     def get_all(session: Session, user_id: int) -> List[FavoriteCity]:
@@ -77,6 +185,12 @@ class FavoriteCityCRUD:
             user_id=user_id
         ).order_by(FavoriteCity.created_at.desc()).all()
     
+    @staticmethod
+    def get_names(session: Session, user_id: int) -> List[str]:
+        """Получить названия избранных городов пользователя"""
+        rows = session.query(FavoriteCity.city_name).filter_by(user_id=user_id).all()
+        return [row.city_name for row in rows]
+    
     @staticmethod
     def remove(session: Session, user_id: int, city_name: str) -> bool:
         """Удалить город из избранного"""
@@ -114,50 +228,102 @@ class WeatherRequestCRUD:
             success=success
         )
         session.add(request)
+        session.flush()
+        StatsRollupCRUD.add_requests(session, [{
+            'city_name': city_name,
+            'success': success,
+            'created_at': request.created_at
+        }])
         session.commit()
         return request
     
     @staticmethod
-    def get_user_history(session: Session, user_id: int, limit: int = 10) -> List[WeatherRequest]:
-        """Получить историю запросов пользователя"""
-        return session.query(WeatherRequest).filter_by(
-            user_id=user_id
-        ).order_by(WeatherRequest.created_at.desc()).limit(limit).all()
+    def bulk_create(session: Session, records: List[dict]) -> int:
+        """Создать пачку записей о запросах одним INSERT и обновить агрегаты
+
+        Записям проставляется id - он нужен кольцу истории для курсора страниц.
+        """
+        if not records:
+            return 0
+        
+        ids = session.execute(
+            insert(WeatherRequest).returning(WeatherRequest.id, sort_by_parameter_order=True), records
+        ).scalars().all()
+        for record, row_id in zip(records, ids):
+            record['id'] = row_id
+        StatsRollupCRUD.add_requests(session, records)
+        session.commit()
+        return len(records)
     
     @staticmethod
-    def get_popular_cities(session: Session, days: int = 30, limit: int = 10) -> List[tuple]:
-        """Получить популярные города"""
-        threshold = datetime.utcnow() - timedelta(days=days)
-        
-        from sqlalchemy import func
-        
-        return session.query(
+    def get_user_history(session: Session, user_id: int, limit: int = 10,
+                         before: Optional[datetime] = None,
+                         before_id: Optional[int] = None) -> List[WeatherRequest]:
+        """Получить историю запросов пользователя (keyset: записи старше (before, before_id))"""
+        query = session.query(WeatherRequest).filter(WeatherRequest.user_id == user_id)
+        if before is not None and before_id is not None:
+            # id различает записи с одинаковым временем
+            query = query.filter(or_(
+                WeatherRequest.created_at < before,
+                and_(WeatherRequest.created_at == before, WeatherRequest.id < before_id)
+            ))
+        elif before is not None:
+            query = query.filter(WeatherRequest.created_at < before)
+        return query.order_by(
+            WeatherRequest.created_at.desc(), WeatherRequest.id.desc()
+        ).limit(limit).all()
+    
+    @staticmethod
+    def iter_user_history(session: Session, user_id: int,
+                          batch_size: int = 1000) -> Iterator[list]:
+        """Вся история пользователя пачками по batch_size (серверный курсор)"""
+        rows = session.query(
+            WeatherRequest.created_at,
             WeatherRequest.city_name,
-            func.count(WeatherRequest.id).label('count')
+            WeatherRequest.request_type,
+            WeatherRequest.success
         ).filter(
-            WeatherRequest.created_at >= threshold,
-            WeatherRequest.success == True
-        ).group_by(
-            WeatherRequest.city_name
-        ).order_by(
-            func.count(WeatherRequest.id).desc()
-        ).limit(limit).all()
+            WeatherRequest.user_id == user_id
+        ).order_by(WeatherRequest.created_at).yield_per(batch_size)
+        
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    @staticmethod
+    def get_expired_batch(session: Session, cutoff: datetime, after_id: int,
+                          limit: int) -> List[WeatherRequest]:
+        """Пачка записей старше cutoff (keyset по id)"""
+        return session.query(WeatherRequest).filter(
+            WeatherRequest.id > after_id,
+            WeatherRequest.created_at < cutoff
+        ).order_by(WeatherRequest.id).limit(limit).all()
+    
+    @staticmethod
+    def delete_expired_range(session: Session, first_id: int, last_id: int,
+                             cutoff: datetime) -> int:
+        """Удалить записи старше cutoff в диапазоне id (отдельной транзакцией)"""
+        deleted = session.query(WeatherRequest).filter(
+            WeatherRequest.id.between(first_id, last_id),
+            WeatherRequest.created_at < cutoff
+        ).delete(synchronize_session=False)
+        session.commit()
+        return deleted
+    
+    @staticmethod
+    def get_popular_cities(session: Session, days: int = 30, limit: int = 10) -> List[tuple]:
+        """Получить популярные города (по почасовым агрегатам)"""
+        return StatsRollupCRUD.get_popular_cities(session, days, limit)
     
     @staticmethod
     def get_stats(session: Session, days: int = 7) -> dict:
-        """Получить статистику запросов"""
-        threshold = datetime.utcnow() - timedelta(days=days)
-        
-        from sqlalchemy import func
-        
-        total = session.query(func.count(WeatherRequest.id)).filter(
-            WeatherRequest.created_at >= threshold
-        ).scalar()
-        
-        successful = session.query(func.count(WeatherRequest.id)).filter(
-            WeatherRequest.created_at >= threshold,
-            WeatherRequest.success == True
-        ).scalar()
+        """Получить статистику запросов (по почасовым агрегатам)"""
+        total, successful = StatsRollupCRUD.get_totals(session, days)
         
         return {
             'total': total,
@@ -167,9 +333,158 @@ class WeatherRequestCRUD:
         }
 
 
+class StatsRollupCRUD:
+    """Инкрементальные агрегаты статистики
+
+    Методы записи не делают commit: они выполняются в транзакции
+    вызывающего кода вместе с исходными данными.
+    """
+    
+    @staticmethod
+    def _hour(ts: datetime) -> datetime:
+        """Начало часа"""
+        return ts.replace(minute=0, second=0, microsecond=0)
+    
+    @staticmethod
+    def _hour_threshold(days: int) -> datetime:
+        """Первый учитываемый час периода"""
+        return StatsRollupCRUD._hour(datetime.utcnow() - timedelta(days=days))
+    
+    @staticmethod
+    def add_requests(session: Session, records: Iterable[dict]):
+        """Прибавить пачку запросов к почасовым агрегатам"""
+        counts = Counter(
+            (StatsRollupCRUD._hour(r['created_at']), r['city_name'], bool(r['success']))
+            for r in records
+        )
+        if not counts:
+            return
+        
+        rows = [
+            {'hour': hour, 'city_name': city, 'success': success, 'count': count}
+            for (hour, city, success), count in counts.items()
+        ]
+        
+        stmt = _dialect_insert(session, RequestStatsHourly)
+        if stmt is None:
+            for row in rows:
+                existing = session.get(
+                    RequestStatsHourly, (row['hour'], row['city_name'], row['success'])
+                )
+                if existing:
+                    existing.count += row['count']
+                else:
+                    session.add(RequestStatsHourly(**row))
+            return
+        
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['hour', 'city_name', 'success'],
+            set_={'count': RequestStatsHourly.count + stmt.excluded.count}
+        )
+        session.execute(stmt, rows)
+    
+    @staticmethod
+    def mark_active(session: Session, pairs: Iterable[Tuple[date, int]]):
+        """Отметить пользователей активными в указанные дни"""
+        rows = [{'day': day, 'user_id': user_id} for day, user_id in set(pairs)]
+        if not rows:
+            return
+        
+        stmt = _dialect_insert(session, ActiveUserDaily)
+        if stmt is None:
+            for row in rows:
+                if not session.get(ActiveUserDaily, (row['day'], row['user_id'])):
+                    session.add(ActiveUserDaily(**row))
+            return
+        
+        session.execute(stmt.on_conflict_do_nothing(index_elements=['day', 'user_id']), rows)
+    
+    @staticmethod
+    def get_totals(session: Session, days: int) -> Tuple[int, int]:
+        """Всего и успешных запросов за период"""
+        rows = session.query(
+            RequestStatsHourly.success,
+            func.sum(RequestStatsHourly.count)
+        ).filter(
+            RequestStatsHourly.hour >= StatsRollupCRUD._hour_threshold(days)
+        ).group_by(RequestStatsHourly.success).all()
+        
+        by_success = {success: int(count or 0) for success, count in rows}
+        successful = by_success.get(True, 0)
+        return successful + by_success.get(False, 0), successful
+    
+    @staticmethod
+    def get_popular_cities(session: Session, days: int, limit: int) -> List[tuple]:
+        """Популярные города за период"""
+        total = func.sum(RequestStatsHourly.count)
+        return session.query(
+            RequestStatsHourly.city_name,
+            total.label('count')
+        ).filter(
+            RequestStatsHourly.hour >= StatsRollupCRUD._hour_threshold(days),
+            RequestStatsHourly.success == True
+        ).group_by(
+            RequestStatsHourly.city_name
+        ).order_by(
+            total.desc()
+        ).limit(limit).all()
+    
+    @staticmethod
+    def get_active_users_count(session: Session, days: int) -> int:
+        """Количество уникальных активных пользователей за период"""
+        first_day = (datetime.utcnow() - timedelta(days=days)).date()
+        return session.query(
+            func.count(func.distinct(ActiveUserDaily.user_id))
+        ).filter(ActiveUserDaily.day >= first_day).scalar() or 0
+    
+    @staticmethod
+    def needs_rebuild(session: Session) -> bool:
+        """Агрегаты пусты, а история запросов - нет"""
+        has_rollups = session.query(RequestStatsHourly.hour).first() is not None
+        if has_rollups:
+            return False
+        return session.query(WeatherRequest.id).first() is not None
+    
+    @staticmethod
+    def rebuild(session: Session, batch_size: int = 10000):
+        """Построить агрегаты потоковым проходом по истории запросов"""
+        rows = session.query(
+            WeatherRequest.user_id,
+            WeatherRequest.city_name,
+            WeatherRequest.success,
+            WeatherRequest.created_at
+        ).yield_per(batch_size)
+        
+        records, active = [], set()
+        for row in rows:
+            created_at = row.created_at or datetime.utcnow()
+            records.append({
+                'city_name': row.city_name,
+                'success': row.success,
+                'created_at': created_at
+            })
+            active.add((created_at.date(), row.user_id))
+            
+            if len(records) >= batch_size:
+                StatsRollupCRUD.add_requests(session, records)
+                records = []
+            if len(active) >= batch_size:
+                StatsRollupCRUD.mark_active(session, active)
+                active = set()
+        
+        StatsRollupCRUD.add_requests(session, records)
+        StatsRollupCRUD.mark_active(session, active)
+        session.commit()
+
+
 class UserSettingsCRUD:
     """CRUD операции для настроек пользователей"""
     
+    @staticmethod
+    def get(session: Session, user_id: int) -> Optional[UserSettings]:
+        """Получить настройки (None - еще не созданы)"""
+        return session.query(UserSettings).filter_by(user_id=user_id).first()
+    
     @staticmethod
     def get_or_create(session: Session, user_id: int) -> UserSettings:
         """Получить или создать настройки"""
@@ -195,4 +510,85 @@ class UserSettingsCRUD:
             session.commit()
             session.refresh(settings)
         
-        return settings
\ No newline at end of file
+        return settings
+    
+    @staticmethod
+    def upsert(session: Session, user_id: int, **kwargs) -> UserSettings:
+        """Создать или обновить настройки"""
+        settings = UserSettingsCRUD.get_or_create(session, user_id)
+        for key, value in kwargs.items():
+            setattr(settings, key, value)
+        settings.updated_at = datetime.utcnow()
+        session.commit()
+        session.refresh(settings)
+        return settings
+    
+    @staticmethod
+    def _subscribers(session: Session, default_time: str, default_timezone: str):
+        """Подписчики уведомлений с временем и часовым поясом (с учетом значений по умолчанию)"""
+        notify_time = func.coalesce(UserSettings.notification_time, default_time)
+        timezone = func.coalesce(UserSettings.timezone, default_timezone)
+        query = session.query(UserSettings).join(User, User.id == UserSettings.user_id).filter(
+            UserSettings.notifications_enabled.is_(True),
+            UserSettings.default_city.isnot(None),
+            User.is_active.is_(True)
+        )
+        return query, notify_time, timezone
+    
+    @staticmethod
+    def get_notification_slots(session: Session, default_time: str,
+                               default_timezone: str) -> List[Tuple[str, str]]:
+        """Различные пары (часовой пояс, время) подписчиков"""
+        query, notify_time, timezone = UserSettingsCRUD._subscribers(session, default_time, default_timezone)
+        return [tuple(row) for row in query.with_entities(timezone, notify_time).distinct().all()]
+    
+    @staticmethod
+    def get_due_subscribers(session: Session, timezone: str, notify_time: str, after_id: int,
+                            limit: int, default_time: str, default_timezone: str) -> List[tuple]:
+        """Пачка подписчиков слота (user_id, telegram_id, город, единицы, язык), keyset по user_id"""
+        query, notify_time_col, timezone_col = UserSettingsCRUD._subscribers(
+            session, default_time, default_timezone
+        )
+        return query.with_entities(
+            UserSettings.user_id, User.telegram_id, UserSettings.default_city,
+            UserSettings.temperature_unit, User.language_code
+        ).filter(
+            timezone_col == timezone,
+            notify_time_col == notify_time,
+            UserSettings.user_id > after_id
+        ).order_by(UserSettings.user_id).limit(limit).all()
+
+
+class WeatherSnapshotCRUD:
+    """Last-known-good данные о погоде"""
+    
+    @staticmethod
+    def upsert_many(session: Session, snapshots: Dict[str, Tuple[str, datetime]]) -> int:
+        """Записать пачку снимков {ключ: (JSON, время наблюдения)}, новые заменяют старые"""
+        if not snapshots:
+            return 0
+        
+        rows = [
+            {'key': key, 'data': data, 'observed_at': observed_at}
+            for key, (data, observed_at) in snapshots.items()
+        ]
+        stmt = _dialect_insert(session, WeatherSnapshot)
+        if stmt is None:
+            for row in rows:
+                session.merge(WeatherSnapshot(**row))
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[WeatherSnapshot.key],
+                set_={'data': stmt.excluded.data, 'observed_at': stmt.excluded.observed_at}
+            )
+            session.execute(stmt, rows)
+        session.commit()
+        return len(rows)
+    
+    @staticmethod
+    def get(session: Session, key: str) -> Optional[Tuple[str, datetime]]:
+        """Снимок по ключу: (JSON, время наблюдения)"""
+        row = session.query(WeatherSnapshot.data, WeatherSnapshot.observed_at).filter(
+            WeatherSnapshot.key == key
+        ).first()
+        return tuple(row) if row else None
@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+from sqlalchemy import text
+
+from config import settings
+from services.metrics import DB_LATENCY
+from services.tracing import span
+from .models import init_db, init_read_db
+
+logger = logging.getLogger(__name__)
+
+
+def _ping(session) -> None:
+    session.execute(text("SELECT 1"))
+
+
+def _execute(fn: Callable[..., Any], session, *args, **kwargs) -> Any:
+    """Вызов CRUD-функции в потоке БД: спан sql - чистое время выполнения"""
+    with span('sql', op=fn.__qualname__):
+        return fn(session, *args, **kwargs)
+
+
+class DBWriter:
+    """Единственный поток, через который проходят все записи в SQLite
+
+    Операции выполняются строго по очереди, поэтому писатели не
+    конкурируют за блокировку файла, а читатели (WAL) их не ждут.
+    """
+
+    def __init__(self, session_factory, max_queue: int = settings.DB_WRITE_QUEUE_SIZE):
+        self.session_factory = session_factory
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Запуск потока-писателя"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+            self._thread.start()
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Выполнить fn(session, *args, **kwargs) в потоке-писателе"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = (contextvars.copy_context(), fn, args, kwargs, future, loop)
+
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            # Очередь писателя переполнена: ждем места, не блокируя event loop
+            await asyncio.to_thread(self._queue.put, job)
+
+        return await future
+
+    async def close(self):
+        """Остановка после выполнения уже поставленных операций"""
+        if self._thread is None:
+            return
+        await asyncio.to_thread(self._queue.put, None)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    def _loop(self):
+        """Цикл потока-писателя"""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+
+            ctx, fn, args, kwargs, future, loop = job
+            session = self.session_factory()
+            try:
+                result = ctx.run(_execute, fn, session, *args, **kwargs)
+            except Exception as e:
+                session.rollback()
+                loop.call_soon_threadsafe(self._resolve, future, None, e)
+            else:
+                loop.call_soon_threadsafe(self._resolve, future, result, None)
+            finally:
+                session.close()
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any, error: Optional[BaseException]):
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+class Database:
+    """Точка доступа к БД для асинхронного кода
+
+    read() выполняется в пуле потоков на сессиях только для чтения,
+    write() - через DBWriter (SQLite, профиль production) или в пуле
+    потоков (остальные БД). Синхронная работа с БД не блокирует event loop.
+    """
+
+    def __init__(self, database_url: str = settings.DATABASE_URL):
+        self.database_url = database_url
+        self.write_session = init_db(database_url)
+        self.is_sqlite = database_url.startswith('sqlite')
+
+        if self.is_sqlite:
+            self.read_session = init_read_db(database_url)
+        else:
+            self.read_session = self.write_session
+
+        self.writer: Optional[DBWriter] = None
+        if self.is_sqlite and settings.SQLITE_PROFILE == 'production':
+            self.writer = DBWriter(self.write_session)
+
+    def start(self):
+        """Запуск потока-писателя"""
+        if self.writer:
+            self.writer.start()
+
+    async def warmup(self):
+        """Открыть соединения пулов чтения и записи заранее, до первого апдейта"""
+        await asyncio.gather(self.read(_ping), self.write(_ping))
+
+    async def close(self):
+        """Остановка писателя и закрытие пулов соединений"""
+        if self.writer:
+            await self.writer.close()
+        self.write_session.kw['bind'].dispose()
+        self.read_session.kw['bind'].dispose()
+
+    async def read(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Выполнить fn(session, ...) на сессии для чтения"""
+        with DB_LATENCY.labels('read', fn.__qualname__).time(), span('db.read', op=fn.__qualname__):
+            return await asyncio.to_thread(self._call, self.read_session, fn, *args, **kwargs)
+
+    async def write(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Выполнить fn(session, ...) на сессии для записи"""
+        with DB_LATENCY.labels('write', fn.__qualname__).time(), span('db.write', op=fn.__qualname__):
+            if self.writer:
+                return await self.writer.run(fn, *args, **kwargs)
+            return await asyncio.to_thread(self._call, self.write_session, fn, *args, **kwargs)
+
+    @staticmethod
+    def _call(session_factory, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        session = session_factory()
+        try:
+            return _execute(fn, session, *args, **kwargs)
+        finally:
+            session.close()
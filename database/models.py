@@ -1,9 +1,22 @@
+import logging
+import zlib
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, create_engine
+from sqlalchemy import (
+    Column, Integer, String, Text, DateTime, Date, Boolean, Index, create_engine, event, inspect, text
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from config import settings
 
 Base = declarative_base()
+logger = logging.getLogger(__name__)
+
+# Значение PRAGMA auto_vacuum для режима INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Ревизия шагов migrate_db: увеличить, когда существующим БД нужно повторить
+# миграцию при той же схеме моделей (1 - дедупликация перед уникальными индексами)
+MIGRATION_REVISION = 1
 
 
 class User(Base):
@@ -27,9 +40,13 @@ class User(Base):
 class FavoriteCity(Base):
     """Избранные города пользователя"""
     __tablename__ = 'favorite_cities'
+    __table_args__ = (
+        # Покрывает и выборки по user_id, и проверку членства города
+        Index('ix_favorite_cities_user_city', 'user_id', 'city_name', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     city_name = Column(String(255), nullable=False)
     country_code = Column(String(10), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -41,9 +58,13 @@ class FavoriteCity(Base):
 class WeatherRequest(Base):
     """История запросов погоды"""
     __tablename__ = 'weather_requests'
+    __table_args__ = (
+        # История пользователя: фильтр по user_id и keyset по created_at
+        Index('ix_weather_requests_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     city_name = Column(String(255), nullable=False)
     request_type = Column(String(50), nullable=False)  # current, forecast, location
     success = Column(Boolean, default=True)
@@ -53,6 +74,44 @@ class WeatherRequest(Base):
         return f"<WeatherRequest {self.city_name} by {self.user_id}>"
 
 
+class RequestStatsHourly(Base):
+    """Почасовые агрегаты запросов погоды (час × город × успех)"""
+    __tablename__ = 'request_stats_hourly'
+    
+    hour = Column(DateTime, primary_key=True)
+    city_name = Column(String(255), primary_key=True)
+    success = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<RequestStatsHourly {self.hour} {self.city_name}: {self.count}>"
+
+
+class ActiveUserDaily(Base):
+    """Активные пользователи по дням"""
+    __tablename__ = 'active_users_daily'
+    
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    
+    def __repr__(self):
+        return f"<ActiveUserDaily {self.day} user {self.user_id}>"
+
+
+class WeatherSnapshot(Base):
+    """Последние успешные данные о погоде (last-known-good) на случай недоступности API"""
+    __tablename__ = 'weather_snapshots'
+    
+    # Ключ кеша запроса (weather:москва, forecast:москва, weather_coords:55.75:37.62):
+    # при сбое известен только запрос, поэтому поиск - одно чтение по первичному ключу
+    key = Column(String(255), primary_key=True)
+    data = Column(Text, nullable=False)  # JSON
+    observed_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<WeatherSnapshot {self.key} at {self.observed_at}>"
+
+
 class UserSettings(Base):
     """Настройки пользователя"""
     __tablename__ = 'user_settings'
@@ -63,6 +122,9 @@ class UserSettings(Base):
     wind_unit = Column(String(10), default='ms')  # ms, kmh, mph
     notifications_enabled = Column(Boolean, default=False)
     default_city = Column(String(255), nullable=True)
+    # Локальное время уведомления HH:MM и часовой пояс (NULL - значения из настроек)
+    notification_time = Column(String(5), nullable=True)
+    timezone = Column(String(64), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -71,14 +133,179 @@ class UserSettings(Base):
 
 
 # Database connection
-def init_db(database_url: str = "sqlite:///weather_bot.db"):
-    """Инициализация базы данных"""
-    engine = create_engine(database_url, echo=False)
-    Base.metadata.create_all(engine)
+def create_db_engine(database_url: str, read_only: bool = False):
+    """Создать engine с учетом профиля SQLite"""
+    if not database_url.startswith('sqlite'):
+        return create_engine(database_url, echo=False, pool_size=settings.DB_POOL_SIZE)
+    
+    production = settings.SQLITE_PROFILE == 'production'
+    engine = create_engine(
+        database_url,
+        echo=False,
+        connect_args={'check_same_thread': False, 'timeout': settings.DB_TIMEOUT},
+        # Писатель один (поток DBWriter), читателям - пул
+        pool_size=settings.DB_POOL_SIZE if read_only else 1,
+        max_overflow=settings.DB_POOL_SIZE if read_only else 0
+    )
+    
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """PRAGMA для каждого нового соединения SQLite"""
+        cursor = dbapi_connection.cursor()
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        else:
+            # Действует для новой БД; существующую переводит migrate_db (VACUUM)
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if production:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE * 1024 * 1024}")
+            cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE * 1024}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA busy_timeout={settings.DB_TIMEOUT * 1000}")
+        cursor.close()
+    
+    return engine
+
+
+def init_db(database_url: str = settings.DATABASE_URL):
+    """Инициализация базы данных (engine для записи)"""
+    engine = create_db_engine(database_url)
     SessionLocal = sessionmaker(bind=engine)
+    migrate_db(engine, SessionLocal)
     return SessionLocal
 
 
+def migrate_db(engine, SessionLocal):
+    """Создание и миграция схемы: один раз на версию моделей
+
+    Для SQLite отпечаток схемы хранится в PRAGMA user_version: при
+    актуальной схеме запуск (и каждый воркер supervisor.py) обходится
+    одним PRAGMA вместо create_all и проверки колонок и индексов.
+    """
+    version = schema_version()
+    if _stored_schema_version(engine) == version:
+        return
+    
+    Base.metadata.create_all(engine)
+    _ensure_columns(engine)
+    _ensure_indexes(engine)
+    _ensure_incremental_vacuum(engine)
+    _backfill_rollups(SessionLocal)
+    
+    if engine.dialect.name == 'sqlite':
+        with engine.begin() as connection:
+            connection.execute(text(f"PRAGMA user_version={version}"))
+    logger.info("📦 Схема базы данных обновлена")
+
+
+def schema_version() -> int:
+    """Отпечаток схемы моделей: таблицы, колонки, индексы"""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{column.name}:{column.type}:{column.nullable}" for column in table.columns)
+        parts.extend(sorted(index.name for index in table.indexes))
+    # Режим файла SQLite - тоже часть схемы: смена режима запускает миграцию
+    parts.append(f"auto_vacuum:{AUTO_VACUUM_INCREMENTAL}")
+    parts.append(f"migrations:{MIGRATION_REVISION}")
+    # user_version - знаковое 32-битное целое
+    return zlib.crc32('\n'.join(parts).encode()) & 0x7fffffff
+
+
+def _stored_schema_version(engine):
+    if engine.dialect.name != 'sqlite':
+        return None
+    with engine.connect() as connection:
+        return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def init_read_db(database_url: str = settings.DATABASE_URL):
+    """Фабрика сессий только для чтения (отдельный пул SQLite)"""
+    engine = create_db_engine(database_url, read_only=True)
+    return sessionmaker(bind=engine)
+
+
+def _ensure_columns(engine):
+    """Добавить nullable-колонки, появившиеся в моделях после создания таблиц"""
+    existing = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column['name'] for column in existing.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns or not column.nullable:
+                continue
+            column_type = column.type.compile(engine.dialect)
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info(f"📦 Добавлена колонка {table.name}.{column.name}")
+            except Exception as e:
+                logger.error(f"❌ Не удалось добавить колонку {table.name}.{column.name}: {e}")
+
+
+def _ensure_indexes(engine):
+    """Создать индексы, добавленные в модели после создания таблиц
+
+    Перед уникальным индексом удаляются дубликаты; если индекс все равно
+    не создан, запуск прерывается - иначе защита от дублей молча не работает.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                if index.unique:
+                    _deduplicate(engine, table, index)
+                index.create(engine, checkfirst=True)
+            except Exception as e:
+                if index.unique:
+                    raise RuntimeError(f"Не удалось создать уникальный индекс {index.name}: {e}") from e
+                logger.error(f"❌ Не удалось создать индекс {index.name}: {e}")
+
+
+def _deduplicate(engine, table, index):
+    """Оставить по одной (самой ранней) строке на значение уникального индекса"""
+    key = table.primary_key.columns.values()[0].name
+    columns = ', '.join(column.name for column in index.columns)
+    with engine.begin() as connection:
+        deleted = connection.execute(text(
+            f"DELETE FROM {table.name} WHERE {key} NOT IN "
+            f"(SELECT MIN({key}) FROM {table.name} GROUP BY {columns})"
+        )).rowcount
+    if deleted:
+        logger.warning(f"⚠️ {table.name}: удалено дубликатов перед индексом {index.name}: {deleted}")
+
+
+def _ensure_incremental_vacuum(engine):
+    """Перевести существующую БД SQLite в auto_vacuum=INCREMENTAL (однократный VACUUM)
+
+    PRAGMA при подключении действует только для новой БД; без этого
+    архивация не может вернуть освобожденные страницы.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if connection.execute(text("PRAGMA auto_vacuum")).scalar() == AUTO_VACUUM_INCREMENTAL:
+            return
+        logger.info("📦 Перевод БД в auto_vacuum=INCREMENTAL (VACUUM, однократно)")
+        connection.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+        connection.execute(text("VACUUM"))
+
+
+def _backfill_rollups(SessionLocal):
+    """Заполнить агрегаты статистики из истории при первом запуске"""
+    from .crud import StatsRollupCRUD
+    
+    session = SessionLocal()
+    try:
+        if StatsRollupCRUD.needs_rebuild(session):
+            logger.info("📊 Построение агрегатов статистики из истории запросов...")
+            StatsRollupCRUD.rebuild(session)
+    except Exception as e:
+        logger.error(f"❌ Не удалось построить агрегаты статистики: {e}")
+    finally:
+        session.close()
+
+
 # Пример использования
 if __name__ == "__main__":
     SessionLocal = init_db()
@@ -0,0 +1,57 @@
+import logging
+from aiogram import Router
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from config import settings
+from services.broadcast import Broadcaster
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+
+@router.message(Command("broadcast"))
+async def broadcast(message: Message, command: CommandObject, broadcaster: Broadcaster):
+    """Рассылка всем пользователям: /broadcast <текст> | status | cancel (только для админов)"""
+    if not settings.is_admin(message.from_user.id):
+        await message.answer("⛔ Недостаточно прав")
+        return
+
+    args = (command.args or '').strip()
+
+    if args == 'status':
+        state = await broadcaster.status()
+        if not state:
+            await message.answer("📣 Рассылок еще не было")
+        else:
+            await message.answer(Broadcaster.format_progress(state))
+        return
+
+    if args == 'cancel':
+        if await broadcaster.cancel():
+            await message.answer("🛑 Рассылка отменяется")
+        else:
+            await message.answer("📣 Активной рассылки нет")
+        return
+
+    if not args:
+        await message.answer(
+            "📣 <b>Рассылка</b>\n\n"
+            "<code>/broadcast текст</code> — отправить всем активным пользователям\n"
+            "<code>/broadcast status</code> — прогресс\n"
+            "<code>/broadcast cancel</code> — отменить"
+        )
+        return
+
+    # Текст с форматированием (HTML) без самой команды
+    text = message.html_text.split(maxsplit=1)[1]
+
+    # Предпросмотр администратору заодно проверяет разметку
+    try:
+        await message.answer(text)
+    except TelegramBadRequest as e:
+        await message.answer(f"❌ Сообщение не отправляется: {e.message}")
+        return
+
+    if not await broadcaster.start(message.chat.id, text):
+        await message.answer("⚠️ Уже идет другая рассылка: <code>/broadcast status</code>")
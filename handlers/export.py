@@ -0,0 +1,45 @@
+import logging
+from aiogram import Router
+from aiogram.enums import ChatAction
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from config import settings
+from database.engine import Database
+from database.crud import UserCRUD, WeatherRequestCRUD
+from services.export import EXPORT_FORMATS, HistoryExport
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+
+@router.message(Command("export"))
+async def export_history(message: Message, command: CommandObject, db: Database, db_user_id: int):
+    """Выгрузить полную историю запросов: /export [csv|jsonl] [telegram_id]"""
+    fmt = 'csv'
+    user_id = db_user_id
+    
+    for arg in (command.args or '').split():
+        if arg.lower() in EXPORT_FORMATS:
+            fmt = arg.lower()
+        elif arg.isdigit() and settings.is_admin(message.from_user.id):
+            # Поддержка: выгрузка истории другого пользователя по telegram_id
+            user_id = await db.read(UserCRUD.get_id, int(arg))
+            if user_id is None:
+                await message.answer("❌ Пользователь не найден")
+                return
+        else:
+            await message.answer(
+                "📤 <b>Выгрузка истории</b>\n\n"
+                "Использование: <code>/export</code> или <code>/export jsonl</code>"
+            )
+            return
+    
+    if not await db.read(WeatherRequestCRUD.get_user_history, user_id, limit=1):
+        await message.answer("📋 <b>История запросов пуста</b>")
+        return
+    
+    await message.bot.send_chat_action(message.chat.id, ChatAction.UPLOAD_DOCUMENT)
+    await message.answer_document(
+        HistoryExport(db, user_id, fmt),
+        caption="📤 Полная история запросов"
+    )
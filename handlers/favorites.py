@@ -1,61 +1,51 @@
+import html
 import logging
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
-from database.models import init_db
-from database.crud import FavoriteCityCRUD, UserCRUD
+from config import settings
+from database.engine import Database
+from database.crud import FavoriteCityCRUD, UserCRUD, WeatherRequestCRUD
+from services.favorites_cache import FavoritesCache
+from middlewares.logging import StatisticsMiddleware
+from middlewares.scheduler import FairScheduler
 from keyboards.inline import get_favorites_keyboard, get_city_actions_keyboard
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-# Инициализация БД
-SessionLocal = init_db()
-
 
 @router.message(Command("favorites"))
 @router.message(F.text == "⭐ Избранное")
-async def show_favorites(message: Message):
+async def show_favorites(message: Message, db: Database, db_user_id: int):
     """Показать избранные города"""
-    session = SessionLocal()
-    try:
-        user = UserCRUD.get_or_create(
-            session,
-            message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name
-        )
-        
-        favorites = FavoriteCityCRUD.get_all(session, user.id)
-        
-        if not favorites:
-            await message.answer(
-                "⭐ <b>Избранные города</b>\n\n"
-                "У вас пока нет избранных городов.\n\n"
-                "Чтобы добавить город в избранное, нажмите кнопку ⭐ "
-                "при просмотре погоды в этом городе."
-            )
-            return
-        
-        text = "⭐ <b>Ваши избранные города:</b>\n\n"
-        
-        for favorite in favorites:
-            city_display = favorite.city_name
-            if favorite.country_code:
-                city_display += f", {favorite.country_code}"
-            text += f"📍 {city_display}\n"
-        
+    favorites = await db.read(FavoriteCityCRUD.get_all, db_user_id)
+    
+    if not favorites:
         await message.answer(
-            text,
-            reply_markup=get_favorites_keyboard(favorites)
+            "⭐ <b>Избранные города</b>\n\n"
+            "У вас пока нет избранных городов.\n\n"
+            "Чтобы добавить город в избранное, нажмите кнопку ⭐ "
+            "при просмотре погоды в этом городе."
         )
+        return
+    
+    text = "⭐ <b>Ваши избранные города:</b>\n\n"
     
-    finally:
-        session.close()
+    for favorite in favorites:
+        city_display = favorite.city_name
+        if favorite.country_code:
+            city_display += f", {favorite.country_code}"
+        text += f"📍 {city_display}\n"
+    
+    await message.answer(
+        text,
+        reply_markup=get_favorites_keyboard(favorites)
+    )
 
 
 @router.callback_query(F.data.startswith("fav_weather:"))
-async def show_favorite_weather(callback: CallbackQuery, cache):
+async def show_favorite_weather(callback: CallbackQuery, cache, request_log, db_user_id: int):
     """Показать погоду для избранного города"""
     city = callback.data.split(":", 1)[1]
     
@@ -65,15 +55,12 @@ async def show_favorite_weather(callback: CallbackQuery, cache):
     from services.weather_api import WeatherAPI, CityNotFoundError
     from services.formatter import WeatherFormatter
     
-    session = SessionLocal()
     try:
         api = WeatherAPI(cache)
         weather = await api.get_current_weather(city)
         
         # Логируем запрос
-        from database.crud import WeatherRequestCRUD, UserCRUD
-        user = UserCRUD.get_or_create(session, callback.from_user.id)
-        WeatherRequestCRUD.create(session, user.id, city, 'current', success=True)
+        await request_log.log(db_user_id, city, 'current', success=True)
         
         text = WeatherFormatter.format_current_weather(weather)
         
@@ -88,104 +75,116 @@ async def show_favorite_weather(callback: CallbackQuery, cache):
     except Exception as e:
         logger.error(f"Ошибка получения погоды для избранного: {e}")
         await callback.answer("❌ Ошибка загрузки", show_alert=True)
-    
-    finally:
-        session.close()
+
+
+async def answer_favorites_limit(callback: CallbackQuery):
+    """Сообщить о достигнутом лимите избранного"""
+    await callback.answer(
+        f"❌ Достигнут лимит избранных городов ({settings.MAX_FAVORITE_CITIES}).\n"
+        "Удалите ненужные города перед добавлением новых.",
+        show_alert=True
+    )
 
 
 @router.callback_query(F.data.startswith("add_favorite:"))
-async def add_to_favorites(callback: CallbackQuery):
+async def add_to_favorites(callback: CallbackQuery, db_user_id: int, favorites_cache: FavoritesCache):
     """Добавить город в избранное"""
     city = callback.data.split(":", 1)[1]
     
-    session = SessionLocal()
-    try:
-        user = UserCRUD.get_or_create(session, callback.from_user.id)
-        
-        # Проверяем лимит (максимум 10 городов)
-        favorites = FavoriteCityCRUD.get_all(session, user.id)
-        
-        if len(favorites) >= 10:
-            await callback.answer(
-                "❌ Достигнут лимит избранных городов (10).\n"
-                "Удалите ненужные города перед добавлением новых.",
-                show_alert=True
-            )
-            return
-        
-        # Добавляем город
-        FavoriteCityCRUD.add(session, user.id, city)
-        
-        await callback.answer(f"⭐ Город {city} добавлен в избранное!", show_alert=False)
-        
-        # Обновляем клавиатуру
-        await callback.message.edit_reply_markup(
-
-reply_markup=get_city_actions_keyboard(city, is_favorite=True)
-        )
+    # Быстрая проверка лимита по кешу; окончательная - при записи в БД
+    favorites = await favorites_cache.get(db_user_id)
+    
+    if city not in favorites and len(favorites) >= settings.MAX_FAVORITE_CITIES:
+        await answer_favorites_limit(callback)
+        return
+    
+    # Добавляем город
+    if not await favorites_cache.add(db_user_id, city):
+        await answer_favorites_limit(callback)
+        return
     
-    finally:
-        session.close()
+    await callback.answer(f"⭐ Город {city} добавлен в избранное!", show_alert=False)
+    
+    # Обновляем клавиатуру
+    await callback.message.edit_reply_markup(
+        reply_markup=get_city_actions_keyboard(city, is_favorite=True)
+    )
 
 
 @router.callback_query(F.data.startswith("remove_favorite:"))
-async def remove_from_favorites(callback: CallbackQuery):
+async def remove_from_favorites(callback: CallbackQuery, db_user_id: int, favorites_cache: FavoritesCache):
     """Удалить город из избранного"""
     city = callback.data.split(":", 1)[1]
     
-    session = SessionLocal()
-    try:
-        user = UserCRUD.get_or_create(session, callback.from_user.id)
-        
-        success = FavoriteCityCRUD.remove(session, user.id, city)
+    success = await favorites_cache.remove(db_user_id, city)
+    
+    if success:
+        await callback.answer(f"🗑 Город {city} удален из избранного", show_alert=False)
         
-        if success:
-            await callback.answer(f"🗑 Город {city} удален из избранного", show_alert=False)
-            
-            # Обновляем клавиатуру
-            await callback.message.edit_reply_markup(
-                reply_markup=get_city_actions_keyboard(city, is_favorite=False)
-            )
-        else:
-            await callback.answer("❌ Город не найден в избранном", show_alert=True)
-    
-    finally:
-        session.close()
+        # Обновляем клавиатуру
+        await callback.message.edit_reply_markup(
+            reply_markup=get_city_actions_keyboard(city, is_favorite=False)
+        )
+    else:
+        await callback.answer("❌ Город не найден в избранном", show_alert=True)
 
 
 @router.message(Command("stats"))
-async def show_stats(message: Message):
+async def show_stats(message: Message, db: Database, stats: StatisticsMiddleware,
+                     scheduler: FairScheduler):
     """Показать статистику пользователя (только для админов)"""
     # Проверяем, является ли пользователь админом
-    # В реальном приложении здесь будет проверка ID
-    admin_ids = [123456789]  # Замените на реальные ID админов
-    
-    if message.from_user.id not in admin_ids:
+    if not settings.is_admin(message.from_user.id):
         await message.answer("⛔ Недостаточно прав")
         return
     
-    session = SessionLocal()
-    try:
-        from database.crud import WeatherRequestCRUD, UserCRUD
-        
-        stats = WeatherRequestCRUD.get_stats(session, days=7)
-        active_users = UserCRUD.get_active_users_count(session, days=7)
-        popular_cities = WeatherRequestCRUD.get_popular_cities(session, days=7, limit=5)
-        
-        text = (
-            "📊 <b>Статистика за последние 7 дней:</b>\n\n"
-            f"👥 Активных пользователей: {active_users}\n"
-            f"📝 Всего запросов: {stats['total']}\n"
-            f"✅ Успешных: {stats['successful']}\n"
-            f"❌ Ошибок: {stats['failed']}\n"
-            f"📈 Success rate: {stats['success_rate']:.1f}%\n\n"
-            "<b>🏆 Популярные города:</b>\n"
+    # Все запросы читают только агрегаты, а не историю
+    totals = await db.read(WeatherRequestCRUD.get_stats, days=7)
+    active_users = await db.read(UserCRUD.get_active_users_count, days=7)
+    popular_cities = await db.read(WeatherRequestCRUD.get_popular_cities, days=7, limit=5)
+    
+    text = (
+        "📊 <b>Статистика за последние 7 дней:</b>\n\n"
+        f"👥 Активных пользователей: {active_users}\n"
+        f"📝 Всего запросов: {totals['total']}\n"
+        f"✅ Успешных: {totals['successful']}\n"
+        f"❌ Ошибок: {totals['failed']}\n"
+        f"📈 Success rate: {totals['success_rate']:.1f}%\n\n"
+        "<b>🏆 Популярные города:</b>\n"
+    )
+    
+    for i, (city, count) in enumerate(popular_cities, 1):
+        text += f"{i}. {html.escape(city)} — {count} запросов\n"
+    
+    # Оценки по скетчам: фиксированная память, погрешность известна
+    live = await stats.get_stats()
+    text += (
+        "\n<b>⚡ Оценки (HyperLogLog / Count-Min):</b>\n"
+        f"👤 Уникальных пользователей: ~{live['unique_users']} "
+        f"(±{live['unique_users_error'] * 100:.1f}%)\n"
+    )
+    if live['commands']:
+        # Имена команд - из ввода пользователей (и старых данных в Redis)
+        text += "⌨️ Команды: " + ", ".join(
+            f"{html.escape(cmd)} ~{count}" for cmd, count in live['commands']
+        ) + "\n"
+    
+    # Живые окна по минутным корзинам всех экземпляров
+    text += "\n<b>⏱ Нагрузка (все экземпляры):</b>\n"
+    for window, item in (await stats.get_live_stats()).items():
+        text += (
+            f"{window} мин: {item['rps']:.2f} RPS, ошибок {item['error_rate']:.1f}%"
         )
-        
-        for i, (city, count) in enumerate(popular_cities, 1):
-            text += f"{i}. {city} — {count} запросов\n"
-        
-        await message.answer(text)
+        if item['commands']:
+            text += " — " + ", ".join(f"{html.escape(cmd)} {count}" for cmd, count in item['commands'])
+        text += "\n"
+    
+    queue = scheduler.metrics()
+    text += (
+        "\n<b>⚙️ Очередь обработки:</b>\n"
+        f"Выполняется: {queue['running']}/{queue['workers']}, "
+        f"ожидает: {queue['waiting']} (чатов: {queue['chats_waiting']}, "
+        f"макс. очередь: {queue['max_depth']}), отброшено: {queue['dropped']}\n"
+    )
     
-    finally:
-        session.close()
\ No newline at end of file
+    await message.answer(text)
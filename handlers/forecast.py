@@ -3,6 +3,7 @@ from datetime import datetime
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from services.weather_api import WeatherAPI, CityNotFoundError, APITimeoutError
+from services.formatter import WeatherFormatter
 from keyboards.main import get_forecast_keyboard
 
 router = Router()
@@ -73,6 +74,9 @@ async def callback_forecast(callback: CallbackQuery, cache):
                 f"   🌪 Ветер: {day_forecast['wind_speed']} м/с\n\n"
             )
         
+        if forecast[0].get('stale_at'):
+            text += WeatherFormatter.format_stale(forecast[0]['stale_at'])
+        
         await callback.message.edit_text(
             text,
             reply_markup=get_forecast_keyboard(city)
@@ -0,0 +1,26 @@
+import logging
+from aiogram import Router
+from aiogram.types import InlineQuery
+from config import settings
+from services.inline_weather import InlineWeather
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+
+@router.inline_query()
+async def inline_weather(query: InlineQuery, inline: InlineWeather):
+    """Погода в любом чате: @bot <город>"""
+    resolved = await inline.resolve(query.from_user.id, query.query)
+    if resolved is None:
+        # Пользователь уже набрал следующий запрос
+        return
+    
+    articles, complete = resolved
+    # Ответ не зависит от пользователя: Telegram кеширует его для всех.
+    # Неполный (ошибка API) - ненадолго, чтобы не закрепить пустой результат
+    await query.answer(
+        articles,
+        cache_time=settings.INLINE_CACHE_TIME if complete else 10,
+        is_personal=False
+    )
@@ -0,0 +1,100 @@
+import html
+import logging
+import re
+from typing import TYPE_CHECKING, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from config import settings
+from database.engine import Database
+from database.crud import UserSettingsCRUD
+from utils.validators import CityValidator
+
+if TYPE_CHECKING:
+    # Сервис уведомлений загружается в bot.py, только если они включены
+    from services.notifications import NotificationScheduler
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+TIME_RE = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+
+
+def _valid_timezone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+@router.message(Command("notify"))
+async def notify(message: Message, command: CommandObject, db: Database, db_user_id: int,
+                 notifier: Optional['NotificationScheduler']):
+    """Ежедневное уведомление: /notify HH:MM [город] | off | tz <часовой пояс>"""
+    if not settings.ENABLE_NOTIFICATIONS:
+        await message.answer("🔕 Уведомления сейчас отключены")
+        return
+
+    args = (command.args or '').split(maxsplit=1)
+
+    if not args:
+        user_settings = await db.read(UserSettingsCRUD.get, db_user_id)
+        if user_settings and user_settings.notifications_enabled and user_settings.default_city:
+            timezone = user_settings.timezone or settings.NOTIFICATION_TIMEZONE
+            status = (
+                f"🔔 Включены: {user_settings.notification_time or settings.NOTIFICATION_TIME} "
+                f"({html.escape(timezone)}), {html.escape(user_settings.default_city)}"
+            )
+        else:
+            status = "🔕 Выключены"
+        await message.answer(
+            f"🔔 <b>Уведомления о погоде</b>\n\n{status}\n\n"
+            "<code>/notify 08:00 Москва</code> — каждый день в 08:00\n"
+            "<code>/notify tz Asia/Yekaterinburg</code> — часовой пояс\n"
+            "<code>/notify off</code> — выключить"
+        )
+        return
+
+    if args[0] == 'off':
+        await db.write(UserSettingsCRUD.upsert, db_user_id, notifications_enabled=False)
+        await message.answer("🔕 Уведомления выключены")
+        return
+
+    if args[0] == 'tz':
+        timezone = args[1].strip() if len(args) > 1 else ''
+        if not _valid_timezone(timezone):
+            await message.answer("❌ Неизвестный часовой пояс, пример: <code>Europe/Moscow</code>")
+            return
+        user_settings = await db.write(UserSettingsCRUD.upsert, db_user_id, timezone=timezone)
+        if user_settings.notifications_enabled:
+            notifier.add_slot(timezone, user_settings.notification_time or settings.NOTIFICATION_TIME)
+        await message.answer(f"🕐 Часовой пояс: {html.escape(timezone)}")
+        return
+
+    if not TIME_RE.match(args[0]):
+        await message.answer("❌ Укажите время в формате ЧЧ:ММ, например <code>/notify 08:00 Москва</code>")
+        return
+
+    changes = {'notifications_enabled': True, 'notification_time': args[0]}
+    if len(args) > 1:
+        city = CityValidator.sanitize(args[1])
+        if not city:
+            await message.answer(
+                f"❌ <b>Ошибка в названии города</b>\n\n"
+                f"{html.escape(CityValidator.get_error_message(args[1]))}"
+            )
+            return
+        changes['default_city'] = city
+    user_settings = await db.write(UserSettingsCRUD.upsert, db_user_id, **changes)
+    if not user_settings.default_city:
+        await message.answer("🏙 Укажите город: <code>/notify 08:00 Москва</code>")
+        return
+
+    timezone = user_settings.timezone or settings.NOTIFICATION_TIMEZONE
+    notifier.add_slot(timezone, args[0])
+    await message.answer(
+        f"🔔 Каждый день в {args[0]} ({html.escape(timezone)}) — "
+        f"погода в городе {html.escape(user_settings.default_city)}"
+    )
@@ -1,57 +1,48 @@
 import logging
+from datetime import datetime
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 
+from config import settings
 from services.weather_api import WeatherAPI, CityNotFoundError, APITimeoutError
 from services.formatter import WeatherFormatter
-from keyboards.inline import get_city_actions_keyboard
+from services.request_log import RequestLogQueue
+from services.favorites_cache import FavoritesCache
+from services.history_ring import HistoryRing
+from services.status_reply import StatusReply
+from keyboards.inline import get_city_actions_keyboard, get_history_keyboard
 from keyboards.main import get_main_keyboard
 from utils.validators import CityValidator
-from database.models import init_db
-from database.crud import UserCRUD, WeatherRequestCRUD, FavoriteCityCRUD
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-# Инициализация БД
-SessionLocal = init_db()
+# Курсор страницы истории в callback_data (лимит Telegram - 64 байта):
+# время последней записи в этом формате и ее id через "_"
+HISTORY_CURSOR_FORMAT = "%Y%m%d%H%M%S%f"
 
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
     """Команда /start"""
-    session = SessionLocal()
-    try:
-        # Создаем или обновляем пользователя
-        UserCRUD.get_or_create(
-            session,
-            message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name,
-            language_code=message.from_user.language_code
-        )
-        
-        await message.answer(
-            "👋 <b>Добро пожаловать в WeatherPro Bot v2!</b>\n\n"
-            "Я помогу узнать погоду в любом городе мира.\n\n"
-            "<b>🌟 Новые возможности:</b>\n"
-            "⭐ Избранные города - быстрый доступ\n"
-            "📊 Детальная информация с рекомендациями\n"
-            "💾 История запросов\n"
-            "🎨 Красивое оформление с emoji\n\n"
-            "<b>Что я умею:</b>\n"
-            "🌤 Показать текущую погоду\n"
-            "📅 Прогноз на 5 дней\n"
-            "📍 Погоду по вашей геолокации\n"
-            "⭐ Сохранить избранные города\n\n"
-            "Просто отправьте название города или выберите действие ниже 👇",
-            reply_markup=get_main_keyboard()
-        )
-    
-    finally:
-        session.close()
+    # Пользователь уже создан/обновлен в UserActivityMiddleware
+    await message.answer(
+        "👋 <b>Добро пожаловать в WeatherPro Bot v2!</b>\n\n"
+        "Я помогу узнать погоду в любом городе мира.\n\n"
+        "<b>🌟 Новые возможности:</b>\n"
+        "⭐ Избранные города - быстрый доступ\n"
+        "📊 Детальная информация с рекомендациями\n"
+        "💾 История запросов\n"
+        "🎨 Красивое оформление с emoji\n\n"
+        "<b>Что я умею:</b>\n"
+        "🌤 Показать текущую погоду\n"
+        "📅 Прогноз на 5 дней\n"
+        "📍 Погоду по вашей геолокации\n"
+        "⭐ Сохранить избранные города\n\n"
+        "Просто отправьте название города или выберите действие ниже 👇",
+        reply_markup=get_main_keyboard()
+    )
 
 
 @router.message(F.text == "🌤 Погода сейчас")
@@ -81,7 +72,7 @@ async def cmd_help(message: Message):
         "<b>📍 Геолокация:</b>\n"
         "Используйте кнопку 'Отправить геолокацию' для определения погоды в вашем местоположении.\n\n"
         "<b>⭐ Избранные города:</b>\n"
-        "Добавьте до 10 любимых городов для быстрого доступа к их погоде.\n\n"
+        f"Добавьте до {settings.MAX_FAVORITE_CITIES} любимых городов для быстрого доступа к их погоде.\n\n"
         "<b>💡 Дополнительные возможности:</b>\n"
         "• Умные рекомендации по погоде\n"
         "• Кеширование для быстрых ответов\n"
@@ -90,13 +81,16 @@ async def cmd_help(message: Message):
         "<b>🎯 Команды:</b>\n"
         "/start - Начало работы\n"
         "/help - Эта справка\n"
-        "/favorites - Избранные города\n\n"
+        "/favorites - Избранные города\n"
+        "/history - История запросов\n"
+        "/export - Выгрузка всей истории (CSV или JSONL)\n\n"
         "💾 <i>Данные кешируются на 1 час для экономии API-запросов</i>"
     )
 
 
 @router.message(F.text & ~F.text.startswith('/'))
-async def get_weather_by_city(message: Message, cache):
+async def get_weather_by_city(message: Message, cache, request_log: RequestLogQueue,
+                              favorites_cache: FavoritesCache, db_user_id: int):
     """Получить погоду по названию города"""
     city = message.text.strip()
     
@@ -117,50 +111,37 @@ async def get_weather_by_city(message: Message, cache):
         )
         return
     
-    session = SessionLocal()
-    status_msg = await message.answer("🔍 Ищу информацию о погоде...")
+    reply = StatusReply(message, "🔍 Ищу информацию о погоде...")
     
     try:
-        # Получаем или создаем пользователя
-        user = UserCRUD.get_or_create(
-            session,
-            message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name
-        )
-        
-        # Получаем погоду
         api = WeatherAPI(cache)
-        weather = await api.get_current_weather(sanitized_city)
         
-        # Логируем запрос
-        WeatherRequestCRUD.create(
-            session,
-            user.id,
-            weather['city'],
-            'current',
-            success=True
-        )
+        # Данные в кеше (большинство запросов) - сразу ответ одним сообщением
+        weather = await api.get_cached_weather(sanitized_city)
+        if not weather:
+            # Промах: "печатает...", статус - только если API отвечает дольше порога
+            reply.start()
+            weather = await api.fetch_current_weather(sanitized_city)
+        
+        # Логируем запрос (запись в БД выполняется в фоне пачками)
+        await request_log.log(db_user_id, weather['city'], 'current', success=True)
         
         # Проверяем, в избранном ли город
-        is_favorite = FavoriteCityCRUD.is_favorite(session, user.id, weather['city'])
+        is_favorite = await favorites_cache.contains(db_user_id, weather['city'])
         
         # Форматируем ответ
         text = WeatherFormatter.format_current_weather(weather)
         
-        # Удаляем статусное сообщение
-        await status_msg.delete()
-        
-        # Отправляем результат
-        await message.answer(
+        # Отправляем результат (или заменяем им статусное сообщение)
+        await reply.answer(
             text,
             reply_markup=get_city_actions_keyboard(weather['city'], is_favorite)
         )
         
-        logger.info(f"✅ Погода отправлена: {weather['city']} для пользователя {user.id}")
+        logger.info(f"✅ Погода отправлена: {weather['city']} для пользователя {db_user_id}")
         
     except CityNotFoundError:
-        await status_msg.edit_text(
+        await reply.answer(
             "❌ <b>Город не найден</b>\n\n"
             "Проверьте правильность написания или попробуйте:\n"
             "• Указать страну: <code>Springfield, US</code>\n"
@@ -170,12 +151,10 @@ async def get_weather_by_city(message: Message, cache):
         )
         
         # Логируем неудачный запрос
-        if session:
-            user = UserCRUD.get_or_create(session, message.from_user.id)
-            WeatherRequestCRUD.create(session, user.id, sanitized_city, 'current', success=False)
+        await request_log.log(db_user_id, sanitized_city, 'current', success=False)
     
     except APITimeoutError:
-        await status_msg.edit_text(
+        await reply.answer(
             "⏱ <b>Превышено время ожидания</b>\n\n"
             "Сервис погоды временно недоступен.\n"
             "Попробуйте через несколько минут.\n\n"
@@ -184,24 +163,24 @@ async def get_weather_by_city(message: Message, cache):
     
     except Exception as e:
         logger.error(f"Ошибка получения погоды: {e}", exc_info=True)
-        await status_msg.edit_text(
+        await reply.answer(
             "😔 <b>Произошла непредвиденная ошибка</b>\n\n"
             "Попробуйте еще раз через несколько секунд.\n"
             "Если ошибка повторяется, обратитесь к администратору."
         )
     
     finally:
-        session.close()
+        await reply.close()
 
 
 @router.callback_query(F.data.startswith("current:"))
-async def callback_current_weather(callback: CallbackQuery, cache):
+async def callback_current_weather(callback: CallbackQuery, cache, request_log: RequestLogQueue,
+                                   favorites_cache: FavoritesCache, db_user_id: int):
     """Обработка callback для обновления текущей погоды"""
     city = callback.data.split(":", 1)[1]
     
     await callback.answer("🔄 Обновляю данные...")
     
-    session = SessionLocal()
     try:
         api = WeatherAPI(cache)
         
@@ -212,11 +191,10 @@ async def callback_current_weather(callback: CallbackQuery, cache):
         weather = await api.get_current_weather(city)
         
         # Логируем запрос
-        user = UserCRUD.get_or_create(session, callback.from_user.id)
-        WeatherRequestCRUD.create(session, user.id, weather['city'], 'current', success=True)
+        await request_log.log(db_user_id, weather['city'], 'current', success=True)
         
         # Проверяем избранное
-        is_favorite = FavoriteCityCRUD.is_favorite(session, user.id, weather['city'])
+        is_favorite = await favorites_cache.contains(db_user_id, weather['city'])
         
         # Обновляем сообщение
         text = WeatherFormatter.format_current_weather(weather, from_cache=False)
@@ -226,7 +204,7 @@ async def callback_current_weather(callback: CallbackQuery, cache):
             reply_markup=get_city_actions_keyboard(weather['city'], is_favorite)
         )
         
-        logger.info(f"🔄 Погода обновлена: {weather['city']} для пользователя {user.id}")
+        logger.info(f"🔄 Погода обновлена: {weather['city']} для пользователя {db_user_id}")
         
     except CityNotFoundError:
         await callback.answer("❌ Город не найден", show_alert=True)
@@ -237,34 +215,71 @@ async def callback_current_weather(callback: CallbackQuery, cache):
     except Exception as e:
         logger.error(f"Ошибка обновления погоды: {e}", exc_info=True)
         await callback.answer("❌ Ошибка обновления", show_alert=True)
-    
-    finally:
-        session.close()
 
 
 @router.message(Command("history"))
-async def show_history(message: Message):
+async def show_history(message: Message, history_ring: HistoryRing, db_user_id: int):
     """Показать историю запросов пользователя"""
-    session = SessionLocal()
-    try:
-        user = UserCRUD.get_or_create(session, message.from_user.id)
-        history = WeatherRequestCRUD.get_user_history(session, user.id, limit=10)
-        
-        if not history:
-            await message.answer(
-                "📋 <b>История запросов пуста</b>\n\n"
-                "Начните использовать бота, чтобы увидеть историю!"
-            )
-            return
-        
-        text = "📋 <b>Ваши последние запросы:</b>\n\n"
-        
-        for i, request in enumerate(history, 1):
-            status = "✅" if request.success else "❌"
-            date = request.created_at.strftime("%d.%m %H:%M")
-            text += f"{i}. {status} {request.city_name} - {date}\n"
-        
-        await message.answer(text)
+    # Первая страница - из кольца в Redis, без SQL
+    history = await history_ring.recent(db_user_id)
     
-    finally:
-        session.close()
\ No newline at end of file
+    if not history:
+        await message.answer(
+            "📋 <b>История запросов пуста</b>\n\n"
+            "Начните использовать бота, чтобы увидеть историю!"
+        )
+        return
+    
+    text, keyboard = _render_history(history, first_page=True)
+    await message.answer(text, reply_markup=keyboard)
+
+
+@router.callback_query(F.data.startswith("history:"))
+async def callback_history_page(callback: CallbackQuery, history_ring: HistoryRing, db_user_id: int):
+    """Листание истории: keyset по времени и id последней показанной записи"""
+    cursor = callback.data.split(":", 1)[1]
+    
+    if cursor:
+        try:
+            stamp, _, row_id = cursor.partition("_")
+            before = datetime.strptime(stamp, HISTORY_CURSOR_FORMAT)
+            before_id = int(row_id) if row_id else None
+        except ValueError:
+            # Поддельные или устаревшие данные кнопки - показываем первую страницу
+            logger.warning(f"⚠️ Некорректный курсор истории: {cursor!r}")
+            cursor = ""
+    
+    if cursor:
+        history = await history_ring.older(db_user_id, before, before_id)
+    else:
+        history = await history_ring.recent(db_user_id)
+    
+    if not history:
+        await callback.answer("📋 Более старых запросов нет")
+        return
+    
+    text, keyboard = _render_history(history, first_page=not cursor)
+    await callback.message.edit_text(text, reply_markup=keyboard)
+    await callback.answer()
+
+
+def _render_history(history: list, first_page: bool):
+    """Текст страницы истории и кнопки навигации"""
+    title = "📋 <b>Ваши последние запросы:</b>" if first_page else "📋 <b>Более ранние запросы:</b>"
+    text = f"{title}\n\n"
+    
+    for i, request in enumerate(history, 1):
+        status = "✅" if request['success'] else "❌"
+        date = request['created_at'].strftime("%d.%m %H:%M")
+        text += f"{i}. {status} {request['city_name']} - {date}\n"
+    
+    # Полная страница - возможно, есть записи старше
+    older_cursor = None
+    if len(history) >= settings.HISTORY_PAGE_SIZE:
+        last = history[-1]
+        older_cursor = last['created_at'].strftime(HISTORY_CURSOR_FORMAT)
+        if last.get('id') is not None:
+            # Курсор "время_id": id различает записи с одинаковым временем
+            older_cursor += f"_{last['id']}"
+    
+    return text, get_history_keyboard(older_cursor, show_newest=not first_page)
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 
@@ -171,4 +171,30 @@ def get_confirmation_keyboard(action: str, data: str) -> InlineKeyboardMarkup:
         ]
     ]
     
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
\ No newline at end of file
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def get_history_keyboard(older_cursor: Optional[str], show_newest: bool = False) -> Optional[InlineKeyboardMarkup]:
+    """Клавиатура постраничной истории запросов"""
+    row = []
+    
+    if show_newest:
+        row.append(
+            InlineKeyboardButton(
+                text="🔝 Новые",
+                callback_data="history:"
+            )
+        )
+    
+    if older_cursor:
+        row.append(
+            InlineKeyboardButton(
+                text="⬅️ Старше",
+                callback_data=f"history:{older_cursor}"
+            )
+        )
+    
+    if not row:
+        return None
+    
+    return InlineKeyboardMarkup(inline_keyboard=[row])
@@ -1,11 +1,25 @@
+import asyncio
 import logging
+import re
 import time
-from typing import Callable, Dict, Any, Awaitable
+from collections import Counter
+from typing import Callable, Dict, Any, Awaitable, List, Optional, Set
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
+from config import settings
+from services.cache import RedisCache
+from services.metrics import HANDLER_ERRORS, HANDLER_LATENCY
+from services.tracing import NOOP_SPAN, Tracer
+from services.user_activity import UserActivityTracker
+from utils.log_config import SAMPLED
+from utils.sketches import HyperLogLog, TopK
 
 logger = logging.getLogger(__name__)
 
+# Имя команды Telegram; прочее (введено вручную) считается одной корзиной
+COMMAND_NAME = re.compile(r'[a-z0-9_]{1,32}')
+INVALID_COMMAND = '/invalid'
+
 
 # ===============================================
 # Middleware для логирования всех запросов
@@ -13,13 +27,17 @@ logger = logging.getLogger(__name__)
 class LoggingMiddleware(BaseMiddleware):
     """Middleware для логирования всех входящих сообщений и callback'ов"""
 
+    def __init__(self, tracer: Optional[Tracer] = None):
+        super().__init__()
+        self.tracer = tracer
+
     async def __call__(
         self,
         handler: Callable[..., Awaitable[Any]],
         event: Message | CallbackQuery,
         data: Dict[str, Any]
     ) -> Any:
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         user = getattr(event, "from_user", None)
         if isinstance(event, Message):
@@ -37,49 +55,92 @@ class LoggingMiddleware(BaseMiddleware):
         else:
             return await handler(event, data)
 
-        # Логируем входящее событие
-        logger.info(
-            f"📥 {event_type.upper()} | "
-            f"User: @{getattr(user, 'username', 'Unknown')} ({getattr(user, 'id', 'N/A')}) | "
-            f"Text: {str(event_text)[:50]}"
+        # Метки хендлера: модуль роутера и имя функции
+        handler_object = data.get('handler')
+        callback = getattr(handler_object, 'callback', None)
+        labels = (
+            getattr(callback, '__module__', 'unknown'),
+            getattr(callback, '__name__', 'unknown'),
+            event_type
         )
 
-        try:
-            result = await handler(event, data)
-            processing_time = time.time() - start_time
-            logger.info(
-                f"✅ {event_type.upper()} processed | "
-                f"User: {getattr(user, 'id', 'N/A')} | "
-                f"Time: {processing_time:.3f}s"
-            )
-            return result
-        except Exception as e:
-            processing_time = time.time() - start_time
-            logger.error(
-                f"❌ {event_type.upper()} error | "
-                f"User: {getattr(user, 'id', 'N/A')} | "
-                f"Time: {processing_time:.3f}s | "
-                f"Error: {str(e)}",
-                exc_info=True
+        # Корневой спан апдейта: в него вкладываются спаны Redis, БД, OpenWeather, Telegram
+        root_span = NOOP_SPAN
+        if self.tracer:
+            root_span = self.tracer.start_trace(
+                f"{event_type} {labels[1]}", router=labels[0], user_id=getattr(user, 'id', 0)
             )
-            raise
+
+        with root_span:
+            # Одна запись на апдейт, и та выборочно (SAMPLED); ошибки - всегда
+            try:
+                result = await handler(event, data)
+                elapsed = time.perf_counter() - start_time
+                HANDLER_LATENCY.labels(*labels).observe(elapsed)
+                logger.info(
+                    "✅ %s processed | User: %s | Text: %.50s | Time: %.3fs",
+                    event_type.upper(), getattr(user, 'id', 'N/A'), event_text,
+                    elapsed, extra=SAMPLED
+                )
+                return result
+            except Exception as e:
+                elapsed = time.perf_counter() - start_time
+                HANDLER_LATENCY.labels(*labels).observe(elapsed)
+                HANDLER_ERRORS.labels(*labels).inc()
+                logger.error(
+                    "❌ %s error | User: %s | Text: %.50s | Time: %.3fs | Error: %s",
+                    event_type.upper(), getattr(user, 'id', 'N/A'), event_text,
+                    elapsed, e, exc_info=True
+                )
+                raise
 
 
 # ===============================================
 # Middleware для сбора статистики
 # ===============================================
 class StatisticsMiddleware(BaseMiddleware):
-    """Middleware для подсчёта статистики бота"""
+    """Middleware для подсчёта статистики бота
+
+    Уникальные пользователи считаются HyperLogLog, команды и города -
+    Count-Min sketch с top-k, поэтому память не растет с числом
+    пользователей и произвольных команд. При доступном Redis оценки
+    периодически сливаются в общие ключи (PFADD / ZINCRBY) всех экземпляров.
+
+    Живая статистика (RPS, ошибки, команды) считается по минутным
+    корзинам: локальные счетчики раз в sync_interval добавляются
+    в Redis-хеши stats:m:{минута} (HINCRBY), окна 1/5/15/60 минут
+    собираются суммой корзин всех экземпляров.
+    """
 
-    def __init__(self):
+    PENDING_LIMIT = 10000
+    BUCKET_TTL = 2 * 3600
+    LIVE_WINDOWS = (1, 5, 15, 60)
+
+    def __init__(self, cache: Optional[RedisCache] = None,
+                 sync_interval: int = settings.STATS_SYNC_INTERVAL):
         super().__init__()
+        self.cache = cache
+        self.sync_interval = sync_interval
         self.stats = {
             'total_messages': 0,
             'total_callbacks': 0,
-            'unique_users': set(),
-            'commands': {},
             'errors': 0
         }
+        self.unique_users = HyperLogLog(settings.STATS_HLL_PRECISION)
+        self.commands = TopK(settings.STATS_TOP_K, settings.STATS_CMS_WIDTH, settings.STATS_CMS_DEPTH)
+        self.cities = TopK(settings.STATS_TOP_K, settings.STATS_CMS_WIDTH, settings.STATS_CMS_DEPTH)
+
+        # Накопленное с последнего слияния в Redis
+        self._pending_users: Set[int] = set()
+        self._pending_commands: Counter = Counter()
+        self._pending_cities: Counter = Counter()
+
+        # Минутные корзины: еще не слитые в Redis и локальная история за час
+        self._pending_buckets: Dict[int, Counter] = {}
+        self._local_buckets: Dict[int, Counter] = {}
+        self._sync_needed = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
 
     async def __call__(
         self,
@@ -90,13 +151,20 @@ class StatisticsMiddleware(BaseMiddleware):
 
         user_id = getattr(event.from_user, "id", None)
         if user_id:
-            self.stats['unique_users'].add(user_id)
+            self.unique_users.add(user_id)
+            self._remember(self._pending_users.add, user_id)
+
+        bucket = self._bucket()
+        bucket['updates'] += 1
 
         if isinstance(event, Message):
             self.stats['total_messages'] += 1
             if event.text and event.text.startswith('/'):
-                command = event.text.split()[0]
-                self.stats['commands'][command] = self.stats['commands'].get(command, 0) + 1
+                command = self._normalize_command(event.text)
+                self.commands.add(command)
+                self._remember(self._pending_commands.update, (command,))
+                # Полей в корзине не больше top-k: редкие команды - в cmd:other
+                bucket[f"cmd:{command}" if command in self.commands else "cmd:other"] += 1
         elif isinstance(event, CallbackQuery):
             self.stats['total_callbacks'] += 1
 
@@ -104,23 +172,172 @@ class StatisticsMiddleware(BaseMiddleware):
             return await handler(event, data)
         except Exception:
             self.stats['errors'] += 1
+            # Корзина текущей минуты: прежнюю могли уже слить в Redis
+            self._bucket()['errors'] += 1
             raise
 
-    def get_stats(self) -> dict:
+    async def record_requests(self, batch: List[dict]):
+        """Учесть города из записанной пачки истории (хук RequestLogQueue)"""
+        for record in batch:
+            if record['success']:
+                self.cities.add(record['city_name'])
+                self._remember(self._pending_cities.update, (record['city_name'],))
+
+    def start(self):
+        """Запуск периодического слияния в Redis"""
+        if self._task is None and self.cache:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановка с финальным слиянием"""
+        self._stopped.set()
+        self._sync_needed.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+    async def sync(self):
+        """Слить накопленные оценки и минутные корзины в Redis"""
+        buckets, self._pending_buckets = self._pending_buckets, {}
+        self._merge_local(buckets)
+
+        if not self.cache or not self.cache.redis:
+            return
+
+        await self.cache.incr_hashes(
+            {self._bucket_key(minute): counts for minute, counts in buckets.items()},
+            self.BUCKET_TTL
+        )
+
+        users, self._pending_users = self._pending_users, set()
+        commands, self._pending_commands = self._pending_commands, Counter()
+        cities, self._pending_cities = self._pending_cities, Counter()
+
+        keep = settings.STATS_TOP_K * 5
+        await self.cache.pfadd(self._key('users'), *users)
+        await self.cache.incr_top(self._key('commands'), commands, self._cells(self.commands, commands), keep)
+        await self.cache.incr_top(self._key('cities'), cities, self._cells(self.cities, cities), keep)
+
+    async def get_stats(self, limit: int = 5) -> dict:
+        """Статистика: общая по Redis, если он доступен, иначе по процессу"""
+        await self.sync()
+
+        unique_users = None
+        commands = cities = None
+        if self.cache:
+            unique_users = await self.cache.pfcount(self._key('users'))
+            commands = await self.cache.get_top(self._key('commands'), limit)
+            cities = await self.cache.get_top(self._key('cities'), limit)
+
         return {
             'total_messages': self.stats['total_messages'],
             'total_callbacks': self.stats['total_callbacks'],
-            'unique_users': len(self.stats['unique_users']),
-            'commands': self.stats['commands'],
+            'unique_users': unique_users if unique_users is not None else self.unique_users.count(),
+            'unique_users_error': self.unique_users.error,
+            'commands': commands if commands is not None else self.commands.items(limit),
+            'cities': cities if cities is not None else self.cities.items(limit),
             'errors': self.stats['errors']
         }
 
+    async def get_live_stats(self, limit: int = 3) -> Dict[int, dict]:
+        """RPS, доля ошибок и топ команд за последние 1/5/15/60 минут (все экземпляры)"""
+        await self.sync()
+
+        now = time.time()
+        current = int(now // 60)
+        minutes = [current - i for i in range(max(self.LIVE_WINDOWS))]
+
+        buckets = None
+        if self.cache:
+            buckets = await self.cache.get_hashes([self._bucket_key(m) for m in minutes])
+        if buckets is None:
+            buckets = [self._local_buckets.get(m, Counter()) for m in minutes]
+
+        live = {}
+        for window in self.LIVE_WINDOWS:
+            total = Counter()
+            for counts in buckets[:window]:
+                total.update(counts)
+
+            # Текущая минута неполная: окно - (window - 1) минут + прошедшие секунды
+            seconds = (window - 1) * 60 + (now - current * 60)
+            updates = total['updates']
+            commands = Counter({
+                field[4:]: count for field, count in total.items() if field.startswith('cmd:')
+            })
+            live[window] = {
+                'updates': updates,
+                'rps': updates / seconds if seconds else 0.0,
+                'errors': total['errors'],
+                'error_rate': total['errors'] / updates * 100 if updates else 0.0,
+                'commands': commands.most_common(limit)
+            }
+        return live
+
+    def _bucket(self) -> Counter:
+        """Корзина текущей минуты для еще не слитых счетчиков"""
+        minute = int(time.time() // 60)
+        bucket = self._pending_buckets.get(minute)
+        if bucket is None:
+            bucket = self._pending_buckets[minute] = Counter()
+        return bucket
+
+    def _merge_local(self, buckets: Dict[int, Counter]):
+        """Сохранить слитые корзины локально (статистика без Redis), хранить час"""
+        for minute, counts in buckets.items():
+            self._local_buckets.setdefault(minute, Counter()).update(counts)
+        oldest = int(time.time() // 60) - max(self.LIVE_WINDOWS)
+        for minute in [m for m in self._local_buckets if m <= oldest]:
+            del self._local_buckets[minute]
+
+    def _bucket_key(self, minute: int) -> str:
+        return self.cache.make_key('stats', 'm', minute)
+
+    async def _run(self):
+        """Цикл слияния: по таймеру или при заполнении буфера"""
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._sync_needed.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._sync_needed.clear()
+            await self.sync()
+
+    def _remember(self, add: Callable, value):
+        """Отложить значение до слияния в Redis (только если Redis есть)"""
+        if not self.cache or not self.cache.redis:
+            return
+        add(value)
+        pending = len(self._pending_users) + len(self._pending_commands) + len(self._pending_cities)
+        if pending >= self.PENDING_LIMIT:
+            self._sync_needed.set()
+
+    def _key(self, name: str) -> str:
+        return self.cache.make_key('stats', name)
+
+    @staticmethod
+    def _cells(top: TopK, counts: Counter) -> Dict[str, List[str]]:
+        return {item: top.sketch.cells(item) for item in counts}
+
+    @staticmethod
+    def _normalize_command(text: str) -> str:
+        """/Start@WeatherBot arg -> /start; не-команды Telegram -> /invalid"""
+        name = text.split()[0].split('@')[0][1:].lower()
+        return f"/{name}" if COMMAND_NAME.fullmatch(name) else INVALID_COMMAND
+
 
 # ===============================================
 # Middleware для отслеживания активности пользователей
 # ===============================================
 class UserActivityMiddleware(BaseMiddleware):
-    """Middleware для обновления информации о пользователях в БД"""
+    """Middleware для разрешения пользователя в БД один раз на апдейт
+
+    Кладёт id пользователя из БД в data['db_user_id'] для хендлеров.
+    """
+
+    def __init__(self, tracker: UserActivityTracker):
+        super().__init__()
+        self.tracker = tracker
 
     async def __call__(
         self,
@@ -131,28 +348,6 @@ class UserActivityMiddleware(BaseMiddleware):
 
         user = getattr(event, "from_user", None)
         if user:
-            try:
-                # Локальный импорт, чтобы избежать циклических зависимостей
-                from database.models import init_db
-                from database.crud import UserCRUD
-
-                SessionLocal = init_db()
-                session = SessionLocal()
-
-                user_data = {
-                    'username': getattr(user, "username", None),
-                    'first_name': getattr(user, "first_name", None),
-                    'last_name': getattr(user, "last_name", None),
-                    'language_code': getattr(user, "language_code", None)
-                }
-
-                UserCRUD.get_or_create(
-                    session,
-                    getattr(user, "id", None),
-                    **user_data
-                )
-
-            finally:
-                session.close()
+            data['db_user_id'] = await self.tracker.resolve(user)
 
-        return await handler(event, data)
\ No newline at end of file
+        return await handler(event, data)
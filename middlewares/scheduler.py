@@ -0,0 +1,355 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+from aiogram.types import CallbackQuery, Message, Update
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class FairScheduler:
+    """Справедливое распределение слотов обработки между чатами
+
+    У каждого чата своя очередь ожидающих апдейтов. Свободный слот
+    отдается следующему чату по кругу (round-robin), по одному апдейту
+    за ход, поэтому один активный пользователь не вытесняет остальных.
+    Пока апдейт чата обрабатывается, следующий апдейт того же чата
+    не стартует - порядок внутри чата строгий.
+
+    Когда ожидающих больше pause_threshold, прием апдейтов (getUpdates,
+    вебхук) приостанавливается до снижения очереди вдвое.
+
+    Апдейт, который ждет чего-то долгого (слот роутера), может на это
+    время вернуть глобальный слот: suspend() / resume(). Чат при этом
+    остается занятым, а вернувшиеся получают слот раньше новых чатов.
+    """
+
+    def __init__(self, max_workers: int = settings.SCHEDULER_WORKERS,
+                 max_chat_queue: int = settings.SCHEDULER_CHAT_QUEUE_SIZE,
+                 pause_threshold: int = settings.SCHEDULER_PAUSE_THRESHOLD):
+        self.max_workers = max_workers
+        self.max_chat_queue = max_chat_queue
+        self.pause_threshold = pause_threshold
+        self.running = 0
+        self.waiting = 0
+        self.dropped = 0
+        self.suspended = 0
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+        self._queues: Dict[int, Deque[asyncio.Future]] = {}
+        self._ready: Deque[int] = deque()  # свободные чаты с ожидающими апдейтами
+        self._busy: Set[int] = set()
+        self._resuming: Deque[asyncio.Future] = deque()
+
+    async def acquire(self, chat_id: int) -> bool:
+        """Дождаться слота для апдейта чата
+
+        :return: False, если очередь чата переполнена и апдейт отброшен
+        """
+        queue = self._queues.setdefault(chat_id, deque())
+
+        if not queue and chat_id not in self._busy and self.running < self.max_workers:
+            self._grant(chat_id)
+            return True
+
+        if len(queue) >= self.max_chat_queue:
+            self.dropped += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        self.waiting += 1
+        if len(queue) == 1 and chat_id not in self._busy:
+            self._ready.append(chat_id)
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но задача отменена - возвращаем его
+                self.release(chat_id)
+            else:
+                self._forget(chat_id, future)
+            raise
+        return True
+
+    def release(self, chat_id: int):
+        """Освободить слот после обработки апдейта"""
+        self._busy.discard(chat_id)
+        self.running -= 1
+
+        if self._queues.get(chat_id):
+            self._ready.append(chat_id)
+        else:
+            self._queues.pop(chat_id, None)
+        self._dispatch()
+
+    def suspend(self):
+        """Вернуть глобальный слот на время ожидания (следующий апдейт чата не стартует)"""
+        self.running -= 1
+        self.suspended += 1
+        self._dispatch()
+
+    async def resume(self):
+        """Снова занять глобальный слот после suspend() - вне очереди чатов"""
+        if self.running < self.max_workers and not self._resuming:
+            self._unsuspend()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._resuming.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not (future.done() and not future.cancelled()):
+                # Слот не выдан: считаем занятым, его вернет release() апдейта
+                try:
+                    self._resuming.remove(future)
+                except ValueError:
+                    pass
+                self._unsuspend()
+            raise
+
+    def resume_nowait(self):
+        """Вернуть слот без ожидания (отмена апдейта: release() вызовет внешний код)"""
+        self._unsuspend()
+
+    def _unsuspend(self):
+        self.running += 1
+        self.suspended -= 1
+
+    @property
+    def paused(self) -> bool:
+        """Прием апдейтов приостановлен (очередь выше порога)"""
+        return not self._capacity.is_set()
+
+    async def wait_for_capacity(self):
+        """Дождаться снижения очереди ниже порога"""
+        await self._capacity.wait()
+
+    async def drain(self, timeout: float) -> bool:
+        """Дождаться завершения всех выданных и ожидающих апдейтов
+
+        :return: False, если за timeout очередь не опустела
+        """
+        async def idle():
+            while self.running or self.waiting or self.suspended:
+                await asyncio.sleep(0.05)
+
+        try:
+            await asyncio.wait_for(idle(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def depth(self, chat_id: int) -> int:
+        """Сколько апдейтов чата ждут обработки"""
+        return len(self._queues.get(chat_id, ()))
+
+    def metrics(self, top: int = 5) -> dict:
+        """Состояние очередей: занятые слоты, ожидание, самые длинные очереди"""
+        depths = sorted(
+            ((chat_id, len(queue)) for chat_id, queue in self._queues.items() if queue),
+            key=lambda item: item[1], reverse=True
+        )
+        return {
+            'running': self.running,
+            'workers': self.max_workers,
+            'waiting': sum(depth for _, depth in depths),
+            'chats_waiting': len(depths),
+            'max_depth': depths[0][1] if depths else 0,
+            'top': depths[:top],
+            'dropped': self.dropped
+        }
+
+    def _grant(self, chat_id: int):
+        self._busy.add(chat_id)
+        self.running += 1
+
+    def _dispatch(self):
+        """Раздать свободные слоты: сначала вернувшимся после suspend(), затем чатам по кругу"""
+        while self.running < self.max_workers and self._resuming:
+            future = self._resuming.popleft()
+            if future.cancelled():
+                continue
+            self._unsuspend()
+            future.set_result(None)
+
+        while self.running < self.max_workers and self._ready:
+            chat_id = self._ready.popleft()
+            queue = self._queues.get(chat_id)
+
+            # Отмененные ожидания пропускаем
+            while queue and queue[0].cancelled():
+                queue.popleft()
+                self.waiting -= 1
+            if not queue:
+                if chat_id not in self._busy:
+                    self._queues.pop(chat_id, None)
+                continue
+
+            self._grant(chat_id)
+            self.waiting -= 1
+            queue.popleft().set_result(None)
+
+        self._update_intake()
+
+    def _update_intake(self):
+        """Пауза приема выше порога, возобновление - ниже половины"""
+        if self._capacity.is_set():
+            if self.waiting > self.pause_threshold:
+                self._capacity.clear()
+                logger.warning(f"⏸ Очередь обработки: {self.waiting}, прием апдейтов приостановлен")
+        elif self.waiting <= self.pause_threshold // 2:
+            self._capacity.set()
+            logger.info(f"▶️ Очередь обработки: {self.waiting}, прием апдейтов возобновлен")
+
+    def _forget(self, chat_id: int, future: asyncio.Future):
+        """Убрать отмененное ожидание из очереди чата"""
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+            self.waiting -= 1
+        except ValueError:
+            pass
+        if not queue and chat_id not in self._busy:
+            self._queues.pop(chat_id, None)
+            try:
+                self._ready.remove(chat_id)
+            except ValueError:
+                pass
+
+
+class FairSchedulerMiddleware(BaseMiddleware):
+    """Outer middleware апдейтов: обработка через FairScheduler"""
+
+    def __init__(self, scheduler: FairScheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat = data.get('event_chat')
+        user = data.get('event_from_user')
+        key = chat.id if chat else (user.id if user else None)
+        if key is None:
+            return await handler(event, data)
+
+        if not await self.scheduler.acquire(key):
+            if self.scheduler.dropped % 100 == 1:
+                logger.warning(
+                    f"⚠️ Очередь чата {key} переполнена, отброшено апдейтов: {self.scheduler.dropped}"
+                )
+            return None
+
+        # Внутренние middleware могут вернуть слот на время ожидания
+        data['scheduler_slot'] = True
+        try:
+            return await handler(event, data)
+        finally:
+            self.scheduler.release(key)
+
+
+class RouterLimiter:
+    """Лимиты одновременных хендлеров по роутерам (модулям handlers)
+
+    Тяжелый роутер (экспорт, прогноз) не занимает все глобальные слоты:
+    сверх лимита его апдейты ждут в очереди семафора, вернув глобальный
+    слот FairScheduler (RouterLimitMiddleware).
+    """
+
+    def __init__(self, limits: Dict[str, int] = settings.ROUTER_LIMITS):
+        self.limits = dict(limits)
+        self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in self.limits.items()}
+
+    def semaphore(self, router: str) -> Optional[asyncio.Semaphore]:
+        return self._semaphores.get(router)
+
+    def metrics(self) -> Dict[str, dict]:
+        """Занятые слоты и ожидающие по роутерам"""
+        return {
+            name: {
+                'running': self.limits[name] - semaphore._value,
+                'limit': self.limits[name],
+                'waiting': len(semaphore._waiters or ())
+            }
+            for name, semaphore in self._semaphores.items()
+        }
+
+
+class RouterLimitMiddleware(BaseMiddleware):
+    """Inner middleware: слот роутера хендлера на время обработки
+
+    Хендлер известен только на этапе inner middleware, когда глобальный
+    слот FairScheduler уже занят. Если слот роутера придется ждать,
+    глобальный слот на это время возвращается планировщику - очередь
+    к тяжелому роутеру не блокирует остальные.
+    """
+
+    def __init__(self, limiter: RouterLimiter, scheduler: Optional[FairScheduler] = None):
+        super().__init__()
+        self.limiter = limiter
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        handler: Callable[[Message | CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        # Роутер - модуль хендлера: handlers.export -> export
+        callback = getattr(data.get('handler'), 'callback', None)
+        router = getattr(callback, '__module__', '').rsplit('.', 1)[-1]
+        semaphore = self.limiter.semaphore(router)
+        if semaphore is None:
+            return await handler(event, data)
+
+        if semaphore.locked() and self.scheduler and data.get('scheduler_slot'):
+            await self._acquire_suspended(semaphore)
+        else:
+            await semaphore.acquire()
+
+        try:
+            return await handler(event, data)
+        finally:
+            semaphore.release()
+
+    async def _acquire_suspended(self, semaphore: asyncio.Semaphore):
+        """Ждать слот роутера без глобального слота, затем вернуть его"""
+        self.scheduler.suspend()
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            self.scheduler.resume_nowait()
+            raise
+
+        try:
+            await self.scheduler.resume()
+        except BaseException:
+            semaphore.release()
+            raise
+
+
+class IntakeBackpressure(BaseRequestMiddleware):
+    """Middleware сессии бота: getUpdates ждет, пока очередь обработки переполнена"""
+
+    def __init__(self, scheduler: FairScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, GetUpdates):
+            await self.scheduler.wait_for_capacity()
+        return await make_request(bot, method)
@@ -1,39 +1,38 @@
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
-from aiogram.types import Message
-import time
+from aiogram.types import Message, CallbackQuery
+from services.metrics import RATE_LIMITED
+from services.rate_limiter import DistributedRateLimiter
 
 
 class ThrottlingMiddleware(BaseMiddleware):
-    """Middleware для ограничения частоты запросов"""
-    
-    def __init__(self, rate_limit: float = 1.0):
+    """Middleware для ограничения частоты запросов (сообщения и callback'и)"""
+
+    def __init__(self, limiter: DistributedRateLimiter):
         """
-        :param rate_limit: минимальное время между запросами (секунды)
+        :param limiter: общий для реплик rate limiter
         """
-        self.rate_limit = rate_limit
-        self.user_timings: Dict[int, float] = {}
-    
+        self.limiter = limiter
+
     async def __call__(
         self,
-        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
-        event: Message,
+        handler: Callable[[Message | CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
         data: Dict[str, Any]
     ) -> Any:
-        user_id = event.from_user.id
-        current_time = time.time()
-        
-        # Проверяем последний запрос пользователя
-        if user_id in self.user_timings:
-            time_passed = current_time - self.user_timings[user_id]
-            
-            if time_passed < self.rate_limit:
-                await event.answer(
-                    "⏱ Пожалуйста, подождите немного перед следующим запросом"
-                )
-                return
-        
-        # Обновляем время последнего запроса
-        self.user_timings[user_id] = current_time
+        user = getattr(event, "from_user", None)
+        if user is None:
+            return await handler(event, data)
+
+        allowed, retry_after, notify = await self.limiter.check(user.id)
+        if allowed:
+            return await handler(event, data)
+
+        RATE_LIMITED.labels('callback' if isinstance(event, CallbackQuery) else 'message').inc()
         
-        return await handler(event, data)
\ No newline at end of file
+        # Предупреждаем один раз, дальнейшие запросы отбрасываются молча
+        text = f"⏱ Слишком много запросов, подождите {max(1, round(retry_after))} с"
+        if isinstance(event, CallbackQuery):
+            await event.answer(text if notify else None)
+        elif notify:
+            await event.answer(text)
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+from config import settings
+from database.crud import UserCRUD
+from database.engine import Database
+from services.cache import RedisCache
+from services.metrics import BROADCAST_MESSAGES
+from services.send_governor import SendGovernor
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    """Рассылка сообщения всем активным пользователям
+
+    Пользователи читаются пачками по id (keyset), отправки идут через
+    SendGovernor. После каждой пачки прогресс (последний id и счетчики)
+    сохраняется в Redis: после перезапуска рассылка продолжается с
+    контрольной точки. Повторно могут уйти сообщения только
+    из незавершенной пачки. Заблокировавшие бота помечаются is_active=False.
+    """
+
+    STATE_TTL = 7 * 24 * 3600
+    LOCK_TTL = 60
+
+    def __init__(
+        self,
+        bot: Bot,
+        db: Database,
+        cache: RedisCache,
+        governor: SendGovernor,
+        batch_size: int = settings.BROADCAST_BATCH_SIZE,
+        concurrency: int = settings.BROADCAST_CONCURRENCY,
+        progress_interval: int = settings.BROADCAST_PROGRESS_INTERVAL
+    ):
+        self.bot = bot
+        self.db = db
+        self.cache = cache
+        self.governor = governor
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.owner = uuid.uuid4().hex
+        self.state: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._state_key = cache.make_key('broadcast', 'state')
+        self._lock_key = cache.make_key('broadcast', 'lock')
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, admin_chat_id: int, text: str) -> bool:
+        """Начать рассылку (False - уже идет другая)"""
+        current = await self.status()
+        if self.running or (current and current['status'] == 'running'):
+            return False
+
+        total = await self.db.read(UserCRUD.count_active)
+        status_message = await self.bot.send_message(admin_chat_id, "📣 Рассылка запускается...")
+        self.state = {
+            'id': uuid.uuid4().hex[:8],
+            'status': 'running',
+            'text': text,
+            'admin_chat_id': admin_chat_id,
+            'status_message_id': status_message.message_id,
+            'last_id': 0,
+            'total': total,
+            'sent': 0,
+            'blocked': 0,
+            'failed': 0,
+            'elapsed': 0.0
+        }
+        await self._save()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"📣 Рассылка {self.state['id']} запущена: {total} пользователей")
+        return True
+
+    async def resume(self):
+        """Продолжить незавершенную рассылку после перезапуска"""
+        state = await self.cache.get(self._state_key)
+        if not state or state['status'] != 'running' or self.running:
+            return
+        self.state = state
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"📣 Рассылка {state['id']} продолжается с пользователя id>{state['last_id']}")
+
+    async def cancel(self) -> bool:
+        """Отменить рассылку (в том числе идущую на другом экземпляре)"""
+        state = await self.status()
+        if not state or state['status'] != 'running':
+            return False
+
+        if self.state and self.state['id'] == state['id']:
+            # Рассылку ведет этот экземпляр - меняем его состояние
+            state = self.state
+        state['status'] = 'cancelled'
+        await self.cache.set(self._state_key, state, self.STATE_TTL)
+        # Экземпляр, ведущий рассылку, увидит отмену перед следующей пачкой
+        if self._task:
+            self._task.cancel()
+        return True
+
+    async def status(self) -> Optional[dict]:
+        """Текущее состояние рассылки (свое или из Redis)"""
+        return await self.cache.get(self._state_key) or self.state
+
+    async def close(self):
+        """Остановка: прогресс сохранен на последней завершенной пачке"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            # Другой экземпляр сможет продолжить сразу, не дожидаясь TTL
+            await self.cache.release_lock(self._lock_key, self.owner)
+
+    @staticmethod
+    def format_progress(state: dict) -> str:
+        """Текст прогресса для администратора"""
+        done = state['sent'] + state['blocked'] + state['failed']
+        total = max(state['total'], done)
+        percent = done / total * 100 if total else 100.0
+        rate = done / state['elapsed'] if state['elapsed'] else 0.0
+
+        titles = {'running': "идет", 'done': "завершена", 'cancelled': "отменена"}
+        text = (
+            f"📣 <b>Рассылка {state['id']}: {titles.get(state['status'], state['status'])}</b>\n\n"
+            f"Обработано: {done}/{total} ({percent:.0f}%)\n"
+            f"✅ Доставлено: {state['sent']}\n"
+            f"🚫 Заблокировали бота: {state['blocked']}\n"
+            f"❌ Ошибок: {state['failed']}\n"
+            f"⚡ Скорость: {rate:.1f} сообщ/с"
+        )
+        if state['status'] == 'running' and rate:
+            eta = int((total - done) / rate)
+            text += f"\n⏳ Осталось: ~{eta // 60} мин {eta % 60} с"
+        return text
+
+    async def _run(self):
+        state = self.state
+        started = time.monotonic()
+        elapsed_before = state['elapsed']
+        reported = 0.0
+
+        try:
+            while True:
+                if not await self.cache.acquire_lock(self._lock_key, self.owner, self.LOCK_TTL):
+                    logger.info("📣 Рассылку ведет другой экземпляр")
+                    return
+
+                remote = await self.cache.get(self._state_key)
+                if remote and remote['status'] == 'cancelled':
+                    state['status'] = 'cancelled'
+                    break
+
+                batch = await self.db.read(UserCRUD.get_active_batch, state['last_id'], self.batch_size)
+                if not batch:
+                    state['status'] = 'done'
+                    break
+
+                results = await self._send_batch(batch)
+                blocked = [user_id for (user_id, _), result in zip(batch, results) if result == 'blocked']
+                if blocked:
+                    await self.db.write(UserCRUD.deactivate_many, blocked)
+
+                for result in results:
+                    state[result] += 1
+                state['last_id'] = batch[-1][0]
+                state['elapsed'] = elapsed_before + time.monotonic() - started
+                # Не затереть отмену, пришедшую во время пачки
+                remote = await self.cache.get(self._state_key)
+                if remote and remote['status'] == 'cancelled':
+                    state['status'] = 'cancelled'
+                await self._save()
+                if state['status'] == 'cancelled':
+                    break
+
+                if time.monotonic() - reported >= self.progress_interval:
+                    reported = time.monotonic()
+                    await self._report()
+
+        except asyncio.CancelledError:
+            if state['status'] != 'cancelled':
+                # Остановка процесса: продолжим с контрольной точки
+                raise
+
+        state['elapsed'] = elapsed_before + time.monotonic() - started
+        await self._save()
+        await self._report()
+        await self.cache.release_lock(self._lock_key, self.owner)
+        logger.info(
+            f"📣 Рассылка {state['id']} {state['status']}: доставлено {state['sent']}, "
+            f"заблокировали {state['blocked']}, ошибок {state['failed']}"
+        )
+
+    async def _send_batch(self, batch: List[Tuple[int, int]]) -> List[str]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(telegram_id: int) -> str:
+            async with semaphore:
+                return await self._send_one(telegram_id)
+
+        return await asyncio.gather(*(send(telegram_id) for _, telegram_id in batch))
+
+    async def _send_one(self, telegram_id: int) -> str:
+        """Отправить одному пользователю: sent, blocked или failed"""
+        result = await self.governor.deliver(self.bot, telegram_id, self.state['text'])
+        BROADCAST_MESSAGES.labels(result).inc()
+        return result
+
+    async def _save(self):
+        await self.cache.set(self._state_key, self.state, self.STATE_TTL)
+
+    async def _report(self):
+        """Обновить сообщение с прогрессом у администратора"""
+        try:
+            await self.bot.edit_message_text(
+                self.format_progress(self.state),
+                chat_id=self.state['admin_chat_id'],
+                message_id=self.state['status_message_id']
+            )
+        except TelegramAPIError as e:
+            if 'not modified' not in str(e):
+                logger.warning(f"⚠️ Не удалось обновить прогресс рассылки: {e}")
@@ -1,17 +1,69 @@
 import json
 import logging
-from typing import Any, Optional
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from redis.asyncio import Redis
 from config import settings
+from .metrics import CACHE_REQUESTS, REDIS_LATENCY, key_prefix
+from .tracing import span
+
+if TYPE_CHECKING:
+    from .cache_snapshot import CacheSnapshot
 
 logger = logging.getLogger(__name__)
 
+# Метки связаны заранее: на горячем пути только observe()
+_GET_LATENCY = REDIS_LATENCY.labels('get')
+_SET_LATENCY = REDIS_LATENCY.labels('set')
+_LIST_LATENCY = REDIS_LATENCY.labels('lrange')
+
+# Взять блокировку или продлить свою: ARGV[1] - владелец, ARGV[2] - TTL (секунды)
+LOCK_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner and owner ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+# Заполнить список, только если его нет и версия не менялась с чтения источника:
+# KEYS[1] - список, KEYS[2] - версия, ARGV[1] - TTL, ARGV[2] - версия, ARGV[3..] - значения
+FILL_LIST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# Снять блокировку, только если она своя
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 class RedisCache:
     """Сервис кеширования на Redis"""
     
     def __init__(self):
         self.redis: Optional[Redis] = None
+        self._lock_script = None
+        self._unlock_script = None
+        self._fill_list_script = None
+        # Рабочий набор для снимка теплого перезапуска (LRU ключей)
+        self.snapshot: Optional['CacheSnapshot'] = None
+        self._hot: 'OrderedDict[str, None]' = OrderedDict()
+        self._hot_size = settings.WARM_CACHE_SIZE
+        self._hot_prefixes = frozenset(settings.WARM_CACHE_PREFIXES)
     
     async def connect(self):
         """Подключение к Redis"""
@@ -26,7 +78,7 @@ class RedisCache:
             await self.redis.ping()
             logger.info("✅ Redis подключен")
         except Exception as e:
-            logger.error(f"❌ Ошибка подключения к Redis: {e}")
+            logger.error("❌ Ошибка подключения к Redis: %s", e)
             self.redis = None
     
     async def close(self):
@@ -38,17 +90,29 @@ class RedisCache:
     async def get(self, key: str) -> Optional[dict]:
         """Получить данные из кеша"""
         if not self.redis:
-            return None
+            restored = self._from_snapshot(key)
+            return json.loads(restored[0]) if restored else None
         
         try:
-            data = await self.redis.get(key)
+            with _GET_LATENCY.time(), span('redis.get', key=key):
+                data = await self.redis.get(key)
             if data:
-                logger.info(f"📦 Кеш HIT: {key}")
+                CACHE_REQUESTS.labels(key_prefix(key), 'hit').inc()
+                logger.debug("📦 Кеш HIT: %s", key)
+                self._touch(key)
                 return json.loads(data)
-            logger.info(f"🔍 Кеш MISS: {key}")
+            restored = self._from_snapshot(key)
+            if restored:
+                # Возвращаем ключ в Redis с оставшимся TTL
+                data, expires_at = restored
+                await self.redis.set(key, data, pxat=int(expires_at * 1000))
+                self.snapshot.discard(key)
+                return json.loads(data)
+            CACHE_REQUESTS.labels(key_prefix(key), 'miss').inc()
+            logger.debug("🔍 Кеш MISS: %s", key)
             return None
         except Exception as e:
-            logger.error(f"Ошибка чтения кеша: {e}")
+            logger.error("Ошибка чтения кеша: %s", e)
             return None
     
     async def set(self, key: str, value: dict, ttl: int = settings.CACHE_TTL):
@@ -57,17 +121,72 @@ class RedisCache:
             return
         
         try:
-            await self.redis.setex(
-                key,
-                ttl,
-                json.dumps(value, ensure_ascii=False)
-            )
-            logger.info(f"💾 Данные закешированы: {key} (TTL: {ttl}s)")
+            with _SET_LATENCY.time(), span('redis.set', key=key):
+                await self.redis.setex(
+                    key,
+                    ttl,
+                    json.dumps(value, ensure_ascii=False)
+                )
+            logger.debug("💾 Данные закешированы: %s (TTL: %ss)", key, ttl)
+            self._touch(key)
+        except Exception as e:
+            logger.error("Ошибка записи в кеш: %s", e)
+    
+    def _touch(self, key: str):
+        """Отметить использование ключа в рабочем наборе"""
+        if key_prefix(key) not in self._hot_prefixes:
+            return
+        self._hot[key] = None
+        self._hot.move_to_end(key)
+        if len(self._hot) > self._hot_size:
+            self._hot.popitem(last=False)
+    
+    def _from_snapshot(self, key: str) -> Optional[Tuple[str, float]]:
+        """JSON и время истечения ключа из снимка прошлого запуска"""
+        if self.snapshot is None:
+            return None
+        try:
+            restored = self.snapshot.get(key)
+        except Exception as e:
+            logger.error("Ошибка чтения снимка кеша: %s", e)
+            return None
+        if restored:
+            CACHE_REQUESTS.labels(key_prefix(key), 'snapshot').inc()
+            logger.debug("♨️ Кеш из снимка: %s", key)
+            self._touch(key)
+        return restored
+    
+    def hot_keys(self) -> List[str]:
+        """Ключи рабочего набора (от давних к свежим)"""
+        return list(self._hot)
+    
+    async def dump(self, keys: List[str]) -> List[Tuple[str, str, float]]:
+        """Значения и время истечения ключей одним пайплайном (ключ, JSON, истекает)"""
+        if not self.redis or not keys:
+            return []
+        
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.get(key)
+                    pipe.pttl(key)
+                items = await pipe.execute()
         except Exception as e:
-            logger.error(f"Ошибка записи в кеш: {e}")
+            logger.error("Ошибка чтения рабочего набора: %s", e)
+            return []
+        
+        now = time.time()
+        return [
+            (key, data, now + ttl / 1000)
+            for key, data, ttl in zip(keys, items[::2], items[1::2])
+            if data is not None and ttl > 0
+        ]
     
     async def delete(self, pattern: str):
         """Удалить ключи по паттерну"""
+        # Удаленное не должно вернуться из снимка прошлого запуска
+        if self.snapshot is not None:
+            self.snapshot.discard(pattern)
         if not self.redis:
             return
         
@@ -75,9 +194,195 @@ class RedisCache:
             keys = await self.redis.keys(pattern)
             if keys:
                 await self.redis.delete(*keys)
-                logger.info(f"🗑️ Удалено ключей: {len(keys)}")
+                logger.info("🗑️ Удалено ключей: %d", len(keys))
+        except Exception as e:
+            logger.error("Ошибка удаления из кеша: %s", e)
+    
+    async def pfadd(self, key: str, *values):
+        """Добавить значения в HyperLogLog"""
+        if not self.redis or not values:
+            return
+        
+        try:
+            await self.redis.pfadd(key, *values)
+        except Exception as e:
+            logger.error("Ошибка записи HyperLogLog: %s", e)
+    
+    async def pfcount(self, key: str) -> Optional[int]:
+        """Оценка числа уникальных значений HyperLogLog"""
+        if not self.redis:
+            return None
+        
+        try:
+            return await self.redis.pfcount(key)
+        except Exception as e:
+            logger.error("Ошибка чтения HyperLogLog: %s", e)
+            return None
+    
+    async def incr_top(self, key: str, counts: Dict[str, int], cells: Dict[str, List[str]], keep: int):
+        """Слить счетчики в общий Count-Min sketch и обновить рейтинг его оценками
+
+        Скетч (HINCRBY по ячейкам cells) складывается между экземплярами,
+        а кандидат получает в рейтинге оценку по всему скетчу, а не
+        прирост: команда, ставшая популярной позже, попадает в рейтинг,
+        как только ее оценка превысит отсечку keep.
+        """
+        if not self.redis or not counts:
+            return
+        
+        sketch_key = f"{key}:cms"
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for member, count in counts.items():
+                    for cell in cells[member]:
+                        pipe.hincrby(sketch_key, cell, count)
+                values = iter(await pipe.execute())
+            
+            estimates = {
+                member: min(next(values) for _ in cells[member])
+                for member in counts
+            }
+            async with self.redis.pipeline(transaction=False) as pipe:
+                # GT: оценка параллельного экземпляра могла уже быть выше
+                pipe.zadd(key, estimates, gt=True)
+                pipe.zremrangebyrank(key, 0, -keep - 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Ошибка записи рейтинга: %s", e)
+    
+    async def get_top(self, key: str, limit: int) -> Optional[List[Tuple[str, int]]]:
+        """Первые limit элементов рейтинга"""
+        if not self.redis:
+            return None
+        
+        try:
+            items = await self.redis.zrevrange(key, 0, limit - 1, withscores=True)
+            return [(member, int(score)) for member, score in items]
+        except Exception as e:
+            logger.error("Ошибка чтения рейтинга: %s", e)
+            return None
+    
+    async def incr_hashes(self, hashes: Dict[str, Dict[str, int]], ttl: int):
+        """Увеличить поля нескольких хешей (HINCRBY) одним пайплайном"""
+        if not self.redis or not hashes:
+            return
+        
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, counts in hashes.items():
+                    for field, count in counts.items():
+                        pipe.hincrby(key, field, count)
+                    pipe.expire(key, ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Ошибка записи счетчиков: %s", e)
+    
+    async def get_hashes(self, keys: List[str]) -> Optional[List[Dict[str, int]]]:
+        """Счетчики нескольких хешей (HGETALL) одним пайплайном"""
+        if not self.redis:
+            return None
+        
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hgetall(key)
+                items = await pipe.execute()
+            return [{field: int(value) for field, value in item.items()} for item in items]
+        except Exception as e:
+            logger.error("Ошибка чтения счетчиков: %s", e)
+            return None
+    
+    async def push_capped(self, lists: Dict[str, List[Any]], size: int, ttl: int):
+        """Дописать значения в начало существующих списков и обрезать до size
+
+        Версия списка ({key}:version) растет при каждой записи - даже если
+        списка нет, - чтобы fill_list не заполнил его устаревшими данными.
+        """
+        if not self.redis or not lists:
+            return
+        
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, values in lists.items():
+                    # LPUSHX: холодный список не создается из одной записи
+                    pipe.lpushx(key, *(json.dumps(v, ensure_ascii=False) for v in values))
+                    pipe.ltrim(key, 0, size - 1)
+                    pipe.expire(key, ttl)
+                    pipe.incr(self._version_key(key))
+                    pipe.expire(self._version_key(key), ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Ошибка записи списка: %s", e)
+    
+    async def list_version(self, key: str) -> Optional[int]:
+        """Версия списка для fill_list (None - Redis недоступен)"""
+        if not self.redis:
+            return None
+        
+        try:
+            return int(await self.redis.get(self._version_key(key)) or 0)
+        except Exception as e:
+            logger.error("Ошибка чтения версии списка: %s", e)
+            return None
+    
+    async def fill_list(self, key: str, values: List[Any], ttl: int, version: int) -> bool:
+        """Создать список из источника, если его нет и версия с чтения не менялась"""
+        if not self.redis or not values:
+            return False
+        
+        try:
+            if self._fill_list_script is None:
+                self._fill_list_script = self.redis.register_script(FILL_LIST_SCRIPT)
+            return bool(await self._fill_list_script(
+                keys=[key, self._version_key(key)],
+                args=[ttl, version, *(json.dumps(v, ensure_ascii=False) for v in values)]
+            ))
+        except Exception as e:
+            logger.error("Ошибка записи списка: %s", e)
+            return False
+    
+    @staticmethod
+    def _version_key(key: str) -> str:
+        return f"{key}:version"
+    
+    async def get_list(self, key: str, limit: int) -> Optional[List[Any]]:
+        """Первые limit элементов списка (None - списка нет)"""
+        if not self.redis:
+            return None
+        
+        try:
+            with _LIST_LATENCY.time(), span('redis.lrange', key=key):
+                items = await self.redis.lrange(key, 0, limit - 1)
+            CACHE_REQUESTS.labels(key_prefix(key), 'hit' if items else 'miss').inc()
+            return [json.loads(item) for item in items] if items else None
+        except Exception as e:
+            logger.error("Ошибка чтения списка: %s", e)
+            return None
+    
+    async def acquire_lock(self, key: str, owner: str, ttl: int) -> bool:
+        """Взять блокировку между экземплярами или продлить свою (без Redis - всегда True)"""
+        if not self.redis:
+            return True
+        
+        try:
+            if self._lock_script is None:
+                self._lock_script = self.redis.register_script(LOCK_SCRIPT)
+            return bool(await self._lock_script(keys=[key], args=[owner, ttl]))
+        except Exception as e:
+            logger.error("Ошибка блокировки: %s", e)
+            return False
+    
+    async def release_lock(self, key: str, owner: str):
+        """Снять свою блокировку"""
+        if not self.redis:
+            return
+        
+        try:
+            if self._unlock_script is None:
+                self._unlock_script = self.redis.register_script(UNLOCK_SCRIPT)
+            await self._unlock_script(keys=[key], args=[owner])
         except Exception as e:
-            logger.error(f"Ошибка удаления из кеша: {e}")
+            logger.error("Ошибка снятия блокировки: %s", e)
     
     def make_key(self, prefix: str, *args) -> str:
         """Создать ключ кеша"""
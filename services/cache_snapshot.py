@@ -0,0 +1,198 @@
+import asyncio
+import fnmatch
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, List, Optional, Set, Tuple
+
+from config import settings
+
+if TYPE_CHECKING:
+    from .cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+# Формат файла: заголовок, индекс записей (отсортирован по ключу), данные.
+# Значение - JSON из Redis, сжатый zlib; распаковывается только при чтении.
+MAGIC = b'WCS1'
+HEADER = struct.Struct('<4sI')     # magic, число записей
+ENTRY = struct.Struct('<IHIId')    # смещение ключа, длина, смещение значения, длина, истекает (unix time)
+
+Entry = Tuple[str, str, float]
+
+
+def write_snapshot(path: Path, entries: Iterable[Entry]) -> int:
+    """Записать снимок (ключ, JSON, истекает) атомарно: временный файл + rename"""
+    items = sorted(
+        (key.encode(), zlib.compress(value.encode()), expires_at)
+        for key, value, expires_at in entries
+    )
+    base = HEADER.size + ENTRY.size * len(items)
+    index = []
+    data = bytearray()
+    for key, value, expires_at in items:
+        key_offset = base + len(data)
+        data += key
+        value_offset = base + len(data)
+        data += value
+        index.append(ENTRY.pack(key_offset, len(key), value_offset, len(value), expires_at))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(items)))
+        f.writelines(index)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(items)
+
+
+class CacheSnapshot:
+    """Снимок горячих ключей кеша, отображенный в память
+
+    Файл не читается целиком: поиск ключа - бинарный по индексу в mmap,
+    значение распаковывается только для запрошенного ключа. Истекшие,
+    удаленные и уже возвращенные в Redis записи не отдаются.
+    """
+
+    def __init__(self, path: Path):
+        self._dropped: Set[str] = set()
+        self._dropped_patterns: List[str] = []
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self._count = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or HEADER.size + ENTRY.size * self._count > len(self._map):
+                raise ValueError("неизвестный формат")
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def open(cls, path: Path) -> Optional['CacheSnapshot']:
+        """Открыть снимок (None - файла нет или он поврежден)"""
+        if not path.exists():
+            return None
+        try:
+            snapshot = cls(path)
+        except Exception as e:
+            logger.warning("⚠️ Снимок кеша %s не прочитан: %s", path, e)
+            return None
+        logger.info("♨️ Снимок кеша загружен: %s ключей", len(snapshot))
+        return snapshot
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[Tuple[str, float]]:
+        """JSON и время истечения ключа (None - нет в снимке или истек)"""
+        if self._map is None or self._is_dropped(key):
+            return None
+
+        target = key.encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, key_len, value_offset, value_len, expires_at = ENTRY.unpack_from(
+                self._map, HEADER.size + ENTRY.size * middle
+            )
+            current = self._map[key_offset:key_offset + key_len]
+            if current < target:
+                low = middle + 1
+            elif current > target:
+                high = middle
+            else:
+                if expires_at <= (now or time.time()):
+                    return None
+                value = zlib.decompress(self._map[value_offset:value_offset + value_len])
+                return value.decode(), expires_at
+        return None
+
+    def discard(self, pattern: str):
+        """Больше не отдавать ключи по паттерну Redis (удалены или уже в Redis)"""
+        if any(char in pattern for char in '*?['):
+            self._dropped_patterns.append(pattern)
+        else:
+            self._dropped.add(pattern)
+
+    def _is_dropped(self, key: str) -> bool:
+        return key in self._dropped or any(
+            fnmatch.fnmatchcase(key, pattern) for pattern in self._dropped_patterns
+        )
+
+    def close(self):
+        """Освободить отображение и файл"""
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+        self._map = None
+        self._file.close()
+
+
+class CacheSnapshotter:
+    """Периодический снимок горячих ключей кеша для теплого перезапуска
+
+    RedisCache помнит последние использованные ключи (LRU, size штук);
+    раз в interval их значения и остаток TTL читаются из Redis одним
+    пайплайном и записываются в файл. После перезапуска (или если Redis
+    потерял данные) промахи кеша добираются из снимка и возвращаются в
+    Redis с оставшимся TTL - без всплеска запросов к OpenWeather.
+    """
+
+    def __init__(
+        self,
+        cache: 'RedisCache',
+        path: str = settings.WARM_CACHE_FILE,
+        interval: int = settings.WARM_CACHE_INTERVAL
+    ):
+        self.cache = cache
+        self.path = Path(path)
+        self.interval = interval
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self):
+        """Подключить снимок прошлого запуска к кешу"""
+        self.cache.snapshot = CacheSnapshot.open(self.path)
+
+    def start(self):
+        """Запуск периодических снимков"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановка с финальным снимком"""
+        self._stopped.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+        await self.save()
+        if self.cache.snapshot is not None:
+            self.cache.snapshot.close()
+            self.cache.snapshot = None
+
+    async def save(self):
+        """Записать текущий рабочий набор (без Redis - прежний снимок не трогаем)"""
+        entries = await self.cache.dump(self.cache.hot_keys())
+        if not entries:
+            return
+
+        try:
+            count = await asyncio.to_thread(write_snapshot, self.path, entries)
+            logger.debug("♨️ Снимок кеша записан: %s ключей", count)
+        except Exception as e:
+            logger.error("❌ Ошибка записи снимка кеша: %s", e)
+
+    async def _run(self):
+        """Периодическая запись снимка"""
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                await self.save()
@@ -0,0 +1,126 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import AsyncGenerator, List
+
+from aiogram.types import InputFile
+
+from config import settings
+from database.crud import WeatherRequestCRUD
+from database.engine import Database
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+CSV_HEADER = ('created_at', 'city_name', 'request_type', 'success')
+
+
+class HistoryExport(InputFile):
+    """Потоковая выгрузка всей истории пользователя документом Telegram
+
+    Поток-производитель читает историю серверным курсором и кладет
+    закодированные пачки в ограниченную очередь, а загрузка в Telegram
+    забирает их по мере отправки. В памяти одновременно не больше
+    EXPORT_BUFFER_CHUNKS пачек, независимо от длины истории.
+    """
+
+    # Выгрузка держит поток и соединение с БД на все время загрузки
+    _slots = asyncio.Semaphore(settings.EXPORT_MAX_CONCURRENT)
+
+    def __init__(
+        self,
+        db: Database,
+        user_id: int,
+        fmt: str = 'csv',
+        batch_size: int = settings.EXPORT_BATCH_SIZE,
+        buffer_chunks: int = settings.EXPORT_BUFFER_CHUNKS
+    ):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M')
+        super().__init__(filename=f"history-{stamp}.{fmt}")
+        self.db = db
+        self.user_id = user_id
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.buffer_chunks = buffer_chunks
+        self.rows = 0
+
+    async def read(self, bot=None) -> AsyncGenerator[bytes, None]:
+        """Пачки документа по мере чтения из БД"""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            chunks: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_chunks)
+            cancelled = threading.Event()
+            producer = threading.Thread(
+                target=self._produce, args=(loop, chunks, cancelled),
+                name=f'export-{self.user_id}', daemon=True
+            )
+            producer.start()
+
+            try:
+                while True:
+                    chunk = await chunks.get()
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    yield chunk
+            finally:
+                # Загрузка прервана: освобождаем место, чтобы производитель увидел отмену
+                cancelled.set()
+                while not chunks.empty():
+                    chunks.get_nowait()
+
+        logger.info(f"📤 Выгрузка истории пользователя {self.user_id}: {self.rows} строк ({self.fmt})")
+
+    def _produce(self, loop: asyncio.AbstractEventLoop, chunks: asyncio.Queue,
+                 cancelled: threading.Event):
+        """Поток-производитель: курсор БД -> закодированные пачки"""
+
+        def put(item):
+            # Блокирует поток, пока в очереди нет места (backpressure)
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        session = self.db.read_session()
+        try:
+            if self.fmt == 'csv':
+                put(self._encode_csv([CSV_HEADER], bom=True))
+
+            for batch in WeatherRequestCRUD.iter_user_history(session, self.user_id, self.batch_size):
+                if cancelled.is_set():
+                    return
+                self.rows += len(batch)
+                put(self._encode(batch))
+
+            put(None)
+        except Exception as e:
+            logger.error(f"❌ Ошибка выгрузки истории пользователя {self.user_id}: {e}")
+            if not cancelled.is_set():
+                put(e)
+        finally:
+            session.close()
+
+    def _encode(self, batch: List) -> bytes:
+        rows = [
+            (row.created_at.isoformat() if row.created_at else '',
+             row.city_name, row.request_type, row.success)
+            for row in batch
+        ]
+        if self.fmt == 'csv':
+            return self._encode_csv(rows)
+        return ''.join(
+            json.dumps(dict(zip(CSV_HEADER, row)), ensure_ascii=False) + '\n' for row in rows
+        ).encode('utf-8')
+
+    @staticmethod
+    def _encode_csv(rows, bom: bool = False) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        # BOM - чтобы Excel открыл кириллицу в UTF-8
+        return buffer.getvalue().encode('utf-8-sig' if bom else 'utf-8')
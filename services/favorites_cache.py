@@ -0,0 +1,112 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Set, Tuple
+
+from config import settings
+from database.crud import FavoriteCityCRUD
+from database.engine import Database
+from .cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+
+class FavoritesCache:
+    """Read-through кеш избранных городов пользователя
+
+    Уровни: локальный LRU (короткий TTL) -> Redis -> БД. После добавления
+    или удаления города кеш пользователя перезаписывается актуальным
+    списком, поэтому проверки членства и лимита не ходят в БД.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        cache: RedisCache,
+        max_users: int = settings.FAVORITES_CACHE_SIZE,
+        ttl: int = settings.FAVORITES_CACHE_TTL,
+        local_ttl: int = settings.FAVORITES_LOCAL_TTL,
+        limit: int = settings.MAX_FAVORITE_CITIES
+    ):
+        self.db = db
+        self.cache = cache
+        self.max_users = max_users
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.limit = limit
+        self._local: OrderedDict[int, Tuple[float, Set[str]]] = OrderedDict()
+
+    async def get(self, user_id: int) -> Set[str]:
+        """Множество избранных городов пользователя"""
+        cities = self._get_local(user_id)
+        if cities is not None:
+            return cities
+
+        cached = await self.cache.get(self._key(user_id))
+        if cached is not None:
+            cities = set(cached)
+        else:
+            cities = set(await self.db.read(FavoriteCityCRUD.get_names, user_id))
+            await self._store_remote(user_id, cities)
+
+        self._store_local(user_id, cities)
+        return cities
+
+    async def contains(self, user_id: int, city_name: str) -> bool:
+        """Проверить, в избранном ли город"""
+        return city_name in await self.get(user_id)
+
+    async def count(self, user_id: int) -> int:
+        """Количество избранных городов"""
+        return len(await self.get(user_id))
+
+    async def add(self, user_id: int, city_name: str, country_code: str = None) -> bool:
+        """Добавить город в избранное и обновить кеш (False - достигнут лимит)"""
+        favorite = await self.db.write(FavoriteCityCRUD.add, user_id, city_name, country_code, self.limit)
+        if favorite is None:
+            # Кеш отставал от БД: перечитываем актуальный список
+            await self._replace(user_id, set(await self.db.read(FavoriteCityCRUD.get_names, user_id)))
+            return False
+        
+        cities = set(await self.get(user_id))
+        cities.add(city_name)
+        await self._replace(user_id, cities)
+        return True
+
+    async def remove(self, user_id: int, city_name: str) -> bool:
+        """Удалить город из избранного и обновить кеш"""
+        removed = await self.db.write(FavoriteCityCRUD.remove, user_id, city_name)
+        cities = set(await self.get(user_id))
+        cities.discard(city_name)
+        await self._replace(user_id, cities)
+        return removed
+
+    async def _replace(self, user_id: int, cities: Set[str]):
+        """Перезаписать кеш пользователя после изменения"""
+        self._store_local(user_id, cities)
+        await self._store_remote(user_id, cities)
+
+    def _get_local(self, user_id: int) -> Optional[Set[str]]:
+        entry = self._local.get(user_id)
+        if entry is None:
+            return None
+
+        expires_at, cities = entry
+        if expires_at < time.monotonic():
+            del self._local[user_id]
+            return None
+
+        self._local.move_to_end(user_id)
+        return cities
+
+    def _store_local(self, user_id: int, cities: Set[str]):
+        self._local[user_id] = (time.monotonic() + self.local_ttl, cities)
+        self._local.move_to_end(user_id)
+        if len(self._local) > self.max_users:
+            self._local.popitem(last=False)
+
+    async def _store_remote(self, user_id: int, cities: Set[str]):
+        await self.cache.set(self._key(user_id), sorted(cities), self.ttl)
+
+    def _key(self, user_id: int) -> str:
+        return self.cache.make_key('favorites', user_id)
@@ -1,6 +1,9 @@
 
 from datetime import datetime
 from typing import Dict, List
+from zoneinfo import ZoneInfo
+
+from config import settings
 
 
 class WeatherFormatter:
@@ -56,8 +59,21 @@ class WeatherFormatter:
         if from_cache:
             text += "\n📦 <i>Данные из кеша</i>"
         
+        if data.get('stale_at'):
+            text += cls.format_stale(data['stale_at'])
+        
         return text
     
+    @staticmethod
+    def format_stale(stale_at: float) -> str:
+        """Пометка устаревших данных (API недоступен)"""
+        observed = datetime.fromtimestamp(stale_at, ZoneInfo(settings.NOTIFICATION_TIMEZONE))
+        if observed.date() == datetime.now(observed.tzinfo).date():
+            moment = observed.strftime('%H:%M')
+        else:
+            moment = observed.strftime('%d.%m %H:%M')
+        return f"\n🕐 <i>Сервис погоды недоступен, данные от {moment}</i>"
+    
     @classmethod
     def format_forecast(cls, city: str, forecast_data: List[Dict]) -> str:
         """Форматирование прогноза"""
@@ -79,6 +95,9 @@ class WeatherFormatter:
                 f"   💧 {day['humidity']}% | 🌪 {day['wind_speed']} м/с\n\n"
             )
         
+        if forecast_data and forecast_data[0].get('stale_at'):
+            text += cls.format_stale(forecast_data[0]['stale_at'])
+        
         return text
     
     @staticmethod
@@ -0,0 +1,134 @@
+import asyncio
+import heapq
+import logging
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from config import settings
+from database.crud import WeatherRequestCRUD
+from database.engine import Database
+
+logger = logging.getLogger(__name__)
+
+# Базовый справочник: крупные города (порядок - приоритет при равной популярности)
+CITIES = (
+    "Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань",
+    "Нижний Новгород", "Челябинск", "Самара", "Омск", "Ростов-на-Дону",
+    "Уфа", "Красноярск", "Воронеж", "Пермь", "Волгоград", "Краснодар",
+    "Саратов", "Тюмень", "Тольятти", "Ижевск", "Барнаул", "Ульяновск",
+    "Иркутск", "Хабаровск", "Ярославль", "Владивосток", "Махачкала",
+    "Томск", "Оренбург", "Кемерово", "Новокузнецк", "Рязань", "Астрахань",
+    "Набережные Челны", "Пенза", "Киров", "Липецк", "Чебоксары", "Калининград",
+    "Тула", "Ставрополь", "Курск", "Улан-Удэ", "Сочи", "Тверь", "Магнитогорск",
+    "Иваново", "Брянск", "Белгород", "Сургут", "Владимир", "Архангельск",
+    "Чита", "Калуга", "Смоленск", "Волжский", "Курган", "Череповец", "Орёл",
+    "Вологда", "Саранск", "Владикавказ", "Якутск", "Мурманск", "Подольск",
+    "Тамбов", "Грозный", "Стерлитамак", "Петрозаводск", "Кострома",
+    "Нижневартовск", "Новороссийск", "Йошкар-Ола", "Сыктывкар", "Нальчик",
+    "Анапа", "Геленджик", "Псков", "Великий Новгород", "Петропавловск-Камчатский",
+    "Южно-Сахалинск", "Норильск", "Минск", "Киев", "Алматы", "Астана",
+    "Ташкент", "Бишкек", "Тбилиси", "Ереван", "Баку", "Рига", "Вильнюс",
+    "Таллин", "London", "Paris", "Berlin", "Madrid", "Rome", "Prague",
+    "Vienna", "Warsaw", "Istanbul", "Antalya", "Dubai", "New York",
+    "Los Angeles", "Tokyo", "Beijing", "Bangkok", "Phuket",
+)
+
+
+def normalize(text: str) -> str:
+    """Ключ поиска: нижний регистр, ё -> е, одиночные пробелы"""
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+class Gazetteer:
+    """Префиксный индекс названий городов для inline-подсказок
+
+    Отсортированный список (ключ, город): все города с префиксом -
+    непрерывный диапазон, который находится bisect за O(log n). Каждый
+    город индексируется и по началам слов ("петербург" находит
+    Санкт-Петербург). Вес - популярность за последний месяц из
+    почасовых агрегатов (обновляется в фоне), базовый справочник
+    гарантирует ответы с первого запуска.
+    """
+
+    WORD_SPLIT = re.compile(r"[\s\-]+")
+
+    def __init__(
+        self,
+        db: Database,
+        size: int = settings.INLINE_GAZETTEER_SIZE,
+        refresh_interval: int = settings.INLINE_GAZETTEER_REFRESH
+    ):
+        self.db = db
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self._keys: List[str] = []
+        self._cities: List[str] = []
+        self._weights: Dict[str, float] = {}
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._build({city: -i for i, city in enumerate(CITIES)})
+
+    def start(self):
+        """Запуск фонового обновления популярности"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановка фонового обновления"""
+        self._stopped.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+    def search(self, prefix: str, limit: int = settings.INLINE_RESULTS) -> List[str]:
+        """Самые популярные города, название которых (или слово в нем) начинается с prefix"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return self.popular(limit)
+
+        matches = set()
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            matches.add(self._cities[i])
+            i += 1
+        return heapq.nlargest(limit, matches, key=self._weights.__getitem__)
+
+    def popular(self, limit: int = settings.INLINE_RESULTS) -> List[str]:
+        """Самые популярные города"""
+        return heapq.nlargest(limit, self._weights, key=self._weights.__getitem__)
+
+    async def refresh(self):
+        """Перечитать популярность городов из БД"""
+        try:
+            rows = await self.db.read(WeatherRequestCRUD.get_popular_cities, 30, self.size)
+        except Exception as e:
+            logger.error(f"❌ Не удалось обновить справочник городов: {e}")
+            return
+
+        weights = {city: -i for i, city in enumerate(CITIES)}
+        for city, count in rows:
+            # Запрошенные города выше справочника, между собой - по числу запросов
+            weights[city] = max(weights.get(city, 0), 0) + int(count)
+        self._build(weights)
+
+    def _build(self, weights: Dict[str, float]):
+        index = []
+        for city in weights:
+            key = normalize(city)
+            index.append((key, city))
+            for word in self.WORD_SPLIT.split(key)[1:]:
+                if word:
+                    index.append((word, city))
+        index.sort()
+        # Новый индекс подменяется целиком: поиск не видит полупостроенный
+        self._keys, self._cities = [key for key, _ in index], [city for _, city in index]
+        self._weights = weights
+
+    async def _run(self):
+        await self.refresh()
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                await self.refresh()
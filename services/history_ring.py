@@ -0,0 +1,106 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import settings
+from database.crud import WeatherRequestCRUD
+from database.engine import Database
+from .cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryRing:
+    """Кольцо последних запросов пользователя в Redis
+
+    Первая страница /history читается из ограниченного списка
+    history:{user_id} без обращения к SQL. Список пополняется из
+    записанных пачек истории, а при промахе заполняется из БД - только
+    если с момента чтения в него ничего не записывалось (версия списка).
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        cache: RedisCache,
+        size: int = settings.HISTORY_PAGE_SIZE,
+        ttl: int = settings.HISTORY_RING_TTL
+    ):
+        self.db = db
+        self.cache = cache
+        self.size = size
+        self.ttl = ttl
+
+    async def record_requests(self, batch: List[dict]):
+        """Дописать записанную пачку в кольца пользователей (хук RequestLogQueue)"""
+        lists: Dict[str, List[dict]] = defaultdict(list)
+        for record in batch:
+            lists[self._key(record['user_id'])].append(self._encode(record))
+        await self.cache.push_capped(lists, self.size, self.ttl)
+
+    async def recent(self, user_id: int) -> List[dict]:
+        """Последние запросы пользователя, новые первыми"""
+        key = self._key(user_id)
+        cached = await self.cache.get_list(key, self.size)
+        if cached is not None:
+            return self._unique(self._decode(entry) for entry in cached)
+
+        # Версия - до чтения БД: пачка, записанная после него, отменит заполнение
+        version = await self.cache.list_version(key)
+        rows = await self.db.read(WeatherRequestCRUD.get_user_history, user_id, limit=self.size)
+        entries = [self.row_to_entry(row) for row in rows]
+        if version is not None:
+            await self.cache.fill_list(key, [self._encode(e) for e in entries], self.ttl, version)
+        return entries
+
+    async def older(self, user_id: int, before: datetime, before_id: Optional[int] = None) -> List[dict]:
+        """Страница истории старше (before, before_id) (keyset по индексу user_id, created_at)"""
+        rows = await self.db.read(
+            WeatherRequestCRUD.get_user_history, user_id, limit=self.size,
+            before=before, before_id=before_id
+        )
+        return [self.row_to_entry(row) for row in rows]
+
+    @staticmethod
+    def _unique(entries) -> List[dict]:
+        """Без повторов: пачка, попавшая и в заполнение из БД, и в LPUSHX"""
+        seen = set()
+        unique = []
+        for entry in entries:
+            if entry['id'] is not None:
+                if entry['id'] in seen:
+                    continue
+                seen.add(entry['id'])
+            unique.append(entry)
+        return unique
+
+    @staticmethod
+    def row_to_entry(row) -> dict:
+        return {
+            'id': row.id,
+            'city_name': row.city_name,
+            'success': row.success,
+            'created_at': row.created_at
+        }
+
+    @staticmethod
+    def _encode(entry: dict) -> dict:
+        return {
+            'id': entry.get('id'),
+            'city_name': entry['city_name'],
+            'success': entry['success'],
+            'created_at': entry['created_at'].isoformat()
+        }
+
+    @staticmethod
+    def _decode(entry: dict) -> dict:
+        return {
+            'id': entry.get('id'),
+            'city_name': entry['city_name'],
+            'success': entry['success'],
+            'created_at': datetime.fromisoformat(entry['created_at'])
+        }
+
+    def _key(self, user_id: int) -> str:
+        return self.cache.make_key('history', user_id)
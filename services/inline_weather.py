@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+
+from config import settings
+from services.cache import RedisCache
+from services.formatter import WeatherFormatter
+from services.gazetteer import Gazetteer, normalize
+from services.metrics import INLINE_QUERIES
+from services.weather_api import WeatherAPI, WeatherAPIError
+from utils.validators import CityValidator
+
+logger = logging.getLogger(__name__)
+
+
+class InlineWeather:
+    """Ответы на inline-запросы (@bot Москва)
+
+    Inline-запрос приходит на каждое нажатие клавиши, поэтому:
+    города подбираются по префиксному индексу (Gazetteer), готовые
+    статьи лежат в локальном LRU, затем - погода из Redis. К API
+    обращаются только после паузы debounce и только если пользователь
+    за это время не набрал следующий запрос: промежуточные запросы
+    остаются без ответа.
+    """
+
+    def __init__(
+        self,
+        cache: RedisCache,
+        gazetteer: Gazetteer,
+        debounce: float = settings.INLINE_DEBOUNCE,
+        cache_size: int = settings.INLINE_CACHE_SIZE,
+        local_ttl: int = settings.INLINE_LOCAL_TTL
+    ):
+        self.api = WeatherAPI(cache)
+        self.gazetteer = gazetteer
+        self.debounce = debounce
+        self.cache_size = cache_size
+        self.local_ttl = local_ttl
+        self._articles: OrderedDict[str, Tuple[float, InlineQueryResultArticle]] = OrderedDict()
+        self._latest: Dict[int, int] = {}
+        self._seq = 0
+
+    async def resolve(self, user_id: int, query: str) -> Optional[Tuple[List[InlineQueryResultArticle], bool]]:
+        """Статьи для запроса и признак полноты (None - запрос устарел, не отвечать)"""
+        cities = self.gazetteer.search(query)
+        if not cities:
+            city = CityValidator.sanitize(query)
+            if city is None:
+                return [], True
+            cities = [city]
+
+        found: Dict[str, InlineQueryResultArticle] = {}
+        missing = []
+        for city in cities:
+            article = self._get_local(city)
+            if article:
+                found[city] = article
+            else:
+                missing.append(city)
+
+        if missing:
+            cached = await asyncio.gather(*(self.api.get_cached_weather(city) for city in missing))
+            for city, weather in zip(missing, cached):
+                if weather:
+                    found[city] = self._store_local(city, weather)
+            missing = [city for city in missing if city not in found]
+            INLINE_QUERIES.labels('redis' if not missing else 'upstream').inc()
+        else:
+            INLINE_QUERIES.labels('local').inc()
+
+        complete = True
+        if missing:
+            if not await self._settled(user_id):
+                INLINE_QUERIES.labels('debounced').inc()
+                return None
+
+            fetched = await asyncio.gather(
+                *(self.api.fetch_current_weather(city) for city in missing), return_exceptions=True
+            )
+            for city, weather in zip(missing, fetched):
+                if isinstance(weather, WeatherAPIError):
+                    complete = False
+                elif isinstance(weather, BaseException):
+                    logger.error(f"Ошибка inline-запроса погоды для {city}: {weather}")
+                    complete = False
+                else:
+                    found[city] = self._store_local(city, weather)
+
+        # Разные написания одного города - одна статья
+        articles = {}
+        for city in cities:
+            if city in found:
+                articles.setdefault(found[city].id, found[city])
+        return list(articles.values()), complete
+
+    async def _settled(self, user_id: int) -> bool:
+        """Дождаться паузы в наборе: False, если за это время пришел новый запрос"""
+        self._seq += 1
+        seq = self._latest[user_id] = self._seq
+        await asyncio.sleep(self.debounce)
+        if self._latest.get(user_id) != seq:
+            return False
+        del self._latest[user_id]
+        return True
+
+    def _get_local(self, city: str) -> Optional[InlineQueryResultArticle]:
+        key = normalize(city)
+        entry = self._articles.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._articles[key]
+            return None
+        self._articles.move_to_end(key)
+        return entry[1]
+
+    def _store_local(self, city: str, weather: dict) -> InlineQueryResultArticle:
+        article = self.render(weather)
+        self._articles[normalize(city)] = (time.monotonic() + self.local_ttl, article)
+        self._articles.move_to_end(normalize(city))
+        if len(self._articles) > self.cache_size:
+            self._articles.popitem(last=False)
+        return article
+
+    @staticmethod
+    def render(weather: dict) -> InlineQueryResultArticle:
+        """Готовая статья: заголовок с температурой и полное сообщение о погоде"""
+        return InlineQueryResultArticle(
+            id=hashlib.md5(normalize(weather['city']).encode()).hexdigest(),
+            title=f"{weather['city']}, {weather['country']}: {weather['temp']:+d}°C",
+            description=f"{weather['description']}, ощущается как {weather['feels_like']:+d}°C",
+            input_message_content=InputTextMessageContent(
+                message_text=WeatherFormatter.format_current_weather(weather)
+            )
+        )
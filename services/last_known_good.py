@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Tuple, Union
+
+from config import settings
+from database.crud import WeatherSnapshotCRUD
+from database.engine import Database
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Union[dict, list]
+
+
+class LastKnownGood:
+    """Последние успешные ответы API в БД (write-behind)
+
+    Каждый успешный ответ OpenWeather запоминается в памяти и раз в
+    flush_interval записывается пачкой одним upsert (повтор ключа -
+    только последнее значение). Когда API недоступен, а в Redis данных
+    уже нет, WeatherAPI отдает снимок отсюда с пометкой времени.
+    """
+
+    def __init__(self, db: Database, flush_interval: int = settings.LKG_FLUSH_INTERVAL):
+        self.db = db
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Tuple[str, datetime]] = {}
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запуск фоновой записи снимков"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def record(self, key: str, data: Snapshot):
+        """Запомнить успешный ответ (запись в БД - в фоне)"""
+        self._pending[key] = (json.dumps(data, ensure_ascii=False), datetime.utcnow())
+
+    async def get(self, key: str) -> Optional[Tuple[Snapshot, datetime]]:
+        """Последний снимок и время наблюдения (UTC)"""
+        snapshot = self._pending.get(key)
+        if snapshot is None:
+            try:
+                snapshot = await self.db.read(WeatherSnapshotCRUD.get, key)
+            except Exception as e:
+                logger.error(f"❌ Ошибка чтения снимка погоды {key}: {e}")
+                return None
+        if snapshot is None:
+            return None
+        return json.loads(snapshot[0]), snapshot[1]
+
+    async def close(self):
+        """Остановка с финальной записью"""
+        self._stopped.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+    async def flush(self):
+        """Записать накопленные снимки одним upsert"""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        try:
+            await self.db.write(WeatherSnapshotCRUD.upsert_many, pending)
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи снимков погоды ({len(pending)}): {e}")
+
+    async def _run(self):
+        """Периодическая запись снимков"""
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
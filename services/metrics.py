@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Границы для быстрых операций (Redis, SQLite) и для сетевых запросов
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+SLOW_BUCKETS = (.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+HANDLER_LATENCY = Histogram(
+    'bot_handler_seconds', 'Время обработки апдейта хендлером',
+    ['router', 'handler', 'event'], buckets=SLOW_BUCKETS
+)
+HANDLER_ERRORS = Counter(
+    'bot_handler_errors_total', 'Исключения в хендлерах', ['router', 'handler', 'event']
+)
+UPSTREAM_LATENCY = Histogram(
+    'bot_upstream_seconds', 'Время запроса к OpenWeather (одна попытка)',
+    ['endpoint', 'status'], buckets=SLOW_BUCKETS
+)
+UPSTREAM_RETRIES = Counter(
+    'bot_upstream_retries_total', 'Повторы запросов к OpenWeather', ['endpoint']
+)
+UPSTREAM_FALLBACKS = Counter(
+    'bot_upstream_fallbacks_total', 'Ответы из last-known-good при недоступности OpenWeather', ['endpoint']
+)
+UPSTREAM_CIRCUIT_OPEN = Gauge('bot_upstream_circuit_open', 'Размыкатель OpenWeather разомкнут (1)')
+REDIS_LATENCY = Histogram(
+    'bot_redis_seconds', 'Время операции Redis', ['op'], buckets=FAST_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    'bot_cache_requests_total', 'Обращения к кешу по префиксу ключа', ['prefix', 'result']
+)
+DB_LATENCY = Histogram(
+    'bot_db_seconds', 'Время операции БД (включая ожидание потока)',
+    ['mode', 'op'], buckets=FAST_BUCKETS
+)
+RATE_LIMITED = Counter(
+    'bot_rate_limited_total', 'Апдейты, отклоненные rate limit', ['event']
+)
+WEBHOOK_REJECTED = Counter(
+    'bot_webhook_rejected_total', 'Отклоненные запросы вебхука', ['reason']
+)
+SEND_RETRY_AFTER = Counter(
+    'bot_send_retry_after_total', 'Ответы Telegram RetryAfter при массовых отправках'
+)
+BROADCAST_MESSAGES = Counter(
+    'bot_broadcast_messages_total', 'Сообщения рассылки по результату', ['result']
+)
+NOTIFICATIONS = Counter(
+    'bot_notifications_total', 'Ежедневные уведомления по результату', ['result']
+)
+INLINE_QUERIES = Counter(
+    'bot_inline_queries_total', 'Inline-запросы по источнику ответа', ['source']
+)
+STARTUP_SECONDS = Gauge('bot_startup_seconds', 'Время фаз запуска (секунды)', ['phase'])
+LOOP_LAG = Histogram(
+    'bot_event_loop_lag_seconds', 'Задержка event loop', buckets=FAST_BUCKETS
+)
+SCHEDULER_RUNNING = Gauge('bot_scheduler_running', 'Апдейтов в обработке')
+SCHEDULER_WAITING = Gauge('bot_scheduler_waiting', 'Апдейтов в очередях чатов')
+SCHEDULER_MAX_DEPTH = Gauge('bot_scheduler_max_chat_depth', 'Самая длинная очередь чата')
+
+
+def key_prefix(key: str) -> str:
+    """Префикс ключа кеша для метки (weather:moscow -> weather)"""
+    return key.split(':', 1)[0]
+
+
+class MetricsServer:
+    """Встроенный HTTP-сервер /metrics и замер задержки event loop"""
+
+    def __init__(self, port: int = settings.METRICS_PORT, lag_interval: float = 0.5):
+        self.port = port
+        self.lag_interval = lag_interval
+        self._runner: Optional[web.AppRunner] = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def watch_scheduler(self, scheduler):
+        """Отдавать состояние FairScheduler как gauges (считается при сборе)"""
+        SCHEDULER_RUNNING.set_function(lambda: scheduler.running)
+        SCHEDULER_WAITING.set_function(lambda: scheduler.metrics()['waiting'])
+        SCHEDULER_MAX_DEPTH.set_function(lambda: scheduler.metrics()['max_depth'])
+
+    async def start(self):
+        """Запуск сервера метрик"""
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, port=self.port).start()
+        self._lag_task = asyncio.create_task(self._measure_lag())
+        logger.info(f"📈 Метрики Prometheus: http://0.0.0.0:{self.port}/metrics")
+
+    async def close(self):
+        """Остановка сервера метрик"""
+        if self._lag_task:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+    async def _measure_lag(self):
+        """Насколько позже запланированного просыпается event loop"""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            LOOP_LAG.observe(max(0.0, time.perf_counter() - started - self.lag_interval))
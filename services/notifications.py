@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from aiogram import Bot
+
+from config import settings
+from database.crud import UserCRUD, UserSettingsCRUD
+from database.engine import Database
+from services.cache import RedisCache
+from services.formatter import WeatherFormatter
+from services.metrics import NOTIFICATIONS
+from services.send_governor import SendGovernor
+from services.weather_api import WeatherAPI, WeatherAPIError
+
+logger = logging.getLogger(__name__)
+
+Slot = Tuple[str, str]  # (часовой пояс, локальное время HH:MM)
+
+HEADERS = {
+    'ru': "🌅 <b>Доброе утро! Погода на сегодня</b>",
+    'en': "🌅 <b>Good morning! Today's weather</b>"
+}
+
+
+def next_fire(slot: Slot, after: float) -> float:
+    """Ближайший момент (unix time) локального времени слота после after"""
+    zone = ZoneInfo(slot[0])
+    hour, minute = map(int, slot[1].split(':'))
+    local = datetime.fromtimestamp(after, zone)
+    candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate.timestamp() <= after:
+        candidate = (local + timedelta(days=1)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return candidate.timestamp()
+
+
+def render(weather: dict, unit: str, language: str) -> str:
+    """Текст уведомления: один раз на (город, единицы, язык)"""
+    text = f"{HEADERS.get(language, HEADERS['ru'])}\n\n{WeatherFormatter.format_current_weather(weather)}"
+    if unit == 'fahrenheit':
+        text += (
+            f"\n🌡 {weather['temp'] * 9 / 5 + 32:+.0f}°F "
+            f"(ощущается как {weather['feels_like'] * 9 / 5 + 32:+.0f}°F)"
+        )
+    return text
+
+
+class NotificationScheduler:
+    """Ежедневные уведомления о погоде в локальное время пользователя
+
+    В куче хранятся не пользователи, а слоты (часовой пояс, время):
+    их единицы-десятки, даже при 100k подписчиков. Когда слот наступает,
+    его подписчики читаются из БД пачками, группируются по городу -
+    погода каждого города запрашивается один раз, текст рендерится
+    один раз на (город, единицы, язык) - и рассылаются через SendGovernor.
+    Redis-блокировка слота на день не дает другим экземплярам
+    отправить уведомления повторно.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        db: Database,
+        cache: RedisCache,
+        governor: SendGovernor,
+        refresh_interval: int = settings.NOTIFICATION_REFRESH_INTERVAL,
+        batch_size: int = settings.NOTIFICATION_BATCH_SIZE,
+        concurrency: int = settings.BROADCAST_CONCURRENCY
+    ):
+        self.bot = bot
+        self.db = db
+        self.cache = cache
+        self.governor = governor
+        self.api = WeatherAPI(cache)
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.owner = uuid.uuid4().hex
+        self._heap: List[Tuple[float, str, str]] = []
+        self._scheduled: Set[Slot] = set()
+        self._slots: Set[Slot] = set()
+        self._fires: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Загрузить слоты и запустить планировщик"""
+        await self.refresh()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        logger.info(f"🔔 Уведомления: слотов {len(self._slots)}")
+
+    async def close(self):
+        """Остановка: идущие отправки слотов дорабатывают"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
+        if self._fires:
+            await asyncio.gather(*self._fires, return_exceptions=True)
+
+    def add_slot(self, timezone: str, notify_time: str):
+        """Запланировать слот сразу (подписка в этом процессе)
+
+        На воркере без запущенного планировщика ничего не отправляется:
+        слот подхватит refresh() основного экземпляра.
+        """
+        slot = (timezone, notify_time)
+        self._slots.add(slot)
+        self._schedule(slot, time.time())
+        self._wakeup.set()
+
+    async def refresh(self):
+        """Перечитать набор слотов из БД (подписки могли прийти через другие экземпляры)"""
+        try:
+            slots = await self.db.read(
+                UserSettingsCRUD.get_notification_slots,
+                settings.NOTIFICATION_TIME, settings.NOTIFICATION_TIMEZONE
+            )
+        except Exception as e:
+            logger.error(f"❌ Не удалось загрузить слоты уведомлений: {e}")
+            return
+
+        self._slots = set(slots)
+        now = time.time()
+        for slot in self._slots - self._scheduled:
+            self._schedule(slot, now)
+
+    def _schedule(self, slot: Slot, after: float):
+        if slot in self._scheduled:
+            return
+        try:
+            fire_at = next_fire(slot, after)
+        except (ZoneInfoNotFoundError, ValueError) as e:
+            logger.warning(f"⚠️ Некорректный слот уведомлений {slot}: {e}")
+            return
+        heapq.heappush(self._heap, (fire_at, *slot))
+        self._scheduled.add(slot)
+
+    async def _run(self):
+        """Цикл: спим до ближайшего слота или обновления набора слотов"""
+        next_refresh = time.time() + self.refresh_interval
+        while not self._stopped.is_set():
+            now = time.time()
+            if now >= next_refresh:
+                await self.refresh()
+                next_refresh = now + self.refresh_interval
+                continue
+
+            if self._heap and self._heap[0][0] <= now:
+                fire_at, *slot = heapq.heappop(self._heap)
+                slot = tuple(slot)
+                self._scheduled.discard(slot)
+                if slot in self._slots:
+                    day = datetime.fromtimestamp(fire_at, ZoneInfo(slot[0])).date().isoformat()
+                    task = asyncio.create_task(self._fire(slot, day))
+                    self._fires.add(task)
+                    task.add_done_callback(self._fires.discard)
+                    self._schedule(slot, fire_at)
+                continue
+
+            wake = min(next_refresh, self._heap[0][0]) if self._heap else next_refresh
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wake - now)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _fire(self, slot: Slot, day: str):
+        """Отправить уведомления всем подписчикам слота"""
+        lock_key = self.cache.make_key('notify', slot[0], slot[1], day)
+        if not await self.cache.acquire_lock(lock_key, self.owner, 24 * 3600):
+            return
+
+        started = time.monotonic()
+        weather: Dict[str, Optional[dict]] = {}
+        rendered: Dict[Tuple[str, str, str], str] = {}
+        totals = defaultdict(int)
+        after_id = 0
+
+        while True:
+            batch = await self.db.read(
+                UserSettingsCRUD.get_due_subscribers, slot[0], slot[1], after_id, self.batch_size,
+                settings.NOTIFICATION_TIME, settings.NOTIFICATION_TIMEZONE
+            )
+            if not batch:
+                break
+            after_id = batch[-1][0]
+
+            # Группировка по городу: погода города запрашивается один раз на слот
+            groups: Dict[str, List[tuple]] = defaultdict(list)
+            for row in batch:
+                groups[row[2].strip().lower()].append(row)
+            await self._fetch_weather([city for city in groups if city not in weather], weather)
+
+            messages = []
+            for city, rows in groups.items():
+                if weather[city] is None:
+                    totals['failed'] += len(rows)
+                    continue
+                for user_id, telegram_id, _, unit, language in rows:
+                    language = (language or settings.DEFAULT_LANGUAGE)[:2]
+                    if language not in settings.SUPPORTED_LANGUAGES:
+                        language = settings.DEFAULT_LANGUAGE
+                    key = (city, unit or 'celsius', language)
+                    if key not in rendered:
+                        rendered[key] = render(weather[city], *key[1:])
+                    messages.append((user_id, telegram_id, rendered[key]))
+
+            results = await self._send(messages)
+            blocked = [user_id for (user_id, _, _), result in zip(messages, results) if result == 'blocked']
+            if blocked:
+                await self.db.write(UserCRUD.deactivate_many, blocked)
+            for result in results:
+                totals[result] += 1
+                NOTIFICATIONS.labels(result).inc()
+
+        logger.info(
+            f"🔔 Слот {slot[1]} {slot[0]}: доставлено {totals['sent']}, "
+            f"заблокировали {totals['blocked']}, ошибок {totals['failed']}, "
+            f"городов {len(weather)}, текстов {len(rendered)}, {time.monotonic() - started:.1f} с"
+        )
+
+    async def _fetch_weather(self, cities: List[str], weather: Dict[str, Optional[dict]]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(city: str):
+            async with semaphore:
+                try:
+                    weather[city] = await self.api.get_current_weather(city)
+                except WeatherAPIError as e:
+                    logger.warning(f"⚠️ Уведомления: нет погоды для {city}: {e}")
+                    weather[city] = None
+
+        await asyncio.gather(*(fetch(city) for city in cities))
+
+    async def _send(self, messages: List[Tuple[int, int, str]]) -> List[str]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(telegram_id: int, text: str) -> str:
+            async with semaphore:
+                return await self.governor.deliver(self.bot, telegram_id, text)
+
+        return await asyncio.gather(*(send(telegram_id, text) for _, telegram_id, text in messages))
@@ -0,0 +1,120 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from config import settings
+from utils.validators import RateLimiter
+from .cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+# GCRA: в Redis хранится только TAT (теоретическое время следующего запроса).
+# Время берется из Redis, поэтому реплики не зависят от расхождения часов.
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+
+local new_tat = tat + interval
+local allow_at = new_tat - tolerance
+if now < allow_at then
+    return {0, math.ceil((allow_at - now) * 1000)}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, 0}
+"""
+
+
+class _UserState:
+    """Локальное состояние пользователя для быстрого пути"""
+    __slots__ = ('last_seen', 'blocked_until', 'flood_warned')
+
+    def __init__(self):
+        self.last_seen = 0.0
+        self.blocked_until = 0.0
+        self.flood_warned = False
+
+
+class DistributedRateLimiter:
+    """Rate limit, общий для всех реплик бота (GCRA в Redis)
+
+    Быстрый путь без Redis: защита от флуда (не чаще RATE_LIMIT секунд)
+    и уже известная блокировка до retry_after. Без Redis используется
+    локальный GCRA с теми же параметрами. Память - не больше max_users.
+    """
+
+    def __init__(
+        self,
+        cache: RedisCache,
+        max_requests: int = settings.MAX_REQUESTS_PER_WINDOW,
+        time_window: int = settings.RATE_LIMIT_WINDOW,
+        min_interval: float = settings.RATE_LIMIT,
+        max_users: int = settings.RATE_LIMIT_CACHE_SIZE
+    ):
+        self.cache = cache
+        self.interval = time_window / max_requests
+        self.tolerance = time_window
+        self.min_interval = min_interval
+        self.max_users = max_users
+        self.fallback = RateLimiter(max_requests, time_window, max_users)
+        self._states: OrderedDict[int, _UserState] = OrderedDict()
+        self._script = None
+
+    async def check(self, user_id: int) -> Tuple[bool, float, bool]:
+        """Проверить запрос пользователя
+
+        :return: (разрешен, секунд до следующей попытки, нужно ли предупредить)
+        """
+        now = time.monotonic()
+        state = self._state(user_id)
+
+        if now < state.blocked_until:
+            return False, state.blocked_until - now, False
+
+        if now - state.last_seen < self.min_interval:
+            notify = not state.flood_warned
+            state.flood_warned = True
+            return False, self.min_interval - (now - state.last_seen), notify
+
+        state.last_seen = now
+        state.flood_warned = False
+
+        allowed, retry_after = await self._acquire(user_id)
+        if not allowed:
+            state.blocked_until = now + retry_after
+        return allowed, retry_after, not allowed
+
+    async def _acquire(self, user_id: int) -> Tuple[bool, float]:
+        """Списать запрос в Redis (или локально, если Redis недоступен)"""
+        if self.cache.redis:
+            try:
+                if self._script is None:
+                    self._script = self.cache.redis.register_script(GCRA_SCRIPT)
+                allowed, retry_ms = await self._script(
+                    keys=[self.cache.make_key('ratelimit', user_id)],
+                    args=[self.interval, self.tolerance]
+                )
+                return bool(allowed), retry_ms / 1000
+            except Exception as e:
+                logger.error(f"Ошибка rate limit в Redis: {e}")
+
+        allowed, retry_after = self.fallback.is_allowed(user_id)
+        return allowed, float(retry_after)
+
+    def _state(self, user_id: int) -> _UserState:
+        state = self._states.get(user_id)
+        if state is None:
+            state = self._states[user_id] = _UserState()
+            if len(self._states) > self.max_users:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(user_id)
+        return state
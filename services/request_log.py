@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from config import settings
+from database.crud import WeatherRequestCRUD
+from database.engine import Database
+
+logger = logging.getLogger(__name__)
+
+
+class RequestLogQueue:
+    """Отложенная (write-behind) запись истории запросов погоды
+
+    Записи копятся в ограниченной очереди и сбрасываются в БД пачками
+    (одним INSERT) раз в flush_interval мс или по достижении batch_size.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        batch_size: int = settings.REQUEST_LOG_BATCH_SIZE,
+        flush_interval: int = settings.REQUEST_LOG_FLUSH_INTERVAL,
+        max_size: int = settings.REQUEST_LOG_QUEUE_SIZE,
+        overflow: str = settings.REQUEST_LOG_OVERFLOW
+    ):
+        """
+        :param db: доступ к БД (запись идет через писателя)
+        :param batch_size: максимум записей в одной пачке
+        :param flush_interval: интервал сброса (миллисекунды)
+        :param max_size: максимум записей в очереди
+        :param overflow: drop - отбрасывать новые записи, block - ждать места до flush_interval
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval / 1000
+        self.overflow = overflow
+        self.written = 0
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._batch_ready = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        self._flush_hooks: List[Callable[[List[dict]], Awaitable[None]]] = []
+
+    def add_flush_hook(self, hook: Callable[[List[dict]], Awaitable[None]]):
+        """Подписаться на записанные пачки (статистика, кеши поверх истории)"""
+        self._flush_hooks.append(hook)
+
+    def start(self):
+        """Запуск фонового сброса"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def log(self, user_id: int, city_name: str,
+                  request_type: str, success: bool = True) -> bool:
+        """Поставить запись о запросе в очередь
+
+        :return: False, если запись отброшена
+        """
+        if self._closing:
+            self.dropped += 1
+            logger.warning("⚠️ Запись истории отброшена: очередь закрывается")
+            return False
+
+        record = {
+            'user_id': user_id,
+            'city_name': city_name,
+            'request_type': request_type,
+            'success': success,
+            'created_at': datetime.utcnow()
+        }
+
+        try:
+            if self.overflow == 'block':
+                await asyncio.wait_for(self._queue.put(record), timeout=self.flush_interval)
+            else:
+                self._queue.put_nowait(record)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"⚠️ Очередь истории переполнена, отброшено записей: {self.dropped}")
+            return False
+
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def close(self, timeout: float = settings.REQUEST_LOG_DRAIN_TIMEOUT):
+        """Остановка с гарантированным сбросом накопленных записей"""
+        self._closing = True
+        self._batch_ready.set()
+
+        if self._task is None:
+            await self._drain()
+            return
+
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"❌ Не удалось сбросить историю за {timeout}s, потеряно записей: {self._queue.qsize()}")
+
+        logger.info(f"История запросов сброшена (записано: {self.written}, отброшено: {self.dropped})")
+
+    async def _run(self):
+        """Цикл сброса: по таймеру или по заполнению пачки"""
+        while not (self._closing and self._queue.empty()):
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self._drain()
+
+    async def _drain(self):
+        """Сбросить все накопленные записи пачками"""
+        while not self._queue.empty():
+            batch = self._take_batch()
+            await self._flush(batch)
+
+    def _take_batch(self) -> List[dict]:
+        """Забрать из очереди не больше batch_size записей"""
+        batch = []
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _flush(self, batch: List[dict]):
+        """Записать пачку в БД вне event loop"""
+        try:
+            self.written += await self.db.write(WeatherRequestCRUD.bulk_create, batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error(f"❌ Ошибка записи истории ({len(batch)} записей): {e}")
+            return
+
+        for hook in self._flush_hooks:
+            try:
+                await hook(batch)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработчика пачки истории: {e}")
@@ -0,0 +1,183 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from config import settings
+from database.crud import WeatherRequestCRUD
+from database.engine import Database
+from database.models import AUTO_VACUUM_INCREMENTAL, WeatherRequest
+from .cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveWriter:
+    """Запись архива истории в сжатые файлы JSONL, разбитые на чанки
+
+    Каждая пачка дописывается отдельным gzip-членом и сбрасывается на диск
+    до удаления строк из БД, поэтому архив остаётся читаемым при сбое.
+    """
+
+    def __init__(self, directory: str, chunk_rows: int):
+        self.directory = Path(directory)
+        self.chunk_rows = chunk_rows
+        self.files: List[Path] = []
+        self._path: Optional[Path] = None
+        self._rows_in_chunk = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def write(self, rows: List[WeatherRequest]):
+        """Дописать пачку записей в текущий чанк"""
+        if self._path is None or self._rows_in_chunk >= self.chunk_rows:
+            self._rotate()
+
+        with open(self._path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+                for row in rows:
+                    archive.write(self._encode(row))
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        self._rows_in_chunk += len(rows)
+
+    def _rotate(self):
+        """Начать новый чанк"""
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        # pid в имени: чанки разных процессов не совпадут даже в одну секунду
+        self._path = self.directory / f"weather_requests-{stamp}-{os.getpid()}-{len(self.files) + 1:04d}.jsonl.gz"
+        self._rows_in_chunk = 0
+        self.files.append(self._path)
+
+    @staticmethod
+    def _encode(row: WeatherRequest) -> bytes:
+        return (json.dumps({
+            'id': row.id,
+            'user_id': row.user_id,
+            'city_name': row.city_name,
+            'request_type': row.request_type,
+            'success': row.success,
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        }, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class RetentionJob:
+    """Плановая архивация и удаление старой истории запросов
+
+    Агрегаты статистики не затрагиваются: они строятся при записи.
+    Запуск - под блокировкой в Redis: архивацию ведет один экземпляр.
+    """
+
+    LOCK_TTL = 300
+
+    def __init__(
+        self,
+        db: Database,
+        cache: RedisCache,
+        retention_days: int = settings.RETENTION_DAYS,
+        interval_hours: int = settings.RETENTION_INTERVAL,
+        batch_size: int = settings.RETENTION_BATCH_SIZE,
+        archive_dir: str = settings.ARCHIVE_DIR,
+        chunk_rows: int = settings.ARCHIVE_CHUNK_ROWS
+    ):
+        self.db = db
+        self.cache = cache
+        self.owner = uuid.uuid4().hex
+        self._lock_key = cache.make_key('retention', 'lock')
+        self.retention_days = retention_days
+        self.interval = interval_hours * 3600
+        self.batch_size = batch_size
+        self.archive_dir = archive_dir
+        self.chunk_rows = chunk_rows
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запуск планировщика архивации"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановка: текущая пачка дописывается, следующая не начинается"""
+        self._stopped.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        """Периодический запуск архивации"""
+        while not self._stopped.is_set():
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Ошибка архивации истории: {e}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> int:
+        """Перенести записи старше горизонта в архив и удалить их из БД"""
+        if not await self.cache.acquire_lock(self._lock_key, self.owner, self.LOCK_TTL):
+            logger.info("🗄 Архивацию ведет другой экземпляр")
+            return 0
+
+        try:
+            return await self._archive()
+        finally:
+            await self.cache.release_lock(self._lock_key, self.owner)
+
+    async def _archive(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        writer = ArchiveWriter(self.archive_dir, self.chunk_rows)
+        moved = 0
+        last_id = 0
+
+        while not self._stopped.is_set():
+            rows = await self.db.read(
+                WeatherRequestCRUD.get_expired_batch, cutoff, last_id, self.batch_size
+            )
+            if not rows:
+                break
+
+            # Сжатие и fsync - в пуле потоков, удаление - отдельной транзакцией писателя
+            await asyncio.to_thread(writer.write, rows)
+            first_id, last_id = rows[0].id, rows[-1].id
+            moved += await self.db.write(
+                WeatherRequestCRUD.delete_expired_range, first_id, last_id, cutoff
+            )
+
+            # Продлить блокировку; потеряли (TTL истек) - останавливаемся
+            if not await self.cache.acquire_lock(self._lock_key, self.owner, self.LOCK_TTL):
+                logger.warning("⚠️ Блокировка архивации потеряна, остановка")
+                break
+
+        if moved:
+            logger.info(
+                f"🗄 Архивировано записей истории: {moved} "
+                f"(файлов: {len(writer.files)}, старше {cutoff:%Y-%m-%d})"
+            )
+            await self.db.write(self._compact)
+
+        return moved
+
+    @staticmethod
+    def _compact(session):
+        """Обновить статистику планировщика и вернуть свободные страницы"""
+        session.execute(text("ANALYZE"))
+        if session.get_bind().dialect.name == 'sqlite':
+            auto_vacuum = session.execute(text("PRAGMA auto_vacuum")).scalar()
+            if auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+                session.execute(text("PRAGMA incremental_vacuum"))
+            else:
+                # Без auto_vacuum освобожденные страницы переиспользуются новыми записями
+                logger.info("ℹ️ auto_vacuum выключен: для уменьшения файла БД выполните VACUUM вручную")
+        session.commit()
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from config import settings
+from services.metrics import SEND_RETRY_AFTER
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class SendGovernor:
+    """Глобальный лимит массовых отправок: token bucket + RetryAfter
+
+    Telegram допускает около 30 сообщений в секунду на бота. Все
+    массовые отправки (рассылки, уведомления) идут через один governor:
+    токены пополняются со скоростью rate, а TelegramRetryAfter
+    приостанавливает все отправки на указанное время, не только одну.
+    """
+
+    def __init__(self, rate: float = settings.BROADCAST_RATE, burst: int = None,
+                 max_retries: int = 5):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.max_retries = max_retries
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Дождаться токена на одну отправку"""
+        # Lock - очередь ожидающих: токены выдаются по порядку
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Приостановить все отправки (ответ RetryAfter)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def send(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Выполнить вызов Bot API в пределах лимита, повторяя после RetryAfter"""
+        for attempt in range(self.max_retries):
+            await self.acquire()
+            try:
+                return await call()
+            except TelegramRetryAfter as e:
+                SEND_RETRY_AFTER.inc()
+                logger.warning(f"⏳ Telegram RetryAfter {e.retry_after} с, отправки приостановлены")
+                self.pause(e.retry_after)
+                if attempt == self.max_retries - 1:
+                    raise
+
+    async def deliver(self, bot: Bot, chat_id: int, text: str) -> str:
+        """Отправить сообщение: sent, blocked (бот заблокирован, чата нет) или failed"""
+        try:
+            await self.send(lambda: bot.send_message(chat_id, text))
+            return 'sent'
+        except TelegramForbiddenError:
+            return 'blocked'
+        except TelegramBadRequest as e:
+            # Удаленный аккаунт - тоже больше не получатель
+            return 'blocked' if 'chat not found' in str(e).lower() else 'failed'
+        except TelegramAPIError as e:
+            logger.warning(f"⚠️ Ошибка отправки в чат {chat_id}: {e}")
+            return 'failed'
@@ -0,0 +1,71 @@
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Консистентное хеширование ключей (id чатов) по узлам (воркерам)
+
+    Каждый узел занимает replicas точек на кольце. При удалении узла
+    на другие переезжают только его ключи, остальные чаты остаются
+    на прежних воркерах вместе с их локальными кешами.
+    """
+
+    def __init__(self, nodes: Iterable[int] = (), replicas: int = 100):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, int] = {}
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[int]:
+        return sorted(set(self._owners.values()))
+
+    def __contains__(self, node: int) -> bool:
+        return node in self._owners.values()
+
+    def add(self, node: int):
+        """Добавить узел (повторное добавление ничего не меняет)"""
+        for i in range(self.replicas):
+            point = _hash(f"{node}:{i}")
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+                self._owners[point] = node
+
+    def remove(self, node: int):
+        """Убрать узел с кольца"""
+        for i in range(self.replicas):
+            point = _hash(f"{node}:{i}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._points.pop(bisect.bisect_left(self._points, point))
+
+    def node_for(self, key: int) -> Optional[int]:
+        """Узел, обслуживающий ключ (None - кольцо пустое)"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+def update_key(update: dict) -> Tuple[str, int]:
+    """Ключ шардирования сырого апдейта Telegram: чат, иначе пользователь
+
+    Разбирается только JSON, без моделей aiogram - это делает воркер.
+    """
+    for field, payload in update.items():
+        if not isinstance(payload, dict):
+            continue
+        chat = payload.get('chat') or (payload.get('message') or {}).get('chat')
+        if chat and 'id' in chat:
+            return field, chat['id']
+        user = payload.get('from') or payload.get('user')
+        if user and 'id' in user:
+            return field, user['id']
+        return field, update.get('update_id', 0)
+    return 'unknown', update.get('update_id', 0)
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram.enums import ChatAction
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import Message
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StatusReply:
+    """Ответ на запрос без лишних вызовов Telegram API
+
+    Без start() answer() - просто одно сообщение (данные из кеша).
+    После start() пользователь видит "печатает...", а статусное сообщение
+    отправляется, только если ожидание дольше delay, и затем
+    редактируется в результат: статус + правка вместо
+    статус + удаление + отправка.
+    """
+
+    def __init__(self, message: Message, status_text: str,
+                 delay: float = settings.STATUS_MESSAGE_DELAY):
+        self.message = message
+        self.status_text = status_text
+        self.delay = delay
+        self.status: Optional[Message] = None
+        self._task: Optional[asyncio.Task] = None
+        self._posting = False
+
+    def start(self):
+        """Начать ожидание медленного ответа"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._show_status())
+
+    async def answer(self, text: str, **kwargs) -> Message:
+        """Итоговый ответ: правка статусного сообщения или новое сообщение"""
+        await self.close()
+        if self.status:
+            try:
+                return await self.status.edit_text(text, **kwargs)
+            except TelegramAPIError as e:
+                logger.warning(f"⚠️ Не удалось заменить статусное сообщение: {e}")
+        return await self.message.answer(text, **kwargs)
+
+    async def close(self):
+        """Остановить показ статуса; начатую отправку - дождаться"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        if not self._posting:
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            # Отменили сам хендлер, а не показ статуса
+            if asyncio.current_task().cancelling():
+                raise
+        except TelegramAPIError as e:
+            logger.warning(f"⚠️ Статусное сообщение не отправлено: {e}")
+
+    async def _show_status(self):
+        try:
+            await self.message.bot.send_chat_action(self.message.chat.id, ChatAction.TYPING)
+        except TelegramAPIError:
+            pass
+        await asyncio.sleep(self.delay)
+        self._posting = True
+        self.status = await self.message.answer(self.status_text)
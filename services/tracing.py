@@ -0,0 +1,267 @@
+import asyncio
+import contextvars
+import json
+import logging
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+
+class Trace:
+    """Дерево спанов одного апдейта"""
+    __slots__ = ('trace_id', 'sampled', 'spans')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.sampled = sampled
+        self.spans: List['Span'] = []
+
+
+class Span:
+    """Интервал работы внутри апдейта (контекстный менеджер)"""
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'attributes',
+                 'start_ns', 'end_ns', 'error', '_token')
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, **attributes):
+        """Добавить атрибуты спана"""
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def __enter__(self) -> 'Span':
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        # list.append атомарен: спаны из потоков БД добавляются безопасно
+        self.trace.spans.append(self)
+        return False
+
+
+class _NoopSpan:
+    """Спан вне трассировки: ничего не записывает"""
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """Дочерний спан текущей трассировки (или no-op, если ее нет)"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+class Tracer:
+    """Трассировка апдейтов: head sampling, захват медленных, экспорт OTLP
+
+    Спаны пишутся для каждого апдейта (это дешево). В OTLP уходят только
+    трассы, выбранные при старте с вероятностью sample_rate, а апдейт
+    дольше slow_threshold записывается целым деревом в slow_file.
+    Экспорт и запись файла идут пачками в фоне.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = settings.TRACING_SAMPLE_RATE,
+        slow_threshold: int = settings.TRACING_SLOW_THRESHOLD,
+        slow_file: str = settings.TRACING_SLOW_FILE,
+        otlp_endpoint: Optional[str] = settings.TRACING_OTLP_ENDPOINT,
+        flush_interval: float = 5.0,
+        max_queue: int = 1000
+    ):
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.slow_file = Path(slow_file)
+        self.otlp_endpoint = otlp_endpoint
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def start_trace(self, name: str, **attributes) -> Span:
+        """Корневой спан апдейта"""
+        trace = Trace(sampled=random.random() < self.sample_rate)
+        return _RootSpan(self, trace, name, None, attributes)
+
+    def start(self):
+        """Запуск фонового экспорта"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Остановка с отправкой накопленного"""
+        self._stopped.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+    def _finish(self, root: Span):
+        trace = root.trace
+        slow = root.duration_ms >= self.slow_threshold
+        if not (slow or (trace.sampled and self.otlp_endpoint)):
+            return
+        try:
+            self._queue.put_nowait((trace, root, slow))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        """Цикл экспорта: пачка раз в flush_interval"""
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush()
+
+        if self._session:
+            await self._session.close()
+
+    async def _flush(self):
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if not batch:
+            return
+
+        slow = [self._tree(root) for trace, root, is_slow in batch if is_slow]
+        if slow:
+            await asyncio.to_thread(self._write_slow, slow)
+
+        sampled = [trace for trace, root, is_slow in batch if trace.sampled]
+        if sampled and self.otlp_endpoint:
+            await self._export(sampled)
+
+    def _write_slow(self, trees: List[dict]):
+        self.slow_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.slow_file, 'a', encoding='utf-8') as f:
+            for tree in trees:
+                f.write(json.dumps(tree, ensure_ascii=False, default=str) + '\n')
+
+    async def _export(self, traces: List[Trace]):
+        """Отправка в OTLP/HTTP (JSON) коллектор"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        try:
+            async with self._session.post(self.otlp_endpoint, json=self._otlp(traces)) as response:
+                if response.status >= 300:
+                    logger.warning(f"⚠️ OTLP коллектор ответил {response.status}")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось отправить трассы: {e}")
+
+    @staticmethod
+    def _tree(root: Span) -> dict:
+        """Дерево спанов для файла медленных апдейтов"""
+        children: Dict[Optional[str], List[Span]] = {}
+        for s in root.trace.spans:
+            children.setdefault(s.parent_id, []).append(s)
+
+        def node(s: Span) -> dict:
+            return {
+                'name': s.name,
+                'duration_ms': round(s.duration_ms, 2),
+                'offset_ms': round((s.start_ns - root.start_ns) / 1e6, 2),
+                'attributes': s.attributes,
+                'error': s.error,
+                'children': [node(c) for c in sorted(children.get(s.span_id, []), key=lambda c: c.start_ns)]
+            }
+
+        tree = node(root)
+        tree['trace_id'] = root.trace.trace_id
+        return tree
+
+    @staticmethod
+    def _otlp(traces: List[Trace]) -> dict:
+        def value(v):
+            if isinstance(v, bool):
+                return {'boolValue': v}
+            if isinstance(v, int):
+                return {'intValue': str(v)}
+            if isinstance(v, float):
+                return {'doubleValue': v}
+            return {'stringValue': str(v)}
+
+        spans = []
+        for trace in traces:
+            for s in trace.spans:
+                item = {
+                    'traceId': trace.trace_id,
+                    'spanId': s.span_id,
+                    'name': s.name,
+                    'kind': 1,
+                    'startTimeUnixNano': str(s.start_ns),
+                    'endTimeUnixNano': str(s.end_ns),
+                    'attributes': [{'key': k, 'value': value(v)} for k, v in s.attributes.items()],
+                    'status': {'code': 2, 'message': s.error} if s.error else {'code': 1}
+                }
+                if s.parent_id:
+                    item['parentSpanId'] = s.parent_id
+                spans.append(item)
+
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'weatherpro-bot'}}]},
+            'scopeSpans': [{'scope': {'name': 'weatherpro.tracing'}, 'spans': spans}]
+        }]}
+
+
+class _RootSpan(Span):
+    """Корневой спан: по завершении передает трассу трейсеру"""
+    __slots__ = ('tracer',)
+
+    def __init__(self, tracer: Tracer, *args):
+        super().__init__(*args)
+        self.tracer = tracer
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        self.tracer._finish(self)
+        return False
+
+
+class TelegramSpanMiddleware(BaseRequestMiddleware):
+    """Спан на каждый вызов Telegram Bot API (sendMessage, editMessageText...)"""
+
+    async def __call__(self, make_request, bot, method):
+        with span(f"telegram.{method.__api_method__}"):
+            return await make_request(bot, method)
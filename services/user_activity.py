@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from aiogram.types import User as TelegramUser
+
+from config import settings
+from database.crud import UserCRUD
+from database.engine import Database
+
+logger = logging.getLogger(__name__)
+
+
+class UserActivityTracker:
+    """Разрешение пользователя и отложенное обновление last_activity
+
+    Держит LRU telegram_id -> users.id, поэтому БД затрагивается только
+    для новых (или вытесненных) пользователей. Обновления last_activity
+    копятся в памяти и сбрасываются одним UPDATE раз в flush_interval.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        cache_size: int = settings.USER_CACHE_SIZE,
+        flush_interval: int = settings.ACTIVITY_FLUSH_INTERVAL
+    ):
+        self.db = db
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self._ids: OrderedDict[int, int] = OrderedDict()
+        self._pending: Dict[int, datetime] = {}
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запуск фонового сброса активности"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def resolve(self, user: TelegramUser) -> int:
+        """Получить id пользователя в БД, отметив его активность"""
+        user_id = self._ids.get(user.id)
+
+        if user_id is not None:
+            self._ids.move_to_end(user.id)
+            self._pending[user_id] = datetime.utcnow()
+            return user_id
+
+        user_id = await self.db.write(
+            UserCRUD.upsert,
+            user.id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            language_code=user.language_code
+        )
+
+        self._ids[user.id] = user_id
+        if len(self._ids) > self.cache_size:
+            self._ids.popitem(last=False)
+
+        return user_id
+
+    async def close(self):
+        """Остановка с финальным сбросом активности"""
+        self._stopped.set()
+        if self._task:
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+    async def flush(self):
+        """Записать накопленные last_activity одним UPDATE"""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        try:
+            await self.db.write(UserCRUD.touch_many, pending)
+        except Exception as e:
+            logger.error(f"❌ Ошибка обновления активности ({len(pending)} пользователей): {e}")
+
+    async def _run(self):
+        """Периодический сброс активности"""
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
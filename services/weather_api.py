@@ -1,8 +1,14 @@
+import asyncio
 import logging
-from typing import Optional
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional, Union
 import aiohttp
 from config import settings
 from .cache import RedisCache
+from .last_known_good import LastKnownGood
+from .metrics import UPSTREAM_CIRCUIT_OPEN, UPSTREAM_FALLBACKS, UPSTREAM_LATENCY, UPSTREAM_RETRIES
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -22,28 +28,132 @@ class APITimeoutError(WeatherAPIError):
     pass
 
 
+class CircuitOpenError(APITimeoutError):
+    """API недоступен: запросы временно не отправляются"""
+    pass
+
+
+class CircuitBreaker:
+    """Размыкатель цепи для OpenWeather
+
+    После threshold неудачных запросов подряд запросы reset_timeout
+    секунд не отправляются вовсе (ответ - сразу из last-known-good,
+    без 30 секунд повторов), затем пропускается один пробный запрос.
+    """
+    
+    def __init__(self, threshold: int = settings.CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = settings.CIRCUIT_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+    
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+    
+    def allow(self) -> bool:
+        """Можно ли отправить запрос"""
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        # Пробный запрос; следующий - не раньше чем через reset_timeout
+        self.opened_at = time.monotonic()
+        return True
+    
+    def success(self):
+        if self.opened_at is not None:
+            logger.info("✅ OpenWeather снова доступен")
+            UPSTREAM_CIRCUIT_OPEN.set(0)
+        self.failures = 0
+        self.opened_at = None
+    
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(
+                    f"⚠️ OpenWeather недоступен ({self.failures} ошибок подряд), "
+                    f"запросы приостановлены на {self.reset_timeout} с"
+                )
+                UPSTREAM_CIRCUIT_OPEN.set(1)
+            self.opened_at = time.monotonic()
+
+
 class WeatherAPI:
     """Сервис работы с OpenWeather API"""
     
+    # Один пул соединений на процесс (keep-alive), общий для всех экземпляров
+    _session: Optional[aiohttp.ClientSession] = None
+    _session_loop: Optional[asyncio.AbstractEventLoop] = None
+    # Состояние API и last-known-good - тоже общие для процесса
+    _breaker = CircuitBreaker()
+    _fallback: Optional[LastKnownGood] = None
+    
     def __init__(self, cache: RedisCache):
         self.cache = cache
         self.base_url = settings.OPENWEATHER_BASE_URL
         self.api_key = settings.OPENWEATHER_API_KEY
     
+    @classmethod
+    def session(cls) -> aiohttp.ClientSession:
+        """Общая HTTP-сессия (создается в текущем event loop)"""
+        loop = asyncio.get_running_loop()
+        session = cls._session
+        if session is None or session.closed or cls._session_loop is not loop:
+            cls._session_loop = loop
+            session = cls._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=settings.API_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=settings.API_MAX_CONNECTIONS, ttl_dns_cache=300)
+            )
+        return session
+    
+    @classmethod
+    def use_fallback(cls, store: Optional[LastKnownGood]):
+        """Хранилище last-known-good для ответов при недоступности API"""
+        cls._fallback = store
+    
+    @classmethod
+    async def close(cls):
+        """Закрыть общий пул соединений"""
+        if cls._session and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+    
     async def _make_request(self, endpoint: str, params: dict) -> dict:
-        """Базовый метод для запросов к API"""
+        """Базовый метод для запросов к API (через размыкатель)"""
+        if not self._breaker.allow():
+            raise CircuitOpenError("OpenWeather временно недоступен")
+        
+        try:
+            data = await self._request(endpoint, params)
+        except CityNotFoundError:
+            self._breaker.success()
+            raise
+        except (WeatherAPIError, asyncio.TimeoutError):
+            self._breaker.failure()
+            raise
+        
+        self._breaker.success()
+        return data
+    
+    async def _request(self, endpoint: str, params: dict) -> dict:
+        """Запрос к API с повторами при сетевых ошибках"""
         params['appid'] = self.api_key
         params['units'] = 'metric'
         params['lang'] = 'ru'
         
         url = f"{self.base_url}/{endpoint}"
         
-        timeout = aiohttp.ClientTimeout(total=settings.API_TIMEOUT)
-        
         for attempt in range(settings.MAX_RETRIES):
+            started = time.perf_counter()
+            status = 'error'
             try:
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.get(url, params=params) as response:
+                with span('openweather', endpoint=endpoint, attempt=attempt + 1) as request_span:
+                    async with self.session().get(url, params=params) as response:
+                        status = str(response.status)
+                        request_span.set(status=response.status)
                         if response.status == 404:
                             raise CityNotFoundError("Город не найден")
                         
@@ -56,27 +166,30 @@ class WeatherAPI:
                 if attempt == settings.MAX_RETRIES - 1:
                     logger.error(f"❌ Ошибка API после {settings.MAX_RETRIES} попыток: {e}")
                     raise APITimeoutError("Не удалось получить данные")
+                UPSTREAM_RETRIES.labels(endpoint).inc()
                 logger.warning(f"⚠️ Попытка {attempt + 1} не удалась, повтор...")
+            
+            except asyncio.TimeoutError:
+                status = 'timeout'
+                raise
+            
+            finally:
+                UPSTREAM_LATENCY.labels(endpoint, status).observe(time.perf_counter() - started)
     
     async def get_current_weather(self, city: str) -> dict:
         """Получить текущую погоду по названию города"""
-        cache_key = self.cache.make_key('weather', city)
-        
-        # Проверяем кеш
-        cached = await self.cache.get(cache_key)
-        if cached:
-            return cached
-        
-        # Запрос к API
-        data = await self._make_request('weather', {'q': city})
-        
-        # Форматируем данные
-        weather_data = self._format_current_weather(data)
-        
-        # Кешируем
-        await self.cache.set(cache_key, weather_data, settings.CACHE_TTL)
-        
-        return weather_data
+        return await self.get_cached_weather(city) or await self.fetch_current_weather(city)
+    
+    async def get_cached_weather(self, city: str) -> Optional[dict]:
+        """Текущая погода из кеша (None - промах)"""
+        return await self.cache.get(self.cache.make_key('weather', city))
+    
+    async def fetch_current_weather(self, city: str) -> dict:
+        """Запросить текущую погоду у API (минуя чтение кеша) и закешировать"""
+        return await self._fetch(
+            self.cache.make_key('weather', city), 'weather', {'q': city},
+            self._format_current_weather, settings.CACHE_TTL
+        )
     
     async def get_weather_by_coords(self, lat: float, lon: float) -> dict:
         """Получить погоду по координатам"""
@@ -86,12 +199,10 @@ class WeatherAPI:
         if cached:
             return cached
         
-        data = await self._make_request('weather', {'lat': lat, 'lon': lon})
-        weather_data = self._format_current_weather(data)
-        
-        await self.cache.set(cache_key, weather_data, settings.CACHE_TTL)
-        
-        return weather_data
+        return await self._fetch(
+            cache_key, 'weather', {'lat': lat, 'lon': lon},
+            self._format_current_weather, settings.CACHE_TTL
+        )
     
     async def get_forecast(self, city: str) -> list[dict]:
         """Получить прогноз на 5 дней"""
@@ -101,12 +212,48 @@ class WeatherAPI:
         if cached:
             return cached
         
-        data = await self._make_request('forecast', {'q': city})
-        forecast_data = self._format_forecast(data)
+        return await self._fetch(
+            cache_key, 'forecast', {'q': city},
+            self._format_forecast, settings.FORECAST_CACHE_TTL
+        )
+    
+    async def _fetch(self, cache_key: str, endpoint: str, params: dict,
+                     formatter: Callable[[dict], Union[dict, list]], ttl: int) -> Union[dict, list]:
+        """Запрос к API с кешированием; при недоступности API - last-known-good"""
+        try:
+            data = await self._make_request(endpoint, params)
+        except CityNotFoundError:
+            raise
+        except (WeatherAPIError, asyncio.TimeoutError):
+            stale = await self._last_known_good(cache_key)
+            if stale is None:
+                raise
+            UPSTREAM_FALLBACKS.labels(endpoint).inc()
+            return stale
+        
+        result = formatter(data)
+        await self.cache.set(cache_key, result, ttl)
+        if self._fallback:
+            self._fallback.record(cache_key, result)
+        return result
+    
+    async def _last_known_good(self, cache_key: str) -> Optional[Union[dict, list]]:
+        """Последние успешные данные с пометкой stale_at (unix time наблюдения)"""
+        if self._fallback is None:
+            return None
+        
+        snapshot = await self._fallback.get(cache_key)
+        if snapshot is None:
+            return None
         
-        await self.cache.set(cache_key, forecast_data, settings.FORECAST_CACHE_TTL)
+        data, observed_at = snapshot
+        stale_at = observed_at.replace(tzinfo=timezone.utc).timestamp()
+        if datetime.now(timezone.utc).timestamp() - stale_at > settings.LKG_MAX_AGE:
+            return None
         
-        return forecast_data
+        for item in data if isinstance(data, list) else [data]:
+            item['stale_at'] = stale_at
+        return data
     
     def _format_current_weather(self, data: dict) -> dict:
         """Форматирование данных текущей погоды"""
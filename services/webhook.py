@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import signal
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from config import settings
+from middlewares.scheduler import FairScheduler
+from services.metrics import WEBHOOK_REJECTED
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookHandler(SimpleRequestHandler):
+    """Прием апдейта: проверка секрета, ответ 200 сразу, обработка в фоне
+
+    Если в фоне уже max_inflight апдейтов или планировщик приостановил
+    прием, отвечаем 429 - Telegram повторит доставку позже, а память
+    не растет без предела.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_inflight: int,
+                 secret_token: Optional[str] = None, scheduler: Optional[FairScheduler] = None, **data):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.max_inflight = max_inflight
+        self.scheduler = scheduler
+
+    @property
+    def inflight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request.headers.get(SECRET_HEADER, ""), self.bot):
+            WEBHOOK_REJECTED.labels('secret').inc()
+            return web.Response(body="Unauthorized", status=401)
+
+        if self.inflight >= self.max_inflight or (self.scheduler and self.scheduler.paused):
+            WEBHOOK_REJECTED.labels('overload').inc()
+            return web.Response(status=429, headers={'Retry-After': '1'})
+
+        return await self._handle_request_background(bot=self.bot, request=request)
+
+    __call__ = handle
+
+    async def drain(self, timeout: float):
+        """Дождаться фоновой обработки принятых апдейтов"""
+        tasks = set(self._background_feed_update_tasks)
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+
+class WebhookServer:
+    """Получение апдейтов через вебхук (альтернатива dp.start_polling)
+
+    Несколько реплик могут стоять за балансировщиком: Telegram держит
+    до max_connections соединений, каждая реплика отвечает сразу
+    и обрабатывает апдейт в фоне.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        url: Optional[str] = settings.WEBHOOK_URL,
+        path: str = settings.WEBHOOK_PATH,
+        host: str = settings.WEBHOOK_HOST,
+        port: int = settings.WEBHOOK_PORT,
+        secret: Optional[str] = settings.WEBHOOK_SECRET,
+        max_connections: int = settings.WEBHOOK_MAX_CONNECTIONS,
+        max_inflight: int = settings.WEBHOOK_MAX_INFLIGHT,
+        scheduler: Optional[FairScheduler] = None,
+        drain_timeout: float = settings.SHUTDOWN_TIMEOUT
+    ):
+        self.dp = dp
+        self.bot = bot
+        self.url = url
+        self.path = path
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.max_connections = max_connections
+        self.drain_timeout = drain_timeout
+        self.handler = WebhookHandler(dp, bot, max_inflight, secret, scheduler)
+        self._runner: Optional[web.AppRunner] = None
+        self._stopped = asyncio.Event()
+
+    async def start(self, register: bool = True):
+        """Запуск HTTP-сервера и регистрация вебхука в Telegram"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handler.handle)
+        app.router.add_get('/health', self._health)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host=self.host, port=self.port).start()
+
+        if register:
+            await self.bot.set_webhook(
+                url=f"{self.url}{self.path}",
+                secret_token=self.secret,
+                max_connections=self.max_connections,
+                allowed_updates=self.dp.resolve_used_update_types()
+            )
+        logger.info(f"🌐 Вебхук: {self.host}:{self.port}{self.path}")
+
+    async def close(self):
+        """Остановка приема и ожидание уже принятых апдейтов
+
+        Вебхук в Telegram не удаляется: другие реплики продолжают работу.
+        """
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        await self.handler.drain(self.drain_timeout)
+
+    async def _health(self, request: web.Request) -> web.Response:
+        """Проверка живости для супервизора и балансировщика"""
+        return web.json_response({'status': 'ok', 'inflight': self.handler.inflight})
+
+    def stop(self):
+        """Сигнал к остановке serve()"""
+        self._stopped.set()
+
+    async def serve(self, register: bool = True):
+        """Работать до SIGINT/SIGTERM, как dp.start_polling
+
+        :param register: вызвать setWebhook (False - апдейты от супервизора)
+        """
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except NotImplementedError:  # Windows
+                pass
+
+        workflow_data = {'bot': self.bot, **self.dp.workflow_data}
+        await self.dp.emit_startup(**workflow_data)
+        try:
+            await self.start(register)
+            await self._stopped.wait()
+        finally:
+            await self.close()
+            await self.dp.emit_shutdown(**workflow_data)
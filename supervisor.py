@@ -0,0 +1,322 @@
+"""Супервизор: несколько процессов-воркеров бота с шардированием по чатам
+
+Один процесс Python упирается в одно ядро (разбор JSON, модели aiogram,
+форматирование, синхронная работа с БД). Супервизор запускает
+SUPERVISOR_WORKERS процессов bot.py в режиме BOT_MODE=worker, сам
+принимает апдейты (вебхук или polling, по BOT_MODE) и пересылает каждый
+воркеру по консистентному хешу id чата. Апдейты одного чата всегда
+попадают в один процесс: порядок и локальные кеши сохраняются.
+У каждого воркера свои пулы Redis и БД, метрики и файл логов.
+
+Запуск:
+    python supervisor.py
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import signal
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from config import settings
+from database.models import init_db
+from services.sharding import HashRing, update_key
+from services.webhook import SECRET_HEADER
+from utils.log_config import setup_logging
+
+setup_logging()
+logger = logging.getLogger('supervisor')
+
+
+class Worker:
+    """Процесс-воркер и его состояние"""
+
+    def __init__(self, worker_id: int, port: int):
+        self.id = worker_id
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.failures = 0
+        self.crashes = 0
+        self.restarts = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+
+class Supervisor:
+    """Запуск воркеров, проверка здоровья, перезапуск и маршрутизация апдейтов"""
+
+    def __init__(
+        self,
+        workers: int = settings.SUPERVISOR_WORKERS,
+        base_port: int = settings.SUPERVISOR_WORKER_PORT,
+        health_interval: float = settings.SUPERVISOR_HEALTH_INTERVAL,
+        health_failures: int = settings.SUPERVISOR_HEALTH_FAILURES,
+        max_backoff: float = settings.SUPERVISOR_MAX_BACKOFF
+    ):
+        self.workers = {i: Worker(i, base_port + i) for i in range(workers)}
+        self.health_interval = health_interval
+        self.health_failures = health_failures
+        self.max_backoff = max_backoff
+        self.ring = HashRing()
+        # Секрет внутренних запросов супервизор -> воркер
+        self.secret = secrets.token_urlsafe(32)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._restarting: Dict[int, asyncio.Task] = {}
+        self._stopped = asyncio.Event()
+
+    # ---------- Воркеры ----------
+
+    async def start(self):
+        """Запустить воркеры и дождаться их готовности"""
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+
+        # Схема БД создается один раз до старта воркеров (без гонки create_all)
+        await asyncio.to_thread(init_db)
+
+        for worker in self.workers.values():
+            await self._spawn(worker)
+
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline and len(self.ring.nodes) < len(self.workers):
+            for worker in self.workers.values():
+                if worker.id not in self.ring and await self._healthy(worker):
+                    self.ring.add(worker.id)
+            await asyncio.sleep(0.5)
+
+        if not self.ring.nodes:
+            raise RuntimeError("Ни один воркер не запустился")
+        logger.info(f"✅ Воркеров готово: {len(self.ring.nodes)}/{len(self.workers)}")
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def close(self):
+        """Остановить воркеры (SIGTERM, затем SIGKILL)"""
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        for task in self._restarting.values():
+            task.cancel()
+
+        for worker in self.workers.values():
+            if worker.alive:
+                worker.process.terminate()
+        for worker in self.workers.values():
+            if worker.process is None:
+                continue
+            try:
+                await asyncio.wait_for(worker.process.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ Воркер {worker.id} не остановился, SIGKILL")
+                worker.process.kill()
+                await worker.process.wait()
+
+        if self._session:
+            await self._session.close()
+
+    async def _spawn(self, worker: Worker):
+        env = {
+            **os.environ,
+            'BOT_MODE': 'worker',
+            'WORKER_ID': str(worker.id),
+            'WEBHOOK_HOST': '127.0.0.1',
+            'WEBHOOK_PORT': str(worker.port),
+            'WEBHOOK_SECRET': self.secret,
+            'METRICS_PORT': str(settings.METRICS_PORT + 1 + worker.id),
+            'LOG_FILE': str(Path(settings.LOG_FILE).with_suffix(f".worker{worker.id}.log")),
+            'TRACING_SLOW_FILE': str(Path(settings.TRACING_SLOW_FILE).with_suffix(f".worker{worker.id}.jsonl")),
+            'WARM_CACHE_FILE': str(Path(settings.WARM_CACHE_FILE).with_suffix(f".worker{worker.id}.bin"))
+        }
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, str(Path(__file__).with_name('bot.py')), env=env
+        )
+        worker.failures = 0
+        logger.info(f"🚀 Воркер {worker.id} запущен (pid {worker.process.pid}, порт {worker.port})")
+
+    async def _healthy(self, worker: Worker) -> bool:
+        if not worker.alive:
+            return False
+        try:
+            async with self._session.get(f"{worker.url}/health",
+                                         timeout=aiohttp.ClientTimeout(total=2)) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def _monitor(self):
+        """Проверка здоровья: упавший или зависший воркер перезапускается"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for worker in self.workers.values():
+                if worker.id in self._restarting:
+                    continue
+                if await self._healthy(worker):
+                    worker.failures = 0
+                    worker.crashes = 0
+                    if worker.id not in self.ring:
+                        self.ring.add(worker.id)
+                        logger.info(f"✅ Воркер {worker.id} снова в работе")
+                    continue
+
+                worker.failures += 1
+                if not worker.alive or worker.failures >= self.health_failures:
+                    self._mark_down(worker)
+                    self._restarting[worker.id] = asyncio.create_task(self._restart(worker))
+
+    def _mark_down(self, worker: Worker):
+        """Убрать воркер с кольца: его чаты временно уходят соседям"""
+        if worker.id in self.ring:
+            self.ring.remove(worker.id)
+            logger.warning(f"⚠️ Воркер {worker.id} недоступен, его чаты переданы другим воркерам")
+
+    async def _restart(self, worker: Worker):
+        try:
+            if worker.alive:
+                worker.process.kill()
+                await worker.process.wait()
+            code = worker.process.returncode if worker.process else None
+
+            # Экспоненциальная пауза при повторных падениях подряд
+            delay = min(self.max_backoff, 2 ** worker.crashes - 1)
+            worker.crashes += 1
+            worker.restarts += 1
+            logger.error(f"❌ Воркер {worker.id} завершился (код {code}), перезапуск через {delay} с")
+            await asyncio.sleep(delay)
+            await self._spawn(worker)
+        finally:
+            self._restarting.pop(worker.id, None)
+
+    # ---------- Маршрутизация ----------
+
+    async def forward(self, updates: List[dict]):
+        """Переслать апдейты воркерам, сохраняя порядок внутри каждого воркера"""
+        pending = updates
+        while pending:
+            if not self.ring.nodes:
+                # Все воркеры перезапускаются
+                await asyncio.sleep(0.5)
+                continue
+
+            shards: Dict[int, List[dict]] = defaultdict(list)
+            for update in pending:
+                shards[self.ring.node_for(update_key(update)[1])].append(update)
+
+            results = await asyncio.gather(*(
+                self._send(self.workers[node], batch) for node, batch in shards.items()
+            ))
+            pending = [update for failed in results for update in failed]
+            if pending:
+                await asyncio.sleep(0.5)
+
+    async def _send(self, worker: Worker, updates: List[dict]) -> List[dict]:
+        """Отправить апдейты воркеру по одному; вернуть недоставленные"""
+        for i, update in enumerate(updates):
+            try:
+                async with self._session.post(
+                    f"{worker.url}{settings.WEBHOOK_PATH}",
+                    data=json.dumps(update, ensure_ascii=False),
+                    headers={SECRET_HEADER: self.secret, 'Content-Type': 'application/json'}
+                ) as response:
+                    if response.status == 429:
+                        # Воркер перегружен: повторим позже, не ломая порядок
+                        return updates[i:]
+                    if response.status != 200:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, (), status=response.status
+                        )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"⚠️ Воркер {worker.id} не принял апдейт: {e}")
+                self._mark_down(worker)
+                return updates[i:]
+        return []
+
+    # ---------- Прием апдейтов ----------
+
+    async def _api(self, method: str, **params) -> dict:
+        url = f"{settings.TELEGRAM_API_URL}/bot{settings.BOT_TOKEN}/{method}"
+        timeout = aiohttp.ClientTimeout(total=params.get('timeout', 0) + 10)
+        async with self._session.post(url, json=params, timeout=timeout) as response:
+            payload = await response.json()
+        if not payload.get('ok'):
+            raise RuntimeError(f"{method}: {payload.get('description')}")
+        return payload['result']
+
+    async def poll(self):
+        """Long polling в одном процессе, обработка - в воркерах"""
+        await self._api('deleteWebhook')
+        offset = 0
+        while not self._stopped.is_set():
+            try:
+                updates = await self._api('getUpdates', offset=offset, timeout=30)
+            except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as e:
+                logger.error(f"❌ Ошибка getUpdates: {e}")
+                await asyncio.sleep(1)
+                continue
+            if updates:
+                await self.forward(updates)
+                offset = updates[-1]['update_id'] + 1
+
+    async def serve_webhook(self):
+        """Прием вебхука: проверка секрета и пересылка воркеру"""
+        async def handle(request: web.Request) -> web.Response:
+            if settings.WEBHOOK_SECRET and not secrets.compare_digest(
+                request.headers.get(SECRET_HEADER, ""), settings.WEBHOOK_SECRET
+            ):
+                return web.Response(body="Unauthorized", status=401)
+            try:
+                await asyncio.wait_for(self.forward([await request.json()]), timeout=5)
+            except asyncio.TimeoutError:
+                # Telegram повторит доставку
+                return web.Response(status=503)
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_post(settings.WEBHOOK_PATH, handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host=settings.WEBHOOK_HOST, port=settings.WEBHOOK_PORT).start()
+        await self._api(
+            'setWebhook',
+            url=f"{settings.WEBHOOK_URL}{settings.WEBHOOK_PATH}",
+            secret_token=settings.WEBHOOK_SECRET,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS
+        )
+        logger.info(f"🌐 Вебхук супервизора: {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}")
+        try:
+            await self._stopped.wait()
+        finally:
+            await runner.cleanup()
+
+    async def run(self):
+        """Работать до SIGINT/SIGTERM"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stopped.set)
+            except NotImplementedError:  # Windows
+                pass
+
+        await self.start()
+        try:
+            intake = asyncio.create_task(
+                self.serve_webhook() if settings.BOT_MODE == 'webhook' else self.poll()
+            )
+            await self._stopped.wait()
+            intake.cancel()
+            await asyncio.gather(intake, return_exceptions=True)
+        finally:
+            await self.close()
+            logger.info("👋 Супервизор остановлен")
+
+
+if __name__ == '__main__':
+    asyncio.run(Supervisor().run())
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from database.crud import UserCRUD
+from database.engine import Database
+from services.broadcast import Broadcaster
+from services.cache import RedisCache
+from services.send_governor import SendGovernor
+
+
+class FakeBot:
+    """Бот без сети: блокировавшие пользователи и один RetryAfter"""
+
+    def __init__(self, blocked: set):
+        self.blocked = blocked
+        self.delivered = []
+        self.retry_once = True
+
+    async def send_message(self, chat_id: int, text: str):
+        method = SendMessage(chat_id=chat_id, text=text)
+        if self.retry_once and chat_id > 0 and self.delivered:
+            self.retry_once = False
+            raise TelegramRetryAfter(method, "Too Many Requests", retry_after=0)
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method, "bot was blocked by the user")
+        self.delivered.append(chat_id)
+        return SimpleNamespace(message_id=1)
+
+    async def edit_message_text(self, text: str, chat_id: int, message_id: int):
+        self.progress = text
+
+
+class TestSendGovernor:
+    """Тесты глобального лимита отправок"""
+
+    @pytest.mark.asyncio
+    async def test_rate_limit(self):
+        """Тест: сверх burst отправки идут со скоростью rate"""
+        governor = SendGovernor(rate=50, burst=5)
+        started = time.monotonic()
+        await asyncio.gather(*(governor.acquire() for _ in range(15)))
+        assert time.monotonic() - started >= 0.18
+
+
+class TestBroadcaster:
+    """Тесты рассылки"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_broadcast_marks_blocked(self, db):
+        """Тест: рассылка всем активным, заблокировавшие - is_active=False"""
+        for telegram_id in range(1, 26):
+            await db.write(UserCRUD.upsert, telegram_id)
+
+        bot = FakeBot(blocked={3, 7})
+        broadcaster = Broadcaster(bot, db, RedisCache(), SendGovernor(rate=1000),
+                                  batch_size=10, concurrency=4, progress_interval=0)
+        assert await broadcaster.start(admin_chat_id=-1, text="Привет")
+        assert not await broadcaster.start(admin_chat_id=-1, text="Еще")
+        await broadcaster._task
+
+        state = broadcaster.state
+        assert state['status'] == 'done'
+        assert (state['sent'], state['blocked'], state['failed']) == (23, 2, 0)
+        assert sorted(i for i in bot.delivered if i > 0) == [i for i in range(1, 26) if i not in (3, 7)]
+        assert "завершена" in bot.progress
+        assert await db.read(UserCRUD.count_active) == 23
+
+        # Снова написал боту - снова получатель рассылок
+        await db.write(UserCRUD.upsert, 3)
+        assert await db.read(UserCRUD.count_active) == 24
@@ -0,0 +1,111 @@
+import fnmatch
+import time
+
+import pytest
+
+from services.cache import RedisCache
+from services.cache_snapshot import CacheSnapshot, CacheSnapshotter, write_snapshot
+
+
+class FakeRedis:
+    """Минимальный Redis в памяти: get/set/keys/delete"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, pxat=None):
+        self.data[key] = value
+
+    async def keys(self, pattern):
+        return [key for key in self.data if fnmatch.fnmatchcase(key, pattern)]
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+def make_snapshot(path):
+    write_snapshot(path, [
+        ('weather:москва', '{"temp": 5}', time.time() + 60),
+        ('weather:казань', '{"temp": 7}', time.time() + 60),
+    ])
+    return CacheSnapshot.open(path)
+
+
+class TestCacheSnapshot:
+    """Тесты снимка горячих ключей кеша"""
+
+    def test_roundtrip(self, tmp_path):
+        """Тест: поиск по отсортированному индексу, истекшие ключи не отдаются"""
+        path = tmp_path / 'cache.bin'
+        now = time.time()
+        write_snapshot(path, [
+            ('weather:москва', '{"temp": 5}', now + 60),
+            ('forecast:казань', '{"days": []}', now + 60),
+            ('weather:old', '{"temp": 1}', now - 1),
+        ])
+
+        snapshot = CacheSnapshot.open(path)
+        assert len(snapshot) == 3
+        assert snapshot.get('weather:москва') == ('{"temp": 5}', pytest.approx(now + 60))
+        assert snapshot.get('forecast:казань')[0] == '{"days": []}'
+        assert snapshot.get('weather:old') is None
+        assert snapshot.get('weather:нет') is None
+        snapshot.close()
+
+    def test_corrupt_file(self, tmp_path):
+        """Тест: поврежденный или пустой файл - снимка нет"""
+        path = tmp_path / 'cache.bin'
+        path.write_bytes(b'')
+        assert CacheSnapshot.open(path) is None
+        path.write_bytes(b'garbage!')
+        assert CacheSnapshot.open(path) is None
+        assert CacheSnapshot.open(tmp_path / 'missing.bin') is None
+
+    @pytest.mark.asyncio
+    async def test_warm_restart(self, tmp_path, monkeypatch):
+        """Тест: рабочий набор пишется в файл и отдается новым кешем без Redis"""
+        path = tmp_path / 'cache.bin'
+        cache = RedisCache()
+        cache._touch('weather:москва')
+        cache._touch('ratelimit:1')
+        assert cache.hot_keys() == ['weather:москва']
+
+        async def dump(keys):
+            return [(key, '{"temp": 5}', time.time() + 60) for key in keys]
+
+        monkeypatch.setattr(cache, 'dump', dump)
+        await CacheSnapshotter(cache, path).close()
+
+        restarted = RedisCache()
+        snapshotter = CacheSnapshotter(restarted, path)
+        snapshotter.load()
+        assert await restarted.get('weather:москва') == {'temp': 5}
+        assert await restarted.get('weather:казань') is None
+        # Ключ из снимка снова в рабочем наборе
+        assert restarted.hot_keys() == ['weather:москва']
+        await snapshotter.close()
+        assert restarted.snapshot is None
+
+    @pytest.mark.asyncio
+    async def test_delete_after_restore(self, tmp_path):
+        """Тест: ключ из снимка отдается один раз, удаление не откатывается снимком"""
+        cache = RedisCache()
+        cache.redis = FakeRedis()
+        cache.snapshot = make_snapshot(tmp_path / 'cache.bin')
+
+        assert await cache.get('weather:москва') == {'temp': 5}
+        assert cache.redis.data['weather:москва'] == '{"temp": 5}'
+
+        # Кнопка "Обновить": удаление, затем чтение - промах
+        await cache.delete('weather:москва')
+        assert await cache.get('weather:москва') is None
+
+        # Удаление по паттерну без Redis тоже скрывает записи снимка
+        cache.redis = None
+        await cache.delete('weather:*')
+        assert await cache.get('weather:казань') is None
+        cache.snapshot.close()
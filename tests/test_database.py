@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.exc import OperationalError
+
+from database.engine import Database
+from database.models import User
+
+
+def add_user(session, telegram_id):
+    session.add(User(telegram_id=telegram_id))
+    session.commit()
+    return threading.current_thread().name
+
+
+class TestDatabase:
+    """Тесты разделения чтения и записи SQLite"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        """Временная SQLite БД с запущенным писателем"""
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_writes_serialized(self, db):
+        """Тест: все записи - в одном потоке-писателе и строго по очереди"""
+        active = []
+        overlaps = []
+
+        def write(session, telegram_id):
+            active.append(telegram_id)
+            overlaps.append(len(active))
+            time.sleep(0.001)
+            name = add_user(session, telegram_id)
+            active.remove(telegram_id)
+            return name
+
+        names = await asyncio.gather(*(db.write(write, i) for i in range(20)))
+        assert set(names) == {'db-writer'}
+        assert max(overlaps) == 1
+        assert await db.read(lambda session: session.query(User).count()) == 20
+
+    @pytest.mark.asyncio
+    async def test_error_through_future(self, db):
+        """Тест: исключение операции возвращается вызывающему, писатель продолжает работу"""
+        def fail(session):
+            raise ValueError("ошибка операции")
+
+        with pytest.raises(ValueError):
+            await db.write(fail)
+        assert await db.write(add_user, 1) == 'db-writer'
+
+    @pytest.mark.asyncio
+    async def test_read_pool_rejects_writes(self, db):
+        """Тест: сессии чтения работают в режиме query_only"""
+        with pytest.raises(OperationalError):
+            await db.read(add_user, 1)
+        assert await db.read(lambda session: session.query(User).count()) == 0
+
+    @pytest.mark.asyncio
+    async def test_close_drains_writes(self, tmp_path):
+        """Тест: close() выполняет уже поставленные в очередь записи"""
+        url = f"sqlite:///{tmp_path / 'test.db'}"
+        db = Database(url)
+        db.start()
+
+        tasks = [asyncio.create_task(db.write(add_user, i)) for i in range(50)]
+        await asyncio.sleep(0)
+        await db.close()
+        assert await asyncio.gather(*tasks) == ['db-writer'] * 50
+
+        reopened = Database(url)
+        assert await reopened.read(lambda session: session.query(User).count()) == 50
+        await reopened.close()
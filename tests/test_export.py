@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from database.crud import WeatherRequestCRUD
+from database.engine import Database
+from services.export import HistoryExport
+
+
+class TestHistoryExport:
+    """Тесты для потоковой выгрузки истории"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        """Временная SQLite БД с историей одного пользователя"""
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        start = datetime(2024, 1, 1)
+        await database.write(WeatherRequestCRUD.bulk_create, [
+            {
+                'user_id': 1,
+                'city_name': 'Москва' if i % 2 else 'Paris',
+                'request_type': 'current',
+                'success': True,
+                'created_at': start + timedelta(seconds=i)
+            }
+            for i in range(2500)
+        ])
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_csv_streamed_in_batches(self, db):
+        """Тест: CSV приходит пачками и содержит всю историю"""
+        export = HistoryExport(db, 1, 'csv', batch_size=1000, buffer_chunks=1)
+        chunks = [chunk async for chunk in export.read()]
+
+        assert len(chunks) == 4  # заголовок + 3 пачки
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8-sig'))))
+        assert rows[0] == ['created_at', 'city_name', 'request_type', 'success']
+        assert len(rows) == 2501
+        assert rows[2][1] == 'Москва'
+        assert export.rows == 2500
+
+    @pytest.mark.asyncio
+    async def test_jsonl(self, db):
+        """Тест формата JSONL"""
+        export = HistoryExport(db, 1, 'jsonl', batch_size=1000)
+        lines = b''.join([chunk async for chunk in export.read()]).decode('utf-8').splitlines()
+
+        assert len(lines) == 2500
+        assert json.loads(lines[0])['city_name'] == 'Paris'
+
+    @pytest.mark.asyncio
+    async def test_abort_stops_producer(self, db):
+        """Тест: прерванная загрузка не оставляет поток висеть"""
+        export = HistoryExport(db, 1, 'csv', batch_size=100, buffer_chunks=1)
+        reader = export.read()
+        await reader.__anext__()
+        await reader.aclose()
+
+        assert export.rows < 2500
@@ -0,0 +1,143 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import pytest_asyncio
+
+from database.crud import FavoriteCityCRUD
+from database.engine import Database
+from database.models import init_db
+from services.cache import RedisCache
+from services.favorites_cache import FavoritesCache
+
+
+class FakeRedis:
+    """Минимальный Redis в памяти: get/setex"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+class TestFavoritesCache:
+    """Тесты read-through кеша избранного"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        """Временная SQLite БД с запущенным писателем"""
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.fixture
+    def cache(self):
+        cache = RedisCache()
+        cache.redis = FakeRedis()
+        return cache
+
+    @pytest.mark.asyncio
+    async def test_invalidation_on_add_and_remove(self, db, cache):
+        """Тест: после добавления/удаления кеш обоих уровней актуален"""
+        favorites = FavoritesCache(db, cache, limit=10)
+        assert await favorites.get(1) == set()
+
+        assert await favorites.add(1, 'Москва')
+        assert await favorites.contains(1, 'Москва')
+        # Другой экземпляр (без локального LRU) видит изменения через Redis
+        assert await FavoritesCache(db, cache).get(1) == {'Москва'}
+
+        assert await favorites.remove(1, 'Москва')
+        assert not await favorites.contains(1, 'Москва')
+        assert await FavoritesCache(db, cache).get(1) == set()
+
+    @pytest.mark.asyncio
+    async def test_local_ttl_expiry(self, db, cache):
+        """Тест: истекшая локальная запись перечитывается из Redis"""
+        favorites = FavoritesCache(db, cache, local_ttl=-1)
+        assert await favorites.get(1) == set()
+
+        await FavoritesCache(db, cache).add(1, 'Казань')
+        assert await favorites.get(1) == {'Казань'}
+
+    @pytest.mark.asyncio
+    async def test_redis_down(self, db):
+        """Тест: без Redis кеш работает через БД"""
+        favorites = FavoritesCache(db, RedisCache(), local_ttl=-1)
+        assert await favorites.add(1, 'Москва')
+        assert await favorites.get(1) == {'Москва'}
+        assert await favorites.remove(1, 'Москва')
+        assert await favorites.get(1) == set()
+
+    @pytest.mark.asyncio
+    async def test_limit_enforced_on_write(self, db, cache):
+        """Тест: параллельные добавления и устаревший кеш не превышают лимит"""
+        favorites = FavoritesCache(db, cache, limit=3)
+        results = await asyncio.gather(*(favorites.add(1, f"Город {i}") for i in range(6)))
+        assert results.count(True) == 3
+        assert len(await db.read(FavoriteCityCRUD.get_names, 1)) == 3
+
+        # Уже сохраненный город - не превышение лимита
+        saved = await db.read(FavoriteCityCRUD.get_names, 1)
+        assert await favorites.add(1, saved[0])
+
+        # Кеш отстал от БД (запись в обход кеша): добавление отклоняется, кеш перечитывается
+        stale = FavoritesCache(db, cache, limit=3)
+        await stale.remove(1, saved[0])
+        await db.write(FavoriteCityCRUD.add, 1, 'Город 9')
+        assert not await stale.add(1, 'Город 10')
+        assert len(await stale.get(1)) == 3
+
+
+    def test_limit_without_single_writer(self, tmp_path):
+        """Тест: лимит соблюдается и при записи из нескольких соединений"""
+        SessionLocal = init_db(f"sqlite:///{tmp_path / 'test.db'}")
+
+        def add(i):
+            session = SessionLocal()
+            try:
+                return FavoriteCityCRUD.add(session, 1, f"Город {i}", limit=3) is not None
+            finally:
+                session.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(add, range(16)))
+
+        session = SessionLocal()
+        assert results.count(True) == 3
+        assert len(FavoriteCityCRUD.get_names(session, 1)) == 3
+        session.close()
+
+
+class TestFavoritesIndex:
+    """Тесты миграции уникального индекса избранного"""
+
+    def test_duplicates_removed_before_unique_index(self, tmp_path):
+        """Тест: дубликаты старой БД удаляются, уникальный индекс создается"""
+        path = tmp_path / 'legacy.db'
+        legacy = sqlite3.connect(path)
+        legacy.execute(
+            "CREATE TABLE favorite_cities (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "city_name VARCHAR(255) NOT NULL, country_code VARCHAR(10), created_at DATETIME)"
+        )
+        legacy.executemany(
+            "INSERT INTO favorite_cities (user_id, city_name) VALUES (?, ?)",
+            [(1, 'Москва'), (1, 'Москва'), (1, 'Казань'), (2, 'Москва')]
+        )
+        legacy.commit()
+        legacy.close()
+
+        init_db(f"sqlite:///{path}")
+
+        legacy = sqlite3.connect(path)
+        rows = legacy.execute("SELECT id, user_id, city_name FROM favorite_cities ORDER BY id").fetchall()
+        indexes = {row[1]: row[2] for row in legacy.execute("PRAGMA index_list(favorite_cities)")}
+        legacy.close()
+        assert rows == [(1, 1, 'Москва'), (3, 1, 'Казань'), (4, 2, 'Москва')]
+        assert indexes['ix_favorite_cities_user_city'] == 1
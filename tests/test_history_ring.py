@@ -0,0 +1,179 @@
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from database.crud import WeatherRequestCRUD
+from database.engine import Database
+from handlers.weather import callback_history_page
+from services.cache import RedisCache
+from services.history_ring import HistoryRing
+
+
+class FakePipeline:
+    """Пайплайн FakeRedis: команды выполняются в execute()"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeRedis:
+    """Списки и счетчики в памяти; скрипт - эмуляция FILL_LIST_SCRIPT"""
+
+    def __init__(self):
+        self.lists = {}
+        self.values = {}
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def lpushx(self, key, *values):
+        if key in self.lists:
+            self.lists[key][:0] = reversed(values)
+
+    def ltrim(self, key, start, stop):
+        if key in self.lists:
+            self.lists[key] = self.lists[key][start:stop + 1]
+
+    def expire(self, key, ttl):
+        pass
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def lrange(self, key, start, stop):
+        return self.lists.get(key, [])[start:stop + 1]
+
+    def register_script(self, script):
+        async def fill(keys, args):
+            if keys[0] in self.lists or self.values.get(keys[1], 0) != args[1]:
+                return 0
+            self.lists[keys[0]] = list(args[2:])
+            return 1
+        return fill
+
+
+class TestHistoryRing:
+    """Тесты для истории запросов: кольцо + keyset-страницы"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        """Временная SQLite БД с запущенным писателем"""
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_keyset_pages_without_redis(self, db):
+        """Тест: без Redis страницы читаются из БД без пропусков и повторов"""
+        start = datetime(2024, 1, 1)
+        await db.write(WeatherRequestCRUD.bulk_create, [
+            {
+                'user_id': 1,
+                'city_name': f"City{i}",
+                'request_type': 'current',
+                'success': True,
+                'created_at': start + timedelta(minutes=i)
+            }
+            for i in range(25)
+        ])
+        ring = HistoryRing(db, RedisCache(), size=10)
+
+        first = await ring.recent(1)
+        second = await ring.older(1, first[-1]['created_at'])
+        third = await ring.older(1, second[-1]['created_at'])
+
+        cities = [entry['city_name'] for entry in first + second + third]
+        assert cities == [f"City{i}" for i in range(24, -1, -1)]
+        assert await ring.older(1, third[-1]['created_at']) == []
+
+    @pytest.mark.asyncio
+    async def test_equal_timestamps_paged_once(self, db):
+        """Тест: записи с одинаковым временем не пропускаются и не повторяются"""
+        await db.write(WeatherRequestCRUD.bulk_create, [
+            {'user_id': 1, 'city_name': f"City{i}", 'request_type': 'current',
+             'success': True, 'created_at': datetime(2024, 1, 1)}
+            for i in range(25)
+        ])
+        ring = HistoryRing(db, RedisCache(), size=10)
+
+        pages = [await ring.recent(1)]
+        while pages[-1]:
+            last = pages[-1][-1]
+            pages.append(await ring.older(1, last['created_at'], last['id']))
+
+        cities = [entry['city_name'] for page in pages for entry in page]
+        assert sorted(cities) == sorted(f"City{i}" for i in range(25))
+
+    @pytest.mark.asyncio
+    async def test_fill_skipped_after_concurrent_push(self, db):
+        """Тест: пачка, записанная во время чтения БД, не теряется при заполнении кольца"""
+        cache = RedisCache()
+        cache.redis = FakeRedis()
+        ring = HistoryRing(db, cache, size=10)
+
+        async def log(city, day):
+            batch = [{'user_id': 1, 'city_name': city, 'request_type': 'current',
+                      'success': True, 'created_at': datetime(2024, 1, day)}]
+            await db.write(WeatherRequestCRUD.bulk_create, batch)
+            await ring.record_requests(batch)
+
+        await log('Москва', 1)
+        read = db.read
+
+        async def racing_read(*args, **kwargs):
+            # Чтение видит старое состояние, пачка записывается сразу после него
+            rows = await read(*args, **kwargs)
+            await log('Казань', 2)
+            return rows
+
+        db.read = racing_read
+        assert [e['city_name'] for e in await ring.recent(1)] == ['Москва']
+        assert ring._key(1) not in cache.redis.lists
+
+        db.read = read
+        assert [e['city_name'] for e in await ring.recent(1)] == ['Казань', 'Москва']
+        # Кольцо заполнено: следующая пачка дописывается в него
+        await log('Сочи', 3)
+        assert [e['city_name'] for e in await ring.recent(1)] == ['Сочи', 'Казань', 'Москва']
+        assert len(cache.redis.lists[ring._key(1)]) == 3
+
+    @pytest.mark.asyncio
+    async def test_forged_cursor_shows_first_page(self, db):
+        """Тест: некорректный курсор в callback - первая страница, а не ошибка"""
+        await db.write(WeatherRequestCRUD.bulk_create, [{
+            'user_id': 1, 'city_name': 'Москва', 'request_type': 'current',
+            'success': True, 'created_at': datetime(2024, 1, 1)
+        }])
+        edited, answered = [], []
+
+        async def edit_text(text, **kwargs):
+            edited.append(text)
+
+        async def answer(*args, **kwargs):
+            answered.append(args)
+
+        callback = SimpleNamespace(
+            data="history:2024-01-01T00:00", answer=answer,
+            message=SimpleNamespace(edit_text=edit_text)
+        )
+        await callback_history_page(callback, HistoryRing(db, RedisCache()), 1)
+
+        assert "Москва" in edited[0] and "последние запросы" in edited[0]
+        assert answered == [()]
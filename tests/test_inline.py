@@ -0,0 +1,71 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from services.cache import RedisCache
+from services.gazetteer import Gazetteer
+from services.inline_weather import InlineWeather
+
+
+class FakeDB:
+    """Популярность городов из статистики"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def read(self, fn, *args):
+        return self.rows
+
+
+def weather(city: str) -> dict:
+    return {
+        'city': city, 'country': 'RU', 'temp': 5, 'feels_like': 2, 'description': 'Ясно',
+        'humidity': 50, 'pressure': 760, 'wind_speed': 3.0, 'clouds': 0, 'icon': '01d'
+    }
+
+
+class TestGazetteer:
+    """Тесты префиксного индекса городов"""
+
+    @pytest.mark.asyncio
+    async def test_prefix_and_popularity(self):
+        """Тест: префикс названия и слова, порядок по популярности"""
+        gazetteer = Gazetteer(FakeDB([("Мурманск", 50), ("Мытищи", 3)]))
+        assert gazetteer.search("мо")[0] == "Москва"
+        assert "Санкт-Петербург" in gazetteer.search("Петер")
+        assert gazetteer.search("нет такого") == []
+
+        await gazetteer.refresh()
+        assert gazetteer.search("м")[:2] == ["Мурманск", "Мытищи"]
+        assert gazetteer.search("ОРЕЛ") == ["Орёл"]
+        assert gazetteer.popular(1) == ["Мурманск"]
+
+
+class TestInlineWeather:
+    """Тесты inline-ответов"""
+
+    @pytest.mark.asyncio
+    async def test_debounce_and_local_cache(self, monkeypatch):
+        """Тест: промежуточный запрос без ответа, повтор - из локального LRU"""
+        inline = InlineWeather(RedisCache(), Gazetteer(FakeDB([])), debounce=0.05)
+        fetched = Counter()
+
+        async def fetch_current_weather(city):
+            fetched[city] += 1
+            return weather(city)
+
+        monkeypatch.setattr(inline.api, 'fetch_current_weather', fetch_current_weather)
+
+        first = asyncio.create_task(inline.resolve(1, "Каза"))
+        await asyncio.sleep(0.01)
+        articles, complete = await inline.resolve(1, "Казань")
+        assert await first is None
+        assert complete
+        assert [article.title for article in articles] == ["Казань, RU: +5°C"]
+        assert fetched == {"Казань": 1}
+
+        # Другой пользователь, тот же город: без API и без паузы
+        articles, _ = await asyncio.wait_for(inline.resolve(2, "каз"), timeout=0.04)
+        assert len(articles) == 1
+        assert fetched == {"Казань": 1}
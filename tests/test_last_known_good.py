@@ -0,0 +1,59 @@
+import pytest
+import pytest_asyncio
+
+from database.engine import Database
+from services.cache import RedisCache
+from services.formatter import WeatherFormatter
+from services.last_known_good import LastKnownGood
+from services.weather_api import APITimeoutError, CircuitBreaker, WeatherAPI
+
+RESPONSE = {
+    'name': 'Москва', 'sys': {'country': 'RU'},
+    'main': {'temp': 5.2, 'feels_like': 2.1, 'humidity': 50, 'pressure': 760},
+    'weather': [{'description': 'ясно', 'icon': '01d'}],
+    'wind': {'speed': 3.0}, 'clouds': {'all': 0}
+}
+
+
+class TestLastKnownGood:
+    """Тесты ответов при недоступности API"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_fallback_and_circuit(self, db, monkeypatch):
+        """Тест: при сбоях - снимок с пометкой времени, после порога API не вызывается"""
+        store = LastKnownGood(db)
+        monkeypatch.setattr(WeatherAPI, '_fallback', store)
+        monkeypatch.setattr(WeatherAPI, '_breaker', CircuitBreaker(threshold=2, reset_timeout=60))
+        api = WeatherAPI(RedisCache())
+
+        calls = []
+
+        async def request(endpoint, params):
+            calls.append(endpoint)
+            if len(calls) > 1:
+                raise APITimeoutError("Не удалось получить данные")
+            return RESPONSE
+
+        monkeypatch.setattr(api, '_request', request)
+
+        weather = await api.get_current_weather("Москва")
+        assert 'stale_at' not in weather
+        await store.flush()
+
+        for _ in range(3):
+            stale = await api.get_current_weather("москва")
+            assert stale['temp'] == 5 and stale['stale_at']
+        # Два сбоя разомкнули цепь: третий ответ - без запроса к API
+        assert len(calls) == 3
+        assert "данные от" in WeatherFormatter.format_current_weather(stale)
+
+        # Снимка нет - ошибка как раньше
+        with pytest.raises(APITimeoutError):
+            await api.get_current_weather("Казань")
@@ -0,0 +1,65 @@
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler
+from utils.log_config import JsonFormatter, RateLimitFilter, SamplingFilter
+
+
+def make_record(level=logging.INFO, lineno=10, **extra):
+    """Запись лога с заданным местом вызова"""
+    record = logging.LogRecord('test', level, __file__, lineno, "msg %s", ('x',), None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestLogConfig:
+    """Тесты для фильтров и форматтера логов"""
+
+    def test_rate_limit_per_call_site(self):
+        """Тест: лимит на место вызова, WARNING тоже ограничивается"""
+        limiter = RateLimitFilter(per_second=3)
+
+        passed = [limiter.filter(make_record()) for _ in range(10)]
+        warnings = [limiter.filter(make_record(logging.WARNING, lineno=30)) for _ in range(10)]
+        other = limiter.filter(make_record(lineno=20))
+
+        assert passed.count(True) == 3
+        assert warnings.count(True) == 3
+        assert other
+
+    def test_rate_limit_skips_errors(self):
+        """Тест: ERROR и выше не ограничиваются, порог настраивается"""
+        limiter = RateLimitFilter(per_second=3)
+        assert all(limiter.filter(make_record(logging.ERROR)) for _ in range(10))
+
+        limiter = RateLimitFilter(per_second=3, level=logging.CRITICAL)
+        passed = [limiter.filter(make_record(logging.ERROR)) for _ in range(10)]
+        assert passed.count(True) == 3
+
+    def test_sampling_only_marked_info(self):
+        """Тест: выборка применяется только к SAMPLED ниже WARNING"""
+        sampler = SamplingFilter(rate=0.0)
+
+        assert not sampler.filter(make_record(sampled=True))
+        assert sampler.filter(make_record())
+        assert sampler.filter(make_record(logging.ERROR, sampled=True))
+
+    def test_json_formatter_extra(self):
+        """Тест: extra-поля попадают в JSON"""
+        entry = json.loads(JsonFormatter().format(make_record(user_id=42)))
+
+        assert entry['msg'] == 'msg x'
+        assert entry['user_id'] == 42
+        assert entry['level'] == 'INFO'
+
+    def test_json_formatter_traceback_via_queue(self):
+        """Тест: трейсбек из очереди логов попадает в msg"""
+        try:
+            raise ValueError("сбой")
+        except ValueError:
+            record = make_record(logging.ERROR, exc_info=sys.exc_info())
+        prepared = QueueHandler(queue.SimpleQueue()).prepare(record)
+        entry = json.loads(JsonFormatter().format(prepared))
+
+        assert 'Traceback' in entry['msg'] and 'ValueError: сбой' in entry['msg']
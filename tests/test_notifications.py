@@ -0,0 +1,146 @@
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+import pytest
+import pytest_asyncio
+
+import services.notifications as notifications
+from database.crud import UserCRUD, UserSettingsCRUD
+from database.engine import Database
+from handlers.notifications import notify
+from services.cache import RedisCache
+from services.notifications import NotificationScheduler, next_fire
+from services.send_governor import SendGovernor
+
+
+WEATHER = {
+    'city': 'Город', 'country': 'RU', 'temp': 5, 'feels_like': 2, 'description': 'Ясно',
+    'humidity': 50, 'pressure': 760, 'wind_speed': 3.0, 'clouds': 0, 'icon': '01d'
+}
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = {}
+
+    async def send_message(self, chat_id: int, text: str):
+        self.sent[chat_id] = text
+        return SimpleNamespace(message_id=1)
+
+
+class TestNextFire:
+    """Тесты расчета времени слота"""
+
+    def test_today_and_tomorrow(self):
+        """Тест: сегодня, если время еще не прошло, иначе завтра"""
+        zone = ZoneInfo('Asia/Tokyo')
+        morning = datetime(2024, 3, 1, 6, 0, tzinfo=zone).timestamp()
+        fire = datetime.fromtimestamp(next_fire(('Asia/Tokyo', '08:30'), morning), zone)
+        assert (fire.day, fire.hour, fire.minute) == (1, 8, 30)
+
+        fire = datetime.fromtimestamp(next_fire(('Asia/Tokyo', '05:00'), morning), zone)
+        assert (fire.day, fire.hour, fire.minute) == (2, 5, 0)
+
+
+class TestNotificationScheduler:
+    """Тесты отправки слота"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_fire_groups_by_city(self, db, monkeypatch):
+        """Тест: погода города запрашивается один раз, текст - один раз на (город, единицы, язык)"""
+        subscribers = [
+            (1, 'Москва', 'celsius', 'ru'),
+            (2, 'москва ', 'celsius', 'ru'),
+            (3, 'Москва', 'celsius', 'en'),
+            (4, 'Москва', 'fahrenheit', 'ru'),
+            (5, 'Казань', 'celsius', 'ru-RU'),
+            (6, 'Казань', 'celsius', 'ru'),
+        ]
+        for telegram_id, city, unit, language in subscribers:
+            user_id = await db.write(UserCRUD.upsert, telegram_id, language_code=language)
+            await db.write(UserSettingsCRUD.upsert, user_id, notifications_enabled=True,
+                           default_city=city, temperature_unit=unit, notification_time='09:00')
+        # Другой слот и выключенные уведомления
+        user_id = await db.write(UserCRUD.upsert, 7)
+        await db.write(UserSettingsCRUD.upsert, user_id, notifications_enabled=True,
+                       default_city='Москва', notification_time='10:00')
+        user_id = await db.write(UserCRUD.upsert, 8)
+        await db.write(UserSettingsCRUD.upsert, user_id, notifications_enabled=False,
+                       default_city='Москва', notification_time='09:00')
+
+        bot = FakeBot()
+        notifier = NotificationScheduler(bot, db, RedisCache(), SendGovernor(rate=1000), batch_size=4)
+
+        fetched = Counter()
+
+        async def get_current_weather(city):
+            fetched[city] += 1
+            return WEATHER
+
+        rendered = Counter()
+        render = notifications.render
+
+        def counting_render(weather, unit, language):
+            rendered[(unit, language)] += 1
+            return render(weather, unit, language)
+
+        monkeypatch.setattr(notifier.api, 'get_current_weather', get_current_weather)
+        monkeypatch.setattr(notifications, 'render', counting_render)
+
+        await notifier.refresh()
+        assert notifier._slots == {('Europe/Moscow', '09:00'), ('Europe/Moscow', '10:00')}
+
+        await notifier._fire(('Europe/Moscow', '09:00'), '2024-03-01')
+
+        assert sorted(bot.sent) == [1, 2, 3, 4, 5, 6]
+        assert fetched == {'москва': 1, 'казань': 1}
+        # Москва: ru, en, °F; Казань: ru
+        assert sum(rendered.values()) == 4
+        assert "Good morning" in bot.sent[3]
+        assert "°F" in bot.sent[4]
+        assert bot.sent[1] is bot.sent[2]
+
+
+class TestNotifyCommand:
+    """Тесты команды /notify"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_invalid_city_rejected(self, db, monkeypatch):
+        """Тест: недопустимый город не сохраняется, ответ экранирован, статус только читает БД"""
+        monkeypatch.setattr(notifications.settings, 'ENABLE_NOTIFICATIONS', True)
+        answers = []
+
+        async def answer(text):
+            answers.append(text)
+
+        message = SimpleNamespace(answer=answer)
+        notifier = NotificationScheduler(FakeBot(), db, RedisCache(), SendGovernor(rate=1000))
+        user_id = await db.write(UserCRUD.upsert, 1)
+
+        await notify(message, SimpleNamespace(args="08:00 <x"), db, user_id, notifier)
+        assert "<x" not in answers[-1]
+        assert await db.read(UserSettingsCRUD.get, user_id) is None
+
+        await notify(message, SimpleNamespace(args=None), db, user_id, notifier)
+        assert "Выключены" in answers[-1]
+        assert await db.read(UserSettingsCRUD.get, user_id) is None
+
+        await notify(message, SimpleNamespace(args="08:00 нижний  новгород"), db, user_id, notifier)
+        assert "Нижний Новгород" in answers[-1]
+        assert notifier._slots
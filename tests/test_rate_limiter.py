@@ -0,0 +1,60 @@
+import pytest
+from services.cache import RedisCache
+from services.rate_limiter import DistributedRateLimiter
+from utils.validators import RateLimiter
+
+
+class FakeClock:
+    """Управляемое время для time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter:
+    """Тесты для GCRA rate limiter"""
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr('utils.validators.time.monotonic', clock)
+        monkeypatch.setattr('services.rate_limiter.time.monotonic', clock)
+        return clock
+
+    def test_local_gcra_burst_and_refill(self, clock):
+        """Тест: всплеск до лимита, затем один запрос за интервал"""
+        limiter = RateLimiter(max_requests=10, time_window=60)
+
+        assert all(limiter.is_allowed(1)[0] for _ in range(10))
+        allowed, wait = limiter.is_allowed(1)
+        assert not allowed and wait == 6
+
+        clock.now += 6
+        assert limiter.is_allowed(1)[0]
+        assert not limiter.is_allowed(1)[0]
+
+    def test_local_memory_bounded(self, clock):
+        """Тест: число отслеживаемых пользователей ограничено"""
+        limiter = RateLimiter(max_users=100)
+        for user_id in range(1000):
+            limiter.is_allowed(user_id)
+
+        assert len(limiter.requests) == 100
+
+    @pytest.mark.asyncio
+    async def test_flood_guard_warns_once(self, clock):
+        """Тест: без Redis работает локальный путь, предупреждение - одно"""
+        limiter = DistributedRateLimiter(RedisCache(), max_requests=10, time_window=60, min_interval=1)
+
+        assert (await limiter.check(1))[0]
+        first = await limiter.check(1)
+        second = await limiter.check(1)
+
+        assert first[0] is False and first[2] is True
+        assert second[0] is False and second[2] is False
+
+        clock.now += 1
+        assert (await limiter.check(1))[0]
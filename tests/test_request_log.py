@@ -0,0 +1,61 @@
+import pytest
+import pytest_asyncio
+from database.crud import WeatherRequestCRUD
+from database.engine import Database
+from database.models import WeatherRequest
+from services.request_log import RequestLogQueue
+
+
+class TestRequestLogQueue:
+    """Тесты для отложенной записи истории запросов"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        """Временная SQLite БД с запущенным писателем"""
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_drain_on_close(self, db):
+        """Тест сброса всех записей при остановке"""
+        queue = RequestLogQueue(db, batch_size=10, flush_interval=60000)
+        queue.start()
+
+        for i in range(25):
+            assert await queue.log(i, 'Moscow', 'current')
+
+        await queue.close()
+
+        session = db.read_session()
+        try:
+            assert session.query(WeatherRequest).count() == 25
+            # Агрегаты статистики обновлены в той же транзакции
+            assert WeatherRequestCRUD.get_stats(session, days=1)['total'] == 25
+            assert WeatherRequestCRUD.get_popular_cities(session, days=1) == [('Moscow', 25)]
+        finally:
+            session.close()
+        assert queue.written == 25
+
+    @pytest.mark.asyncio
+    async def test_drop_when_full(self, db):
+        """Тест отбрасывания записей при переполнении очереди"""
+        queue = RequestLogQueue(db, max_size=3, overflow='drop')
+
+        results = [await queue.log(1, 'Paris', 'current') for _ in range(5)]
+
+        assert results == [True, True, True, False, False]
+        assert queue.dropped == 2
+
+        await queue.close()
+        assert queue.written == 3
+
+    @pytest.mark.asyncio
+    async def test_reject_after_close(self, db):
+        """Тест отказа в записи после остановки"""
+        queue = RequestLogQueue(db)
+        queue.start()
+        await queue.close()
+
+        assert await queue.log(1, 'London', 'current', success=False) is False
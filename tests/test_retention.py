@@ -0,0 +1,107 @@
+import gzip
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+from database.crud import WeatherRequestCRUD
+from database.engine import Database
+from database.models import AUTO_VACUUM_INCREMENTAL, WeatherRequest
+from services.cache import RedisCache
+from services.retention import ArchiveWriter, RetentionJob
+
+
+def count_requests(session):
+    return session.query(WeatherRequest).count()
+
+
+class TestRetentionJob:
+    """Тесты архивации старой истории запросов"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        """Временная БД: 7 записей старше горизонта и 2 свежие"""
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        old = datetime.utcnow() - timedelta(days=100)
+        records = [
+            {'user_id': i, 'city_name': 'Москва', 'request_type': 'current',
+             'success': True, 'created_at': old + timedelta(minutes=i)}
+            for i in range(7)
+        ] + [
+            {'user_id': 100 + i, 'city_name': 'Казань', 'request_type': 'forecast',
+             'success': True, 'created_at': datetime.utcnow()}
+            for i in range(2)
+        ]
+        await database.write(WeatherRequestCRUD.bulk_create, records)
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_archive_and_delete(self, db, tmp_path):
+        """Тест: старые записи пачками уходят в архив и удаляются, свежие остаются"""
+        archive_dir = tmp_path / 'archive'
+        job = RetentionJob(db, RedisCache(), retention_days=90, batch_size=3,
+                           archive_dir=str(archive_dir), chunk_rows=5)
+
+        assert await job.run_once() == 7
+        assert await db.read(count_requests) == 2
+
+        # Пачки по 3 записи: чанк закрывается после 5+ записей, каждая пачка - gzip-член
+        files = sorted(archive_dir.glob('*.jsonl.gz'))
+        assert len(files) == 2
+        rows = []
+        for path in files:
+            with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                rows.extend(json.loads(line) for line in archive)
+        assert [row['user_id'] for row in rows] == list(range(7))
+        assert rows[0]['city_name'] == 'Москва' and rows[0]['created_at']
+
+        # Повторный запуск: архивировать нечего
+        assert await job.run_once() == 0
+
+    @pytest.mark.asyncio
+    async def test_archive_failure_keeps_rows(self, db, tmp_path, monkeypatch):
+        """Тест: ошибка записи архива - строки не удаляются"""
+        def fail(self, rows):
+            raise OSError("нет места на диске")
+
+        monkeypatch.setattr(ArchiveWriter, 'write', fail)
+        job = RetentionJob(db, RedisCache(), retention_days=90, batch_size=3, archive_dir=str(tmp_path / 'archive'))
+
+        with pytest.raises(OSError):
+            await job.run_once()
+        assert await db.read(count_requests) == 9
+
+    @pytest.mark.asyncio
+    async def test_locked_by_other_instance(self, db, tmp_path, monkeypatch):
+        """Тест: блокировка у другого экземпляра - архивация пропускается"""
+        cache = RedisCache()
+
+        async def acquire_lock(key, owner, ttl):
+            return False
+
+        monkeypatch.setattr(cache, 'acquire_lock', acquire_lock)
+        job = RetentionJob(db, cache, retention_days=90, archive_dir=str(tmp_path / 'archive'))
+
+        assert await job.run_once() == 0
+        assert await db.read(count_requests) == 9
+        assert not list((tmp_path / 'archive').glob('*.jsonl.gz'))
+
+    @pytest.mark.asyncio
+    async def test_existing_db_switched_to_incremental_vacuum(self, tmp_path):
+        """Тест: существующая БД без auto_vacuum переводится в INCREMENTAL при миграции"""
+        path = tmp_path / 'legacy.db'
+        legacy = sqlite3.connect(path)
+        legacy.execute("CREATE TABLE legacy (id INTEGER PRIMARY KEY)")
+        legacy.commit()
+        assert legacy.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+        legacy.close()
+
+        database = Database(f"sqlite:///{path}")
+        mode = await database.read(lambda session: session.execute(text("PRAGMA auto_vacuum")).scalar())
+        await database.close()
+        assert mode == AUTO_VACUUM_INCREMENTAL
@@ -0,0 +1,141 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from middlewares.scheduler import FairScheduler, RouterLimiter, RouterLimitMiddleware
+
+
+class TestFairScheduler:
+    """Тесты для справедливого планировщика апдейтов"""
+
+    async def run(self, scheduler: FairScheduler, chat_id: int, tag: str,
+                  order: list, gate: asyncio.Event):
+        """Апдейт: ждет слот, фиксирует порядок старта, ждет gate"""
+        assert await scheduler.acquire(chat_id)
+        order.append(tag)
+        try:
+            await gate.wait()
+            await asyncio.sleep(0)
+        finally:
+            scheduler.release(chat_id)
+
+    @pytest.mark.asyncio
+    async def test_round_robin_between_chats(self):
+        """Тест: новый чат обслуживается раньше хвоста очереди флудера"""
+        scheduler = FairScheduler(max_workers=1, max_chat_queue=100)
+        order, gate = [], asyncio.Event()
+
+        tasks = [asyncio.create_task(self.run(scheduler, 1, f"a{i}", order, gate)) for i in range(5)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(self.run(scheduler, 2, "b0", order, gate)))
+        await asyncio.sleep(0)
+
+        gate.set()
+        await asyncio.gather(*tasks)
+
+        assert order.index("b0") <= 2
+        assert [tag for tag in order if tag.startswith("a")] == [f"a{i}" for i in range(5)]
+        assert scheduler.metrics()['running'] == 0
+
+    @pytest.mark.asyncio
+    async def test_chat_is_sequential_and_workers_bounded(self):
+        """Тест: апдейты одного чата не параллелятся, слотов не больше лимита"""
+        scheduler = FairScheduler(max_workers=2, max_chat_queue=100)
+        order, gate = [], asyncio.Event()
+
+        tasks = [
+            asyncio.create_task(self.run(scheduler, chat_id, f"{chat_id}", order, gate))
+            for chat_id in (1, 1, 2, 3)
+        ]
+        await asyncio.sleep(0)
+
+        assert order == ["1", "2"]
+        metrics = scheduler.metrics()
+        assert metrics['running'] == 2
+        assert metrics['waiting'] == 2
+
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert sorted(order) == ["1", "1", "2", "3"]
+
+    @pytest.mark.asyncio
+    async def test_overflow_and_cancel(self):
+        """Тест: переполнение очереди чата и отмена ожидания"""
+        scheduler = FairScheduler(max_workers=1, max_chat_queue=1)
+        assert await scheduler.acquire(1)
+
+        waiter = asyncio.create_task(scheduler.acquire(1))
+        await asyncio.sleep(0)
+        assert not await scheduler.acquire(1)
+        assert scheduler.dropped == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release(1)
+
+        assert scheduler.metrics() == {
+            'running': 0, 'workers': 1, 'waiting': 0, 'chats_waiting': 0,
+            'max_depth': 0, 'top': [], 'dropped': 1
+        }
+
+    @pytest.mark.asyncio
+    async def test_intake_pause_and_drain(self):
+        """Тест: прием приостанавливается выше порога, drain ждет очередь"""
+        scheduler = FairScheduler(max_workers=1, max_chat_queue=100, pause_threshold=4)
+        order, gate = [], asyncio.Event()
+
+        tasks = [
+            asyncio.create_task(self.run(scheduler, chat_id, f"{chat_id}", order, gate))
+            for chat_id in range(6)
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 5
+        assert scheduler.paused
+        assert not await scheduler.drain(timeout=0.1)
+
+        gate.set()
+        assert await scheduler.drain(timeout=1)
+        assert not scheduler.paused
+        await asyncio.gather(*tasks)
+
+
+class TestRouterLimit:
+    """Тесты лимитов роутеров поверх FairScheduler"""
+
+    @pytest.mark.asyncio
+    async def test_saturated_router_does_not_block_others(self):
+        """Тест: очередь к export не занимает глобальные слоты - weather стартует сразу"""
+        scheduler = FairScheduler(max_workers=2, max_chat_queue=100)
+        middleware = RouterLimitMiddleware(RouterLimiter({'export': 1}), scheduler)
+        gate = asyncio.Event()
+        started = []
+
+        async def export_handler(event, data):
+            started.append(event)
+            await gate.wait()
+
+        export_handler.__module__ = 'handlers.export'
+
+        async def export_update(chat_id):
+            assert await scheduler.acquire(chat_id)
+            try:
+                data = {'handler': SimpleNamespace(callback=export_handler), 'scheduler_slot': True}
+                await middleware(export_handler, chat_id, data)
+            finally:
+                scheduler.release(chat_id)
+
+        exports = [asyncio.create_task(export_update(chat_id)) for chat_id in (1, 2, 3)]
+        await asyncio.sleep(0.01)
+        assert started == [1]
+        assert scheduler.running == 1 and scheduler.suspended == 2
+
+        # Обновление погоды другого чата получает слот без ожидания
+        assert await asyncio.wait_for(scheduler.acquire(99), timeout=0.1)
+        scheduler.release(99)
+
+        gate.set()
+        await asyncio.gather(*exports)
+        assert sorted(started) == [1, 2, 3]
+        assert scheduler.running == 0 and scheduler.suspended == 0
+        assert await scheduler.drain(timeout=0.1)
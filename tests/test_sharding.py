@@ -0,0 +1,56 @@
+from collections import Counter
+
+from config import settings
+from services.sharding import HashRing, update_key
+
+
+class TestHashRing:
+    """Тесты консистентного хеширования чатов по воркерам"""
+
+    def test_stable_and_balanced(self):
+        """Тест: чат всегда на одном узле, нагрузка распределена"""
+        ring = HashRing(range(4))
+        owners = {chat: ring.node_for(chat) for chat in range(10000)}
+
+        assert all(ring.node_for(chat) == node for chat, node in owners.items())
+        load = Counter(owners.values())
+        assert set(load) == {0, 1, 2, 3}
+        assert min(load.values()) > 1500
+
+    def test_remove_moves_only_its_chats(self):
+        """Тест: при удалении узла переезжают только его чаты"""
+        ring = HashRing(range(4))
+        before = {chat: ring.node_for(chat) for chat in range(10000)}
+
+        ring.remove(2)
+        assert 2 not in ring
+        for chat, node in before.items():
+            if node != 2:
+                assert ring.node_for(chat) == node
+            else:
+                assert ring.node_for(chat) != 2
+
+        ring.add(2)
+        assert all(ring.node_for(chat) == node for chat, node in before.items())
+
+    def test_update_key(self):
+        """Тест: ключ - чат сообщения/callback, иначе пользователь"""
+        message = {'update_id': 1, 'message': {'chat': {'id': -100}, 'from': {'id': 5}}}
+        callback = {'update_id': 2, 'callback_query': {'from': {'id': 5}, 'message': {'chat': {'id': 7}}}}
+        inline = {'update_id': 3, 'inline_query': {'from': {'id': 5}, 'query': 'Мос'}}
+
+        assert update_key(message) == ('message', -100)
+        assert update_key(callback) == ('callback_query', 7)
+        assert update_key(inline) == ('inline_query', 5)
+        assert HashRing().node_for(1) is None
+
+
+
+class TestWorkers:
+    """Тесты распределения задач между воркерами"""
+
+    def test_singleton_jobs_only_on_primary(self, monkeypatch):
+        """Тест: одиночные задачи - в отдельном процессе и на воркере 0"""
+        for worker_id, primary in ((None, True), (0, True), (1, False), (3, False)):
+            monkeypatch.setattr(settings, 'WORKER_ID', worker_id)
+            assert settings.is_primary_instance() is primary
@@ -0,0 +1,48 @@
+import random
+from utils.sketches import CountMinSketch, HyperLogLog, TopK
+
+
+class TestSketches:
+    """Тесты для вероятностных структур статистики"""
+
+    def test_hyperloglog_error_bound(self):
+        """Тест: оценка уникальных в пределах 3 стандартных ошибок"""
+        hll = HyperLogLog(precision=12)
+        for user_id in range(50000):
+            hll.add(user_id)
+            hll.add(user_id)  # повторы не влияют на оценку
+
+        assert abs(hll.count() - 50000) / 50000 < 3 * hll.error
+
+    def test_hyperloglog_merge(self):
+        """Тест объединения двух HLL"""
+        left, right = HyperLogLog(precision=12), HyperLogLog(precision=12)
+        for i in range(1000):
+            left.add(i)
+            right.add(i + 500)
+        left.merge(right)
+
+        assert abs(left.count() - 1500) / 1500 < 3 * left.error
+
+    def test_count_min_never_underestimates(self):
+        """Тест: Count-Min не занижает частоты"""
+        sketch = CountMinSketch(width=64, depth=4)
+        counts = {}
+        for _ in range(5000):
+            item = f"/cmd{random.randint(0, 300)}"
+            counts[item] = counts.get(item, 0) + 1
+            sketch.add(item)
+
+        assert all(sketch.estimate(item) >= count for item, count in counts.items())
+
+    def test_top_k_heavy_hitters(self):
+        """Тест: частые элементы попадают в top-k, память ограничена k"""
+        top = TopK(k=3, width=512, depth=4)
+        stream = ['Москва'] * 500 + ['Казань'] * 300 + ['Сочи'] * 200
+        stream += [f"город-{i}" for i in range(2000)]
+        random.shuffle(stream)
+        for city in stream:
+            top.add(city)
+
+        assert [city for city, _ in top.items()] == ['Москва', 'Казань', 'Сочи']
+        assert len(top.items()) == 3
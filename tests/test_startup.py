@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from database import models
+from utils.startup import StartupTimer
+
+
+class TestMigrations:
+    """Тесты однократной миграции схемы"""
+
+    def test_migrate_once(self, tmp_path, monkeypatch):
+        """Тест: при актуальной схеме create_all не выполняется"""
+        url = f"sqlite:///{tmp_path / 'test.db'}"
+        models.init_db(url)
+
+        calls = []
+        monkeypatch.setattr(models.Base.metadata, 'create_all', lambda engine: calls.append(engine))
+        models.init_db(url)
+        assert calls == []
+
+        # Изменилась схема моделей - миграция снова
+        monkeypatch.setattr(models, 'schema_version', lambda: 1)
+        models.init_db(url)
+        assert len(calls) == 1
+
+
+class TestStartupTimer:
+    """Тесты замеров запуска"""
+
+    @pytest.mark.asyncio
+    async def test_phases_and_first_update(self):
+        """Тест: фазы, итог и время до первого апдейта (один раз)"""
+        startup = StartupTimer(time.monotonic())
+        with startup.phase('connect'):
+            pass
+        assert startup.ready().startswith("connect")
+        assert set(startup.phases) == {'connect', 'total'}
+
+        async def handler(event, data):
+            return 'ok'
+
+        assert await startup.middleware(handler, None, {}) == 'ok'
+        first = startup.first_update
+        await startup.middleware(handler, None, {})
+        assert startup.first_update == first
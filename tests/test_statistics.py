@@ -0,0 +1,174 @@
+import time
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from aiogram.types import Chat, Message, User
+
+from config import settings
+from database.engine import Database
+from handlers.favorites import show_stats
+from middlewares.logging import StatisticsMiddleware
+from middlewares.scheduler import FairScheduler
+from services.cache import RedisCache
+from utils.sketches import CountMinSketch
+
+
+def make_message(text: str, user_id: int = 1) -> Message:
+    return Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=user_id, type='private'),
+        from_user=User(id=user_id, is_bot=False, first_name='Test'),
+        text=text
+    )
+
+
+class TestStatisticsMiddleware:
+    """Тесты живой статистики по минутным корзинам"""
+
+    @pytest.mark.asyncio
+    async def test_live_stats_without_redis(self):
+        """Тест: окна считаются по локальным корзинам, ошибки учитываются"""
+        stats = StatisticsMiddleware()
+
+        async def ok(event, data):
+            return None
+
+        async def fail(event, data):
+            raise RuntimeError("boom")
+
+        for i in range(8):
+            await stats(ok, make_message('/weather Москва', user_id=i), {})
+        await stats(ok, make_message('/help'), {})
+        with pytest.raises(RuntimeError):
+            await stats(fail, make_message('/weather'), {})
+
+        live = await stats.get_live_stats()
+
+        assert set(live) == {1, 5, 15, 60}
+        for window in live.values():
+            assert window['updates'] == 10
+            assert window['errors'] == 1
+            assert window['error_rate'] == pytest.approx(10.0)
+            assert window['commands'][0] == ('/weather', 9)
+        assert live[1]['rps'] > live[60]['rps'] > 0
+
+        # Повторный сбор не теряет и не удваивает уже слитые корзины
+        assert (await stats.get_live_stats())[5]['updates'] == 10
+
+    def test_normalize_command(self):
+        """Тест: имя команды Telegram сохраняется, прочее - в одну корзину"""
+        assert StatisticsMiddleware._normalize_command('/Start@WeatherBot arg') == '/start'
+        assert StatisticsMiddleware._normalize_command('/weather_now') == '/weather_now'
+        assert StatisticsMiddleware._normalize_command('/a<b') == '/invalid'
+        assert StatisticsMiddleware._normalize_command('/погода') == '/invalid'
+
+
+class FakePipeline:
+    """Пайплайн FakeRedis: команды выполняются в execute()"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeRedis:
+    """Хеши и sorted set в памяти: ровно то, что нужно рейтингу"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def hincrby(self, key, field, amount):
+        hash_ = self.hashes.setdefault(key, {})
+        hash_[field] = hash_.get(field, 0) + amount
+        return hash_[field]
+
+    def zadd(self, key, mapping, gt=False):
+        zset = self.zsets.setdefault(key, {})
+        for member, score in mapping.items():
+            if not gt or score > zset.get(member, float('-inf')):
+                zset[member] = score
+
+    def zremrangebyrank(self, key, start, stop):
+        ranked = sorted(self.zsets.get(key, {}).items(), key=lambda kv: kv[1])
+        for member, _ in ranked[start:len(ranked) + stop + 1]:
+            del self.zsets[key][member]
+
+    async def zrevrange(self, key, start, stop, withscores=False):
+        ranked = sorted(self.zsets.get(key, {}).items(), key=lambda kv: kv[1], reverse=True)
+        return ranked[start:stop + 1]
+
+
+class TestSharedTopK:
+    """Тесты общего рейтинга команд в Redis"""
+
+    @pytest.mark.asyncio
+    async def test_late_heavy_hitter_enters_top(self):
+        """Тест: команда, ставшая популярной позже, попадает в рейтинг после отсечки"""
+        cache = RedisCache()
+        cache.redis = FakeRedis()
+        sketch = CountMinSketch(width=256, depth=4)
+        cells = {member: sketch.cells(member) for member in ('/a', '/b', '/c')}
+
+        await cache.incr_top('stats:commands', {'/a': 10, '/b': 8}, cells, keep=2)
+        for _ in range(3):
+            await cache.incr_top('stats:commands', {'/c': 5}, cells, keep=2)
+
+        assert await cache.get_top('stats:commands', 2) == [('/c', 15), ('/a', 10)]
+
+
+class TestStatsCommand:
+    """Тесты вывода /stats"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_command_names_escaped(self, db, monkeypatch):
+        """Тест: команды с <, > и & не ломают HTML-разметку /stats"""
+        monkeypatch.setattr(settings, 'ADMIN_IDS', [1])
+        stats = StatisticsMiddleware()
+
+        async def ok(event, data):
+            return None
+
+        await stats(ok, make_message('/a<b&c>'), {})
+        # Сырые имена из корзин старых версий (до нормализации)
+        minute = int(time.time() // 60)
+        stats._local_buckets[minute] = Counter({'updates': 1, 'cmd:/x<y&z>': 5})
+
+        answers = []
+
+        async def answer(text, **kwargs):
+            answers.append(text)
+
+        message = SimpleNamespace(from_user=SimpleNamespace(id=1), answer=answer)
+        await show_stats(message, db, stats, FairScheduler())
+
+        text = answers[0]
+        assert '/x&lt;y&amp;z&gt; 5' in text
+        assert '/invalid' in text
+        assert '<y' not in text and '<b&' not in text
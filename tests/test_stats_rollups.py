@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert
+
+from database import models
+from database.crud import StatsRollupCRUD, UserCRUD, WeatherRequestCRUD
+from database.models import ActiveUserDaily, RequestStatsHourly, WeatherRequest
+
+
+def request(user_id, city, created_at, success=True):
+    return {'user_id': user_id, 'city_name': city, 'request_type': 'current',
+            'success': success, 'created_at': created_at}
+
+
+class TestStatsRollups:
+    """Тесты инкрементальных агрегатов статистики"""
+
+    @pytest.fixture
+    def session(self, tmp_path):
+        SessionLocal = models.init_db(f"sqlite:///{tmp_path / 'test.db'}")
+        session = SessionLocal()
+        yield session
+        session.close()
+
+    def test_hourly_bucket_rollover(self, session):
+        """Тест: граница часа разделяет корзины, повторная пачка прибавляется к своей"""
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        WeatherRequestCRUD.bulk_create(session, [
+            request(1, 'Москва', hour - timedelta(seconds=1)),
+            request(2, 'Москва', hour),
+            request(3, 'Москва', hour + timedelta(minutes=59, seconds=59)),
+        ])
+        WeatherRequestCRUD.bulk_create(session, [request(4, 'Москва', hour + timedelta(minutes=30))])
+
+        buckets = dict(session.query(RequestStatsHourly.hour, RequestStatsHourly.count).all())
+        assert buckets == {hour - timedelta(hours=1): 1, hour: 3}
+
+    def test_backfill_idempotent(self, session, tmp_path, monkeypatch):
+        """Тест: построение агрегатов из истории не удваивает их при перезапусках"""
+        now = datetime.utcnow()
+        session.execute(insert(WeatherRequest), [
+            request(1, 'Москва', now - timedelta(hours=1)),
+            request(2, 'Москва', now - timedelta(hours=1)),
+            request(2, 'Казань', now - timedelta(days=1), success=False),
+        ])
+        session.commit()
+
+        SessionLocal = models.sessionmaker(bind=session.get_bind())
+        models._backfill_rollups(SessionLocal)
+        models._backfill_rollups(SessionLocal)
+        # Перезапуск с миграцией схемы
+        monkeypatch.setattr(models, 'schema_version', lambda: 1)
+        models.init_db(f"sqlite:///{tmp_path / 'test.db'}")
+
+        session.expire_all()
+        assert session.query(func.sum(RequestStatsHourly.count)).scalar() == 3
+        assert session.query(ActiveUserDaily).count() == 3
+        assert WeatherRequestCRUD.get_stats(session, days=7)['failed'] == 1
+        assert UserCRUD.get_active_users_count(session, days=7) == 2
+
+    def test_stats_match_raw_counts(self, session):
+        """Тест: цифры /stats совпадают с COUNT(*) по weather_requests"""
+        now = datetime.utcnow()
+        records = [
+            request(i % 4, ['Москва', 'Казань', 'Сочи'][i % 3], now - timedelta(hours=i * 5), success=i % 5 != 0)
+            for i in range(40)
+        ] + [request(9, 'Москва', now - timedelta(days=30))]
+        WeatherRequestCRUD.bulk_create(session, records)
+
+        threshold = StatsRollupCRUD._hour_threshold(7)
+        recent = session.query(WeatherRequest).filter(WeatherRequest.created_at >= threshold)
+        stats = WeatherRequestCRUD.get_stats(session, days=7)
+        assert stats['total'] == recent.count()
+        assert stats['successful'] == recent.filter(WeatherRequest.success == True).count()
+
+        raw_cities = recent.filter(WeatherRequest.success == True).with_entities(
+            WeatherRequest.city_name, func.count()
+        ).group_by(WeatherRequest.city_name).all()
+        popular = WeatherRequestCRUD.get_popular_cities(session, days=7, limit=5)
+        assert sorted(popular) == sorted(raw_cities)
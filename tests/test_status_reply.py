@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.status_reply import StatusReply
+
+
+class FakeMessage:
+    """Сообщение без сети: журнал вызовов Telegram API"""
+
+    def __init__(self, calls: list):
+        self.calls = calls
+        self.chat = SimpleNamespace(id=1)
+        self.bot = SimpleNamespace(send_chat_action=self.send_chat_action)
+
+    async def send_chat_action(self, chat_id: int, action: str):
+        self.calls.append('typing')
+
+    async def answer(self, text: str, **kwargs):
+        self.calls.append(('answer', text))
+        return FakeMessage(self.calls)
+
+    async def edit_text(self, text: str, **kwargs):
+        self.calls.append(('edit', text))
+        return self
+
+
+class TestStatusReply:
+    """Тесты ответа без лишнего статусного сообщения"""
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_single_call(self):
+        """Тест: без ожидания - одно сообщение"""
+        calls = []
+        reply = StatusReply(FakeMessage(calls), "🔍", delay=0.05)
+        await reply.answer("погода")
+        await reply.close()
+        assert calls == [('answer', "погода")]
+
+    @pytest.mark.asyncio
+    async def test_fast_miss_no_status(self):
+        """Тест: ответ до порога - "печатает..." и сообщение, без статуса"""
+        calls = []
+        reply = StatusReply(FakeMessage(calls), "🔍", delay=0.2)
+        reply.start()
+        await asyncio.sleep(0.01)
+        await reply.answer("погода")
+        await asyncio.sleep(0.3)
+        assert calls == ['typing', ('answer', "погода")]
+
+    @pytest.mark.asyncio
+    async def test_slow_miss_edits_status(self):
+        """Тест: ответ после порога - статус редактируется в результат"""
+        calls = []
+        reply = StatusReply(FakeMessage(calls), "🔍", delay=0.02)
+        reply.start()
+        await asyncio.sleep(0.1)
+        await reply.answer("погода")
+        assert calls == ['typing', ('answer', "🔍"), ('edit', "погода")]
@@ -0,0 +1,50 @@
+import asyncio
+import json
+import pytest
+from services.tracing import Tracer, span
+
+
+class TestTracing:
+    """Тесты для трассировки апдейтов"""
+
+    @pytest.mark.asyncio
+    async def test_slow_update_tree_dumped(self, tmp_path):
+        """Тест: медленный апдейт записывается деревом, включая спаны из потоков"""
+        slow_file = tmp_path / 'slow.jsonl'
+        tracer = Tracer(sample_rate=0, slow_threshold=0, slow_file=str(slow_file), otlp_endpoint=None)
+        tracer.start()
+
+        def query():
+            with span('sql', op='fetch'):
+                return 42
+
+        with tracer.start_trace('message get_weather', user_id=1):
+            with span('redis.get', key='weather:moscow'):
+                await asyncio.sleep(0)
+            await asyncio.to_thread(query)
+
+        await tracer.close()
+
+        tree = json.loads(slow_file.read_text(encoding='utf-8'))
+        assert tree['name'] == 'message get_weather'
+        assert [child['name'] for child in tree['children']] == ['redis.get', 'sql']
+
+    def test_otlp_payload(self):
+        """Тест: OTLP JSON с родительскими связями и статусом ошибки"""
+        tracer = Tracer(sample_rate=1, otlp_endpoint='http://collector')
+        with pytest.raises(ValueError):
+            with tracer.start_trace('callback current') as root:
+                with span('openweather', attempt=1):
+                    raise ValueError("boom")
+
+        spans = Tracer._otlp([root.trace])['resourceSpans'][0]['scopeSpans'][0]['spans']
+        child, parent = spans
+        assert child['parentSpanId'] == parent['spanId']
+        assert child['traceId'] == parent['traceId']
+        assert child['status']['code'] == 2
+        assert child['attributes'] == [{'key': 'attempt', 'value': {'intValue': '1'}}]
+
+    def test_span_outside_trace_is_noop(self):
+        """Тест: вне апдейта спаны ничего не делают"""
+        with span('redis.get') as s:
+            s.set(key='x')
@@ -0,0 +1,79 @@
+import pytest
+import pytest_asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from database.engine import Database
+from database.models import User
+from services.user_activity import UserActivityTracker
+
+
+def make_tg_user(telegram_id: int, username: str = None):
+    """Минимальный объект пользователя Telegram"""
+    return SimpleNamespace(
+        id=telegram_id,
+        username=username,
+        first_name="Test",
+        last_name=None,
+        language_code=None
+    )
+
+
+class TestUserActivityTracker:
+    """Тесты для разрешения пользователей и отложенной активности"""
+
+    @pytest_asyncio.fixture
+    async def db(self, tmp_path):
+        """Временная SQLite БД с запущенным писателем"""
+        database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+        database.start()
+        yield database
+        await database.close()
+
+    @pytest.mark.asyncio
+    async def test_resolve_upserts_once(self, db):
+        """Тест: один пользователь - одна строка, повтор из LRU"""
+        tracker = UserActivityTracker(db)
+
+        first = await tracker.resolve(make_tg_user(42, "alice"))
+        second = await tracker.resolve(make_tg_user(42, "alice"))
+
+        assert first == second
+        session = db.read_session()
+        try:
+            assert session.query(User).filter_by(telegram_id=42).count() == 1
+            assert session.query(User).one().language_code == 'ru'  # None не затирает default
+        finally:
+            session.close()
+
+    @pytest.mark.asyncio
+    async def test_upsert_after_eviction(self, db):
+        """Тест: вытесненный из LRU пользователь не дублируется"""
+        tracker = UserActivityTracker(db, cache_size=1)
+
+        first = await tracker.resolve(make_tg_user(1))
+        await tracker.resolve(make_tg_user(2))
+        again = await tracker.resolve(make_tg_user(1, "renamed"))
+
+        assert again == first
+        session = db.read_session()
+        try:
+            assert session.query(User).count() == 2
+            assert session.get(User, first).username == "renamed"
+        finally:
+            session.close()
+
+    @pytest.mark.asyncio
+    async def test_flush_last_activity(self, db):
+        """Тест сброса last_activity при остановке"""
+        tracker = UserActivityTracker(db)
+        user_id = await tracker.resolve(make_tg_user(7))
+
+        before = datetime.utcnow()
+        await tracker.resolve(make_tg_user(7))
+        await tracker.close()
+
+        session = db.read_session()
+        try:
+            assert session.get(User, user_id).last_activity >= before
+        finally:
+            session.close()
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from services.webhook import SECRET_HEADER, WebhookHandler
+
+UPDATE = {
+    'update_id': 1,
+    'message': {
+        'message_id': 1,
+        'date': 0,
+        'chat': {'id': 1, 'type': 'private'},
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'Test'},
+        'text': 'ping'
+    }
+}
+
+
+class TestWebhookHandler:
+    """Тесты приема апдейтов вебхуком"""
+
+    @pytest.mark.asyncio
+    async def test_secret_and_backpressure(self):
+        """Тест: 401 без секрета, 200 до ответа хендлера, 429 при переполнении"""
+        dp = Dispatcher()
+        gate = asyncio.Event()
+        handled = []
+
+        @dp.message()
+        async def slow(message):
+            await gate.wait()
+            handled.append(message.message_id)
+
+        bot = Bot('42:test')
+        handler = WebhookHandler(dp, bot, max_inflight=1, secret_token='s3cret')
+        app = web.Application()
+        app.router.add_post('/webhook', handler.handle)
+
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post('/webhook', json=UPDATE)
+            assert response.status == 401
+
+            headers = {SECRET_HEADER: 's3cret'}
+            response = await client.post('/webhook', json=UPDATE, headers=headers)
+            assert response.status == 200
+            assert handler.inflight == 1
+
+            response = await client.post('/webhook', json=UPDATE, headers=headers)
+            assert response.status == 429
+
+            gate.set()
+            await handler.drain(timeout=1)
+            assert handled == [1]
+            assert handler.inflight == 0
+
+        await bot.session.close()
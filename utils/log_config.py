@@ -0,0 +1,132 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from config import settings
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Пометка высокочастотных событий (по одному на апдейт) для выборочного логирования:
+# logger.info("...", extra=SAMPLED)
+SAMPLED = {'sampled': True}
+
+# Стандартные атрибуты LogRecord - все остальное считается контекстом (extra)
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись, с полями из extra
+
+    Трейсбек уже в msg: QueueHandler.prepare дописывает его к тексту
+    и очищает exc_info до передачи записи в поток записи.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key != 'sampled':
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate записей, помеченных SAMPLED (кроме WARNING и выше)"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, 'sampled', False):
+            return True
+        return random.random() < self.rate
+
+
+class RateLimitFilter(logging.Filter):
+    """Не больше per_second записей в секунду с одного места вызова
+
+    Число подавленных записей добавляется к следующей пропущенной
+    (поле suppressed). Записи уровня level и выше (по умолчанию ERROR)
+    не ограничиваются.
+    """
+
+    MAX_CALL_SITES = 10000
+
+    def __init__(self, per_second: int, level: int = logging.ERROR):
+        super().__init__()
+        self.per_second = per_second
+        self.level = level
+        self._windows: Dict[Tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.level:
+            return True
+
+        # Место вызова, а не текст: f-строки дают разный текст на каждый вызов
+        key = (record.name, record.lineno)
+        second = int(time.monotonic())
+        window = self._windows.get(key)
+        if window is None or window[0] != second:
+            suppressed = window[2] if window else 0
+            if len(self._windows) >= self.MAX_CALL_SITES:
+                self._windows.clear()
+            window = self._windows[key] = [second, 0, 0]
+            if suppressed:
+                record.suppressed = suppressed
+
+        if window[1] >= self.per_second:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+def setup_logging(level: Optional[str] = None) -> QueueListener:
+    """Настроить логирование: запись в файл и консоль - в отдельном потоке
+
+    Event loop только кладет запись в очередь, форматирование вывода,
+    ротация и запись на диск выполняются QueueListener.
+    """
+    file_path = Path(settings.LOG_FILE)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    file_handler = RotatingFileHandler(
+        file_path,
+        maxBytes=settings.LOG_MAX_SIZE * 1024 * 1024,
+        backupCount=settings.LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(
+        JsonFormatter() if settings.LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+    )
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATE))
+    queue_handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT))
+
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(queue_handler)
+    root.setLevel(level or settings.LOG_LEVEL)
+
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    # Дописать очередь при выходе, в т.ч. сообщения после остановки event loop
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,128 @@
+import hashlib
+import math
+from array import array
+from typing import Dict, List, Tuple
+
+
+def _hash64(item) -> int:
+    """Стабильный 64-битный хеш (одинаковый во всех процессах)"""
+    digest = hashlib.blake2b(str(item).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HyperLogLog:
+    """Оценка числа уникальных элементов в фиксированной памяти
+
+    2^precision однобайтовых регистров; стандартная ошибка
+    1.04 / sqrt(2^precision), т.е. ~0.8% при precision=14 (16 КБ).
+    """
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self._alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, item):
+        """Учесть элемент"""
+        h = _hash64(item)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        """Оценка числа уникальных элементов"""
+        estimate = self._alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        if estimate <= 2.5 * self.m:
+            # Поправка для малых значений: линейный подсчет по пустым регистрам
+            zeros = self.registers.count(0)
+            if zeros:
+                estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other: 'HyperLogLog'):
+        """Объединить с другим HLL той же точности"""
+        if other.precision != self.precision:
+            raise ValueError("Нельзя объединить HyperLogLog разной точности")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    @property
+    def error(self) -> float:
+        """Стандартная относительная ошибка"""
+        return 1.04 / math.sqrt(self.m)
+
+
+class CountMinSketch:
+    """Оценка частот в фиксированной памяти
+
+    Оценка никогда не занижена и с вероятностью 1 - e^-depth
+    завышена не более чем на e / width от общего числа событий.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.rows = [array('Q', bytes(8 * width)) for _ in range(depth)]
+
+    def _indexes(self, item) -> List[int]:
+        # Двойное хеширование: h1 + i * h2 дает depth независимых позиций
+        digest = hashlib.blake2b(str(item).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def cells(self, item) -> List[str]:
+        """Ячейки элемента "строка:столбец" (для общего скетча в Redis-хеше)"""
+        return [f"{row}:{index}" for row, index in enumerate(self._indexes(item))]
+
+    def add(self, item, count: int = 1) -> int:
+        """Учесть элемент и вернуть новую оценку его частоты"""
+        self.total += count
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(item)):
+            row[index] += count
+            value = row[index]
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate
+
+    def estimate(self, item) -> int:
+        """Оценка частоты элемента"""
+        return min(row[index] for row, index in zip(self.rows, self._indexes(item)))
+
+
+class TopK:
+    """Самые частые элементы потока: Count-Min sketch + k кандидатов
+
+    Память не зависит от числа различных элементов: хранятся только
+    счетчики скетча и не более k ключей.
+    """
+
+    def __init__(self, k: int = 20, width: int = 2048, depth: int = 4):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self._top: Dict[str, int] = {}
+
+    def add(self, item: str, count: int = 1):
+        """Учесть элемент"""
+        estimate = self.sketch.add(item, count)
+
+        if item in self._top or len(self._top) < self.k:
+            self._top[item] = estimate
+            return
+
+        weakest = min(self._top, key=self._top.get)
+        if estimate > self._top[weakest]:
+            del self._top[weakest]
+            self._top[item] = estimate
+
+    def __contains__(self, item: str) -> bool:
+        """Элемент сейчас среди кандидатов top-k"""
+        return item in self._top
+
+    def items(self, limit: int = None) -> List[Tuple[str, int]]:
+        """Элементы по убыванию оценки частоты"""
+        ranked = sorted(self._top.items(), key=lambda kv: kv[1], reverse=True)
+        return ranked[:limit] if limit else ranked
@@ -0,0 +1,58 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram.types import Update
+
+from services.metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Разбивка времени запуска по фазам и время до первого апдейта
+
+    started - момент начала импорта bot.py (time.monotonic()), поэтому
+    первая фаза - импорт модулей. Фазы и итог пишутся в лог и в метрику
+    bot_startup_seconds{phase}.
+    """
+
+    def __init__(self, started: float):
+        self.started = started
+        self.phases: Dict[str, float] = {}
+        self.first_update: Optional[float] = None
+
+    def record(self, name: str, since: float):
+        """Записать фазу, начавшуюся в since и закончившуюся сейчас"""
+        self.phases[name] = time.monotonic() - since
+        STARTUP_SECONDS.labels(name).set(self.phases[name])
+
+    @contextmanager
+    def phase(self, name: str):
+        """Замер фазы: with timer.phase('db'): ..."""
+        since = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, since)
+
+    def ready(self) -> str:
+        """Запуск завершен: итог и разбивка по фазам"""
+        self.record('total', self.started)
+        return ", ".join(f"{name} {seconds:.2f} с" for name, seconds in self.phases.items())
+
+    async def middleware(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        """Outer-middleware апдейтов: время от запуска до первого обработанного апдейта"""
+        try:
+            return await handler(event, data)
+        finally:
+            if self.first_update is None:
+                self.record('first_update', self.started)
+                self.first_update = self.phases['first_update']
+                logger.info(f"⏱ Первый апдейт обработан через {self.first_update:.2f} с после запуска")
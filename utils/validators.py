@@ -1,4 +1,7 @@
+import math
 import re
+import time
+from collections import OrderedDict
 from typing import Optional
 
 
@@ -132,18 +135,25 @@ class UserInputSanitizer:
 
 
 class RateLimiter:
-    """Ограничение частоты запросов"""
+    """Ограничение частоты запросов (GCRA, в памяти процесса)
     
-    def __init__(self, max_requests: int = 10, time_window: int = 60):
+    На пользователя хранится одно число - теоретическое время следующего
+    запроса (TAT), а число пользователей ограничено max_users (LRU).
+    Допускается всплеск до max_requests запросов, в среднем - не больше
+    max_requests за time_window.
+    """
+    
+    def __init__(self, max_requests: int = 10, time_window: int = 60, max_users: int = 10000):
         """
         :param max_requests: максимальное количество запросов
-
-l1ather, [11.12.2025 22:07]
-:param time_window: временное окно в секундах
+        :param time_window: временное окно в секундах
+        :param max_users: максимум отслеживаемых пользователей
         """
         self.max_requests = max_requests
         self.time_window = time_window
-        self.requests = {}
+        self.max_users = max_users
+        self.interval = time_window / max_requests
+        self.requests: OrderedDict[int, float] = OrderedDict()
     
     def is_allowed(self, user_id: int) -> tuple[bool, int]:
         """
@@ -151,28 +161,20 @@ l1ather, [11.12.2025 22:07]
         
         :return: (разрешен, секунд до следующей попытки)
         """
-        import time
-        
-        current_time = time.time()
-        
-        # Очищаем старые записи
-        if user_id in self.requests:
-            self.requests[user_id] = [
-                req_time for req_time in self.requests[user_id]
-                if current_time - req_time < self.time_window
-            ]
+        current_time = time.monotonic()
         
-        # Проверяем лимит
-        if user_id not in self.requests:
-            self.requests[user_id] = []
+        tat = max(self.requests.get(user_id, current_time), current_time)
+        new_tat = tat + self.interval
+        allow_at = new_tat - self.time_window
         
-        if len(self.requests[user_id]) >= self.max_requests:
-            oldest_request = min(self.requests[user_id])
-            wait_time = int(self.time_window - (current_time - oldest_request))
-            return False, wait_time
+        if current_time < allow_at:
+            return False, math.ceil(allow_at - current_time)
         
-        # Добавляем текущий запрос
-        self.requests[user_id].append(current_time)
+        self.requests[user_id] = new_tat
+        self.requests.move_to_end(user_id)
+        if len(self.requests) > self.max_users:
+            # Вытесняем дольше всех неактивного пользователя
+            self.requests.popitem(last=False)
         
         return True, 0
 